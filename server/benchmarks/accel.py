@@ -0,0 +1,157 @@
+"""
+Проверка ускорителя numba (lib/accel.py) на Libraries/: весь корпус (sdfind, glfind версий 1 и 2)
+считается в двух процессах - с ND_FOREZ_ACCEL=0 и ND_FOREZ_ACCEL=1. Результаты должны совпадать побитово,
+печатается время ускоряемых функций и анализа целиком.
+
+Запуск из каталога server: python benchmarks/accel.py [каталог с библиотеками]
+Для сравнения нужен установленный numba (pip install .[accel]): без него второй прогон идет без ускорения,
+сравнивать нечего, и скрипт завершается с кодом 2. Функции на циклах без numba проверяет benchmarks/accel_kernels.py.
+"""
+import importlib.util
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from dataclasses import asdict
+from io import StringIO
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'src'))
+
+# Ускоряемые функции и модули, которые их импортируют: туда подставляются обертки с замером времени
+MEASURED = {
+    'filter_isolated_peaks': ['lib.glfind.glfind'],
+    'handle_smooth_library_case': ['lib.glfind.glfind'],
+    'find_matching_peaks': ['lib.sdfind.sdfind'],
+}
+
+
+def run_corpus(libraries: Path, repeat: int) -> dict[str, Any]:
+    """Анализ всего корпуса: первый проход прогревает (компилирует ядра), по остальным берется минимум времени"""
+    import importlib
+
+    from lib.accel import ACCEL_ENABLED
+    from lib.glfind.calibration import Calibration
+    from lib.glfind.glfind import glfind
+    from lib.parsing.parsing_any import parse_bytes
+    from lib.sdfind.sdfind import sdfind
+
+    timings: dict[str, float] = {}
+
+    def timed(name: str, function: Callable[..., Any]) -> Callable[..., Any]:
+        def wrapper(*args: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return function(*args)
+            finally:
+                timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+        return wrapper
+
+    for name, modules in MEASURED.items():
+        for module_name in modules:
+            module = importlib.import_module(module_name)
+            setattr(module, name, timed(name, getattr(module, name)))
+
+    signals = []
+    for directory in sorted(path for path in libraries.iterdir() if path.is_dir()):
+        size_standards, gen_libs = [], []
+        for path in sorted(directory.glob('*.frf')):
+            with redirect_stdout(StringIO()):
+                parsed_standards, parsed_libs = parse_bytes(path.read_bytes(), path.name)
+            size_standards += parsed_standards
+            gen_libs += parsed_libs
+        signals.append((directory.name, size_standards, gen_libs))
+
+    def analyze() -> dict[tuple, Any]:
+        results: dict[tuple, Any] = {}
+        for directory, size_standards, gen_libs in signals:
+            for si, standard in enumerate(size_standards):
+                sizes = np.array(standard.calibration.sizes, dtype=np.float64)
+                concentrations = np.array(standard.calibration.concentrations, dtype=np.float64)
+                try:
+                    sd = sdfind(np.array(standard.signal, dtype=np.float64), sizes, np.array(standard.calibration.release_times, dtype=np.float64), concentrations)
+                except Exception as ex:
+                    results[(directory, si)] = repr(ex)
+                    continue
+                results[(directory, si)] = _without_timings(asdict(sd))
+                calibration = Calibration(sd.peaks, sizes, concentrations)
+                for li, gen_lib in enumerate(gen_libs):
+                    for version in (1, 2):
+                        try:
+                            gl = glfind(np.array(gen_lib.signal, dtype=np.float64), calibration, version)
+                            results[(directory, si, li, version)] = _without_timings(asdict(gl))
+                        except Exception as ex:
+                            results[(directory, si, li, version)] = repr(ex)
+        return results
+
+    results = analyze()
+    best: dict[str, float] = {}
+    for _ in range(repeat):
+        timings.clear()
+        start = time.perf_counter()
+        analyze()
+        timings['анализ целиком'] = time.perf_counter() - start
+        best = {name: min(seconds, best.get(name, float('inf'))) for name, seconds in timings.items()}
+    return {'enabled': ACCEL_ENABLED, 'results': results, 'timings': best}
+
+
+def _without_timings(record: dict[str, Any]) -> dict[str, Any]:
+    return {name: value for name, value in record.items() if name != 'timings'}
+
+
+def _same(a: Any, b: Any) -> bool:
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_same(a[key], b[key]) for key in a)
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return np.asarray(a).dtype == np.asarray(b).dtype and np.array_equal(a, b)
+    return a == b
+
+
+def main() -> None:
+    if len(sys.argv) == 4 and sys.argv[1] == '--run':
+        with open(sys.argv[3], 'wb') as file:
+            pickle.dump(run_corpus(Path(sys.argv[2]), repeat=3), file)
+        return
+
+    if importlib.util.find_spec('numba') is None:
+        # Без numba второй прогон совпал бы с первым, и сравнение прошло бы, ничего не проверив
+        print('numba не установлен: сравнение с ускоренными ядрами невозможно', file=sys.stderr)
+        raise SystemExit(2)
+
+    libraries = Path(sys.argv[1]) if len(sys.argv) > 1 else Path(__file__).resolve().parents[2] / 'Libraries'
+    runs = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for flag in ('0', '1'):
+            output = Path(directory) / f'accel-{flag}.pickle'
+            subprocess.run(
+                [sys.executable, __file__, '--run', str(libraries), str(output)],
+                env={**os.environ, 'ND_FOREZ_ACCEL': flag},
+                check=True,
+            )
+            runs[flag] = pickle.loads(output.read_bytes())
+
+    plain, accelerated = runs['0'], runs['1']
+    if not accelerated['enabled']:
+        print('numba не установлен: оба прогона выполнены без ускорения, ядра не проверены', file=sys.stderr)
+        raise SystemExit(2)
+
+    mismatched = [key for key in plain['results'] if not _same(plain['results'][key], accelerated['results'].get(key))]
+    for key in mismatched:
+        print(f'Не совпадает: {key}')
+    print(f'Результатов: {len(plain["results"])}, расхождений: {len(mismatched)}')
+
+    for name, seconds in plain['timings'].items():
+        print(f'{name}: {seconds * 1e3:.1f} мс -> {accelerated["timings"].get(name, 0.0) * 1e3:.1f} мс')
+
+    if mismatched:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""
+Проверка ядер numba (lib/accel.py) без компиляции: функции на циклах (_filter_isolated_loop, _split_locations_loop,
+_find_ladder_loop) - обычный Python, поэтому их можно вызвать напрямую вместо скомпилированного ядра и сравнить
+с реализацией на NumPy. numba для проверки не нужен.
+
+Входы - аргументы filter_isolated_peaks, handle_smooth_library_case и _find_ladder, записанные при анализе
+Libraries/ (sdfind, glfind версий 1 и 2), и случайные входы тех же функций. Каждая функция вызывается дважды:
+с ядром None (реализация на NumPy) и с функцией на циклах в роли ядра. Результаты (или ошибки) должны совпадать
+побитово, иначе скрипт завершается с кодом 1.
+
+Запуск из каталога server: python benchmarks/accel_kernels.py [--libraries КАТАЛОГ] [--random 300] [--seed 0]
+"""
+import argparse
+import sys
+from contextlib import redirect_stdout
+from io import StringIO
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Callable
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'src'))
+
+import lib.glfind.filter_isolated_peaks as filter_isolated_module  # noqa: E402
+import lib.glfind.glfind as glfind_module  # noqa: E402
+import lib.glfind.handle_smooth_library_case as smooth_library_module  # noqa: E402
+import lib.sdfind.find_matching_peaks as find_matching_module  # noqa: E402
+from lib.glfind.calibration import Calibration  # noqa: E402
+from lib.parsing.parsing_any import parse_bytes  # noqa: E402
+from lib.sdfind.sdfind import sdfind  # noqa: E402
+from lib.signal.area import CumulativeArea  # noqa: E402
+
+# Проверяемая функция: модуль, в котором она вызывает ядро, имя ядра и функция на циклах
+KERNELS: dict[str, tuple[ModuleType, str, Callable[..., Any]]] = {
+    'filter_isolated_peaks': (filter_isolated_module, '_filter_isolated_kernel', filter_isolated_module._filter_isolated_loop),
+    'handle_smooth_library_case': (smooth_library_module, '_split_locations_kernel', smooth_library_module._split_locations_loop),
+    '_find_ladder': (find_matching_module, '_find_ladder_kernel', find_matching_module._find_ladder_loop),
+}
+
+# Модули, из которых вызываются проверяемые функции: там подставляются обертки, записывающие аргументы
+CALLERS: dict[str, ModuleType] = {
+    'filter_isolated_peaks': glfind_module,
+    'handle_smooth_library_case': glfind_module,
+    '_find_ladder': find_matching_module,
+}
+
+Cases = dict[str, list[tuple[str, tuple]]]
+
+
+def corpus_cases(libraries: Path) -> Cases:
+    """Аргументы проверяемых функций при анализе всего корпуса"""
+    cases: Cases = {name: [] for name in KERNELS}
+    originals = {name: getattr(module, name) for name, module in CALLERS.items()}
+    current = ['']
+
+    def recording(name: str) -> Callable[..., Any]:
+        def wrapper(*args: Any) -> Any:
+            cases[name].append((current[0], args))
+            return originals[name](*args)
+        return wrapper
+
+    for name, module in CALLERS.items():
+        setattr(module, name, recording(name))
+    try:
+        for directory in sorted(path for path in libraries.iterdir() if path.is_dir()):
+            size_standards, gen_libs = [], []
+            for path in sorted(directory.glob('*.frf')):
+                with redirect_stdout(StringIO()):
+                    parsed_standards, parsed_libs = parse_bytes(path.read_bytes(), path.name)
+                size_standards += parsed_standards
+                gen_libs += parsed_libs
+            for si, standard in enumerate(size_standards):
+                current[0] = f'{directory.name}: стандарт {si}'
+                sizes = np.array(standard.calibration.sizes, dtype=np.float64)
+                concentrations = np.array(standard.calibration.concentrations, dtype=np.float64)
+                try:
+                    sd = sdfind(np.array(standard.signal, dtype=np.float64), sizes, np.array(standard.calibration.release_times, dtype=np.float64), concentrations)
+                except Exception:
+                    continue
+                calibration = Calibration(sd.peaks, sizes, concentrations)
+                for li, gen_lib in enumerate(gen_libs):
+                    for version in (1, 2):
+                        current[0] = f'{directory.name}: библиотека {li} @ стандарт {si} v{version}'
+                        try:
+                            glfind_module.glfind(np.array(gen_lib.signal, dtype=np.float64), calibration, version)
+                        except Exception:
+                            pass
+    finally:
+        for name, module in CALLERS.items():
+            setattr(module, name, originals[name])
+    return cases
+
+
+def random_cases(count: int, seed: int) -> Cases:
+    """Случайные входы, в том числе пики у краев сигнала, повторяющиеся пики и лесенки, которые находятся и не находятся"""
+    rng = np.random.default_rng(seed)
+    cases: Cases = {name: [] for name in KERNELS}
+    for k in range(count):
+        size = int(rng.integers(20, 3000))
+        signal = np.abs(rng.normal(0, 1, size)).cumsum() % rng.uniform(5, 50)
+        if k % 4 == 0:
+            signal = np.rint(signal)
+        signal_area = CumulativeArea(signal)
+
+        all_peaks = np.sort(rng.choice(size, size=int(rng.integers(1, min(size, 60))), replace=False)).astype(np.int64)
+        isolated = np.sort(rng.choice(all_peaks, size=int(rng.integers(0, len(all_peaks) + 1)), replace=False))
+        cases['filter_isolated_peaks'].append((f'случайный {k}', (isolated, all_peaks, signal_area)))
+
+        # Как в glfind, пики не совпадают с минимумами и отстоят друг от друга хотя бы на 2 отсчета
+        # (пики на четных отсчетах, минимумы на нечетных): иначе новый минимум между соседними пиками
+        # совпал бы с уже имеющимся и проход по парам минимумов не закончился бы ни в одной из реализаций
+        selected = 2 * np.sort(rng.choice(size // 2, size=int(rng.integers(1, min(size // 2, 40))), replace=False)).astype(np.int64)
+        reference = np.sort(rng.choice(size, size=2, replace=False)).astype(np.int64)
+        complete = 2 * np.sort(rng.choice(size // 2, size=int(rng.integers(1, min(size // 2, 20))), replace=False)).astype(np.int64) + 1
+        minimums = 2 * np.sort(rng.choice(size // 2, size=int(rng.integers(0, min(size // 2, 20))), replace=False)).astype(np.int64) + 1
+        cases['handle_smooth_library_case'].append((f'случайный {k}', (signal_area, selected, reference, complete, minimums)))
+
+        steps = rng.uniform(5, 60, int(rng.integers(2, 12)))
+        ladder = np.cumsum(np.concatenate(([rng.uniform(0, 100)], steps * rng.uniform(0.9, 1.1, len(steps)))))
+        noise = rng.uniform(0, ladder[-1] + 100, int(rng.integers(0, 30)))
+        peaks = np.unique(np.rint(np.concatenate((ladder if k % 3 else ladder[:-1], noise))).astype(np.int64))
+        cases['_find_ladder'].append((f'случайный {k}', (peaks, steps[::-1].copy(), len(steps) + 1)))
+    return cases
+
+
+def call(name: str, kernel: Callable[..., Any] | None, args: tuple) -> Any:
+    """Вызов проверяемой функции с заданным ядром; ошибка возвращается вместо результата"""
+    module, kernel_name, _ = KERNELS[name]
+    saved = getattr(module, kernel_name)
+    setattr(module, kernel_name, kernel)
+    try:
+        return getattr(module, name)(*args)
+    except Exception as ex:
+        return ex
+    finally:
+        setattr(module, kernel_name, saved)
+
+
+def same(a: Any, b: Any) -> bool:
+    if isinstance(a, Exception) or isinstance(b, Exception):
+        return type(a) is type(b) and str(a) == str(b)
+    if isinstance(a, (tuple, list)) and isinstance(b, (tuple, list)):
+        return len(a) == len(b) and all(same(x, y) for x, y in zip(a, b))
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return np.asarray(a).dtype == np.asarray(b).dtype and np.array_equal(a, b)
+    return a == b
+
+
+def describe(result: Any) -> str:
+    return repr(result) if isinstance(result, Exception) else np.array2string(np.asarray(result, dtype=object), threshold=20)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Сравнение функций на циклах (ядер numba без компиляции) с реализацией на NumPy')
+    parser.add_argument('--libraries', type=Path, default=Path(__file__).resolve().parents[2] / 'Libraries', help='каталог с библиотеками')
+    parser.add_argument('--random', type=int, default=300, help='число случайных входов каждой функции')
+    parser.add_argument('--seed', type=int, default=0, help='зерно генератора случайных входов')
+    args = parser.parse_args()
+
+    sources = {'корпус': corpus_cases(args.libraries), 'случайные': random_cases(args.random, args.seed)}
+    mismatched = 0
+    for name, (_, _, loop) in KERNELS.items():
+        for source, cases in sources.items():
+            errors = 0
+            for case, case_args in cases[name]:
+                plain = call(name, None, case_args)
+                looped = call(name, loop, case_args)
+                errors += isinstance(plain, Exception)
+                if not same(plain, looped):
+                    mismatched += 1
+                    print(f'{name}: {case}: не совпадает: {describe(plain)} != {describe(looped)}')
+            print(f'{name}: {source}: входов {len(cases[name])}, из них с ошибкой в обеих реализациях {errors}')
+            if not cases[name]:
+                mismatched += 1
+                print(f'{name}: {source}: нет ни одного входа - проверка ничего не проверила')
+
+    if mismatched:
+        print(f'Расхождений: {mismatched}')
+        raise SystemExit(1)
+    print('Функции на циклах совпадают с реализацией на NumPy')
+
+
+if __name__ == '__main__':
+    main()
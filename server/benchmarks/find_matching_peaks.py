@@ -0,0 +1,119 @@
+"""
+Сравнение find_matching_peaks с исходной реализацией (поиск ближайшего пика через argmin по всему массиву)
+на стандартах длин из Libraries/: проверяет совпадение результатов и печатает время.
+
+Запуск из каталога server: python benchmarks/find_matching_peaks.py [каталог с библиотеками]
+"""
+import sys
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+from pathlib import Path
+
+import numpy as np
+from numpy.typing import NDArray
+from scipy.signal import find_peaks
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'src'))
+
+from lib.matlab.msbackadj import msbackadj  # noqa: E402
+from lib.matlab.wden import wden  # noqa: E402
+from lib.parsing.parsing_any import parse_bytes  # noqa: E402
+from lib.sdfind.find_matching_peaks import find_matching_peaks  # noqa: E402
+
+
+def find_matching_peaks_legacy(
+    denoised_signal: NDArray[np.floating],
+    standard_sizes: NDArray[np.floating],
+    release_times: NDArray[np.floating],
+) -> NDArray[np.integer]:
+    """Исходная реализация для сравнения"""
+    denoised_flipped = np.flip(denoised_signal)
+    poly_coef = np.polyfit(standard_sizes, release_times, 4)
+    new_sizes = np.polyval(poly_coef, np.flip(standard_sizes))
+    size_deltas = np.abs(np.diff(new_sizes))
+    overmuch = len(standard_sizes) * 2.4
+    threshold = np.quantile(denoised_flipped, 0.995, method='hazen')
+    for _ in range(30):
+        threshold *= 0.9
+        peaks = np.empty(0, dtype=np.int64)
+        for _ in range(20):
+            peaks = find_peaks(denoised_flipped, height=threshold, distance=9)[0]
+            if len(peaks) >= len(standard_sizes):
+                break
+            threshold *= 0.9
+        if len(peaks) >= overmuch:
+            break
+        for k in range(len(standard_sizes) - 1):
+            for j in range(k + 1, len(peaks)):
+                base_step = (peaks[j] - peaks[k]) / size_deltas[0]
+                step = base_step
+                filtered_peaks = [0]
+                liz_idx, peak_idx, next_pos = 0, 0, 0
+                while next_pos < peaks[-1] and liz_idx < len(standard_sizes) - 1:
+                    prev_pos = peaks[peak_idx]
+                    delta = step * size_deltas[liz_idx]
+                    next_pos = prev_pos + delta
+                    dists = np.abs(peaks - next_pos)
+                    nearest_idx = np.argmin(dists)
+                    dist = dists[nearest_idx]
+                    if dist < delta / 2:
+                        peak_idx = int(nearest_idx)
+                        filtered_peaks.append(peak_idx)
+                        step = (peaks[nearest_idx] - prev_pos) / size_deltas[liz_idx]
+                        liz_idx += 1
+                    else:
+                        peak_idx = filtered_peaks[0] + 1
+                        filtered_peaks = [peak_idx]
+                        step = base_step
+                        liz_idx = 0
+                if len(filtered_peaks) == len(standard_sizes):
+                    matching_peaks_flipped = peaks[filtered_peaks]
+                    return np.flip(-matching_peaks_flipped + len(denoised_signal) - 1)
+    return np.empty(0, dtype=np.int64)
+
+
+def load_cases(libraries: Path) -> list[tuple[str, NDArray, NDArray, NDArray]]:
+    """Стандарты длин в том виде, в каком их получает find_matching_peaks, плюс заведомо плохие калибровки"""
+    cases = []
+    for path in sorted(libraries.rglob('*.frf')):
+        with redirect_stdout(StringIO()):
+            size_standards, _ = parse_bytes(path.read_bytes(), path.name)
+        for s in size_standards:
+            raw_signal = np.array(s.signal, dtype=np.float64)
+            corrected = msbackadj(np.arange(len(raw_signal)), raw_signal, window_size=140, step_size=40, quantile_value=0.1)
+            denoised = wden(corrected, 'sqtwolog', 's', 'sln', 1, 'sym2')
+            sizes = np.array(s.calibration.sizes, dtype=np.float64)
+            release_times = np.array(s.calibration.release_times, dtype=np.float64)
+            name = f'{path.parent.name}/{path.name}'
+            cases.append((name, denoised, sizes, release_times))
+            # Плохая калибровка: размеры не соответствуют временам выхода, лесенка не находится и перебираются все кандидаты
+            cases.append((f'{name} (неверные размеры)', denoised, sizes, release_times[::-1].copy()))
+    return cases
+
+
+def measure(func, *args, repeat: int = 3) -> tuple[NDArray, float]:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main() -> None:
+    libraries = Path(sys.argv[1]) if len(sys.argv) > 1 else Path(__file__).resolve().parents[2] / 'Libraries'
+    total_legacy = total_new = 0.0
+    for name, denoised, sizes, release_times in load_cases(libraries):
+        legacy, legacy_time = measure(find_matching_peaks_legacy, denoised, sizes, release_times)
+        new, new_time = measure(find_matching_peaks, denoised, sizes, release_times)
+        if not np.array_equal(legacy, new):
+            raise AssertionError(f'{name}: результаты не совпадают: {legacy} != {new}')
+        total_legacy += legacy_time
+        total_new += new_time
+        print(f'{name}: {legacy_time * 1e3:.1f} мс -> {new_time * 1e3:.1f} мс, пиков {len(new)}')
+    print(f'Итого: {total_legacy * 1e3:.1f} мс -> {total_new * 1e3:.1f} мс')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""
+Эталонные результаты sdfind/glfind на Libraries/ для проверки, что оптимизации не меняют результат.
+
+Для каждого каталога библиотек в benchmarks/golden/<каталог>.npz (сжатый) сохраняются все поля SDFindResult
+каждого стандарта длин и GLFindResult каждой геномной библиотеки с каждым стандартом (glfind версий 1 и 2),
+кроме timings. Если анализ падает, вместо полей сохраняется текст ошибки.
+
+    python benchmarks/golden.py save   - пересчитать и сохранить эталон (только после проверенного изменения алгоритма)
+    python benchmarks/golden.py check  - пересчитать и сравнить с эталоном поле за полем
+
+Эталон в golden/ снят после перехода на площади по накопленной сумме трапеций (user-015), поэтому точно
+совпадает только с кодом начиная с этого изменения. С исходной реализацией целые поля и ошибки совпадают точно,
+а дробные поля, зависящие от площадей, расходятся примерно на 5e-9 по абсолютной величине (наибольшее 4.7e-9):
+сравнение с ней проходит только с допуском по умолчанию (rtol 1e-7), при rtol 0 - нет.
+
+Целые поля и ошибки должны совпадать точно, дробные - в пределах --rtol/--atol. При расхождениях печатается
+отчет (запись, поле, вид расхождения, число элементов вне допуска, наибольшие отклонения), при --report
+он же сохраняется в JSON, и скрипт завершается с кодом 1. С --batch библиотеки анализируются через glfind_batch,
+как на сервере, и сравниваются с тем же эталоном.
+
+Запуск из каталога server: python benchmarks/golden.py {save|check} [--libraries КАТАЛОГ] [--golden КАТАЛОГ]
+"""
+import argparse
+import json
+import sys
+import time
+from contextlib import redirect_stdout
+from dataclasses import asdict, fields
+from io import StringIO
+from pathlib import Path
+from typing import Any, Literal
+
+import numpy as np
+from numpy.typing import NDArray
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'src'))
+
+from lib.compare_data import FieldDifference, compare_fields  # noqa: E402
+from lib.glfind.calibration import Calibration  # noqa: E402
+from lib.glfind.glfind import GLFindResult, glfind, glfind_batch  # noqa: E402
+from lib.parsing.parsing_any import parse_bytes  # noqa: E402
+from lib.sdfind.sdfind import SDFindResult, sdfind  # noqa: E402
+
+# Поле записи, в котором вместо результата хранится текст ошибки анализа
+ERROR_FIELD = 'error'
+
+Records = dict[str, dict[str, NDArray]]
+
+
+def analyze_directory(directory: Path, batch: bool) -> Records:
+    """Результаты всех стандартов длин каталога и всех его библиотек с каждым стандартом"""
+    size_standards, gen_libs = [], []
+    for path in sorted(directory.glob('*.frf')):
+        with redirect_stdout(StringIO()):
+            parsed_standards, parsed_libs = parse_bytes(path.read_bytes(), path.name)
+        size_standards += [(path.name, standard) for standard in parsed_standards]
+        gen_libs += [(path.name, gen_lib) for gen_lib in parsed_libs]
+    gen_lib_signals = [np.array(gen_lib.signal, dtype=np.float64) for _, gen_lib in gen_libs]
+
+    records: Records = {}
+    for standard_name, standard in size_standards:
+        sizes = np.array(standard.calibration.sizes, dtype=np.float64)
+        concentrations = np.array(standard.calibration.concentrations, dtype=np.float64)
+        try:
+            sd = sdfind(
+                np.array(standard.signal, dtype=np.float64),
+                sizes,
+                np.array(standard.calibration.release_times, dtype=np.float64),
+                concentrations,
+            )
+        except Exception as ex:
+            records[standard_name] = _error_record(ex)
+            continue
+        records[standard_name] = _result_record(sd)
+
+        calibration = Calibration(sd.peaks, sizes, concentrations)
+        for version in (1, 2):
+            results = _glfind_all(gen_lib_signals, calibration, version, batch)
+            for (gen_lib_name, _), result in zip(gen_libs, results):
+                name = f'{gen_lib_name} @ {standard_name} v{version}'
+                records[name] = _error_record(result) if isinstance(result, Exception) else _result_record(result)
+    return records
+
+
+def _glfind_all(signals: list[NDArray], calibration: Calibration, version: Literal[1, 2], batch: bool) -> list[GLFindResult | Exception]:
+    if not batch:
+        results: list[GLFindResult | Exception] = []
+        for signal in signals:
+            try:
+                results.append(glfind(signal, calibration, version))
+            except Exception as ex:
+                results.append(ex)
+        return results
+
+    # Пакеты из сигналов одной длины, как в lib.analyzis
+    groups: dict[int, list[int]] = {}
+    for i, signal in enumerate(signals):
+        groups.setdefault(len(signal), []).append(i)
+    batch_results: list[GLFindResult | Exception | None] = [None] * len(signals)
+    for indices in groups.values():
+        for i, result in zip(indices, glfind_batch(np.array([signals[i] for i in indices]), calibration, version)):
+            batch_results[i] = result
+    return batch_results  # type: ignore
+
+
+def _result_record(result: SDFindResult | GLFindResult) -> dict[str, NDArray]:
+    return {field.name: np.asarray(getattr(result, field.name)) for field in fields(result) if field.name != 'timings'}
+
+
+def _error_record(ex: Exception) -> dict[str, NDArray]:
+    return {ERROR_FIELD: np.array(f'{type(ex).__name__}: {ex}')}
+
+
+def save_records(path: Path, records: Records) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(path, **{f'{record}/{name}': value for record, values in records.items() for name, value in values.items()})
+
+
+def load_records(path: Path) -> Records:
+    records: Records = {}
+    with np.load(path) as data:
+        for key in data.files:
+            record, name = key.rsplit('/', 1)
+            records.setdefault(record, {})[name] = data[key]
+    return records
+
+
+def compare_records(directory: str, actual: Records, expected: Records, rtol: float, atol: float) -> list[FieldDifference]:
+    differences = []
+    for record in sorted(expected.keys() - actual.keys()):
+        differences.append(FieldDifference(f'{directory}/{record}', '*', 'missing', 'запись отсутствует в результате'))
+    for record in sorted(actual.keys() - expected.keys()):
+        differences.append(FieldDifference(f'{directory}/{record}', '*', 'unexpected', 'записи нет в эталоне'))
+    for record in sorted(actual.keys() & expected.keys()):
+        differences += compare_fields(f'{directory}/{record}', actual[record], expected[record], rtol, atol)
+    return differences
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Эталонные результаты анализа на корпусе Libraries/')
+    parser.add_argument('command', choices=['save', 'check'])
+    parser.add_argument('--libraries', type=Path, default=Path(__file__).resolve().parents[2] / 'Libraries', help='каталог с библиотеками')
+    parser.add_argument('--golden', type=Path, default=Path(__file__).resolve().parent / 'golden', help='каталог с эталонами')
+    parser.add_argument('--batch', action='store_true', help='анализировать библиотеки через glfind_batch')
+    parser.add_argument('--rtol', type=float, default=1e-7, help='относительный допуск для дробных полей')
+    parser.add_argument('--atol', type=float, default=1e-9, help='абсолютный допуск для дробных полей')
+    parser.add_argument('--report', type=Path, help='сохранить отчет о расхождениях в JSON')
+    args = parser.parse_args()
+
+    directories = sorted(path for path in args.libraries.iterdir() if path.is_dir())
+    analyze_seconds = compare_seconds = 0.0
+    differences: list[FieldDifference] = []
+    record_count = 0
+    for directory in directories:
+        start = time.perf_counter()
+        records = analyze_directory(directory, args.batch)
+        analyze_seconds += time.perf_counter() - start
+        record_count += len(records)
+        golden_path = args.golden / f'{directory.name}.npz'
+
+        if args.command == 'save':
+            save_records(golden_path, records)
+            print(f'{directory.name}: записей {len(records)} -> {golden_path}')
+            continue
+
+        if not golden_path.exists():
+            differences.append(FieldDifference(directory.name, '*', 'missing', f'нет эталона {golden_path}'))
+            continue
+        start = time.perf_counter()
+        differences += compare_records(directory.name, records, load_records(golden_path), args.rtol, args.atol)
+        compare_seconds += time.perf_counter() - start
+
+    print(f'Записей: {record_count}, анализ {analyze_seconds:.2f} с, сравнение {compare_seconds:.2f} с')
+    if args.command == 'save':
+        return
+
+    for difference in differences:
+        deviation = f', max abs {difference.max_abs:.3g}, max rel {difference.max_rel:.3g}' if difference.kind == 'values' and difference.max_abs else ''
+        print(f'{difference.record}: {difference.field}: {difference.kind}: {difference.detail}{deviation}')
+    if args.report:
+        report: dict[str, Any] = {
+            'rtol': args.rtol,
+            'atol': args.atol,
+            'records': record_count,
+            'differences': [asdict(difference) for difference in differences],
+        }
+        args.report.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+    if differences:
+        print(f'Расхождений с эталоном: {len(differences)}')
+        raise SystemExit(1)
+    print('Результаты совпадают с эталоном')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+"""
+Замер времени этапов анализа на Libraries/: разбор файлов (parse_file), sdfind и glfind (версии 1 и 2)
+целиком, а также msbackadj, wden, find_matching_peaks и find_significant_peaks2 по отдельности.
+Кроме исходного корпуса замеряются сигналы, искусственно удлиненные в заданное число раз
+(линейная интерполяция по времени, для разбора - FRF-файл с удлиненным сигналом).
+
+Для каждого этапа печатаются число вызовов, медиана времени одного вызова и сумма медиан по всем входам.
+Результат можно сохранить в JSON (--save) и сравнить с ранее сохраненным (--compare): этап, у которого
+сумма медиан выросла больше чем на --tolerance или изменилось число входов либо ошибок, считается регрессией,
+и скрипт завершается с кодом 1.
+Базовые замеры зависят от машины, поэтому сравнивать имеет смысл только прогоны на одной и той же машине.
+
+Запуск из каталога server:
+    python benchmarks/pipeline.py [--libraries КАТАЛОГ] [--scale 1 8] [--repeat 5] [--save base.json] [--compare base.json]
+"""
+import argparse
+import json
+import platform
+import re
+import sys
+import time
+from contextlib import redirect_stdout
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from io import BytesIO, StringIO
+from pathlib import Path
+from statistics import median
+from typing import Any, Callable
+
+import numpy as np
+from numpy.typing import NDArray
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'src'))
+
+from lib.accel import ACCEL_ENABLED  # noqa: E402
+from lib.glfind.calibration import Calibration  # noqa: E402
+from lib.glfind.correct_signals import correct_signals  # noqa: E402
+from lib.glfind.find_significant_peaks2 import find_significant_peaks2  # noqa: E402
+from lib.glfind.glfind import glfind  # noqa: E402
+from lib.matlab.msbackadj import msbackadj  # noqa: E402
+from lib.matlab.wden import wden  # noqa: E402
+from lib.parsing.parsing_any import parse_bytes  # noqa: E402
+from lib.parsing.parsing_frf import read_frf  # noqa: E402
+from lib.sdfind.find_matching_peaks import find_matching_peaks  # noqa: E402
+from lib.sdfind.sdfind import sdfind  # noqa: E402
+from lib.signal.context import SignalContext  # noqa: E402
+
+# Этапы в порядке вывода
+STAGES = [
+    'parse_file',
+    'sdfind',
+    'sdfind.msbackadj',
+    'sdfind.wden',
+    'find_matching_peaks',
+    'glfind v1',
+    'glfind v2',
+    'glfind.correct_signals',
+    'find_significant_peaks2',
+]
+
+# Начало секции отсчетов FRF-файла: все до нее (заголовок, калибровка) переносится в удлиненный файл как есть
+FRF_DATA_START = re.compile(rb'\n\s*<Data>\s*\n\s*<Point')
+
+
+@dataclass
+class StageTimings:
+    """Замеры одного этапа: все замеры, медиана по повторам для каждого входа и число входов, на которых этап упал"""
+    medians: list[float] = field(default_factory=list)
+    calls: list[float] = field(default_factory=list)
+    errors: int = 0
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            'inputs': len(self.medians),
+            'median_ms': median(self.calls) * 1e3 if self.calls else None,
+            'total_ms': sum(self.medians) * 1e3,
+            'errors': self.errors,
+        }
+
+
+@dataclass
+class Benchmark:
+    repeat: int
+    stages: dict[str, StageTimings] = field(default_factory=lambda: {name: StageTimings() for name in STAGES})
+
+    def measure(self, stage: str, function: Callable[..., Any], *args: Any) -> Any:
+        """
+        Вызывает function(*args) один раз для прогрева и repeat раз с замером времени.
+        Возвращает результат или None, если этап упал. Время упавших вызовов тоже пишется (работа до ошибки
+        выполнена), а сами ошибки считаются: на удлиненных сигналах часть библиотек не анализируется
+        """
+        timings = self.stages[stage]
+        result = None
+        try:
+            result = function(*args)
+        except Exception:
+            timings.errors += 1
+        durations = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            try:
+                function(*args)
+            except Exception:
+                pass
+            durations.append(time.perf_counter() - start)
+        timings.medians.append(median(durations))
+        timings.calls += durations
+        return result
+
+
+def lengthen(signal: NDArray[np.number], scale: int) -> NDArray[np.floating]:
+    """Сигнал, растянутый по времени в scale раз линейной интерполяцией"""
+    x = np.arange(len(signal))
+    return np.interp(np.linspace(0, len(signal) - 1, len(signal) * scale), x, signal)
+
+
+def lengthen_frf(content: bytes, scale: int) -> bytes:
+    """FRF-файл с тем же заголовком и отсчетами, растянутыми в scale раз"""
+    match = FRF_DATA_START.search(content)
+    if match is None:
+        raise ValueError('В файле не найдена секция отсчетов')
+    signal = read_frf(BytesIO(content)).signal
+    points = b''.join(
+        b'    <Point>\n      <Data>\n        <int>%d</int>\n        </Data>\n    </Point>\n' % value
+        for value in np.rint(lengthen(signal, scale)).astype(np.int64)
+    )
+    return content[:match.start()] + b'\n  <Data>\n' + points + b'  </Data>\n</RawDocument>\n'
+
+
+def run_dataset(libraries: Path, scale: int, repeat: int) -> dict[str, Any]:
+    """Все этапы на корпусе, удлиненном в scale раз"""
+    benchmark = Benchmark(repeat)
+    for directory in sorted(path for path in libraries.iterdir() if path.is_dir()):
+        size_standards, gen_libs = [], []
+        for path in sorted(directory.glob('*.frf')):
+            content = path.read_bytes()
+            if scale != 1:
+                content = lengthen_frf(content, scale)
+            with redirect_stdout(StringIO()):
+                parsed = benchmark.measure('parse_file', parse_bytes, content, path.name)
+            if parsed is not None:
+                size_standards += parsed[0]
+                gen_libs += parsed[1]
+
+        raw_gen_libs = [np.array(gen_lib.signal, dtype=np.float64) for gen_lib in gen_libs]
+        corrected_gen_libs = [benchmark.measure('glfind.correct_signals', correct_signals, raw_signal) for raw_signal in raw_gen_libs]
+
+        for standard in size_standards:
+            raw_signal = np.array(standard.signal, dtype=np.float64)
+            sizes = np.array(standard.calibration.sizes, dtype=np.float64)
+            release_times = np.array(standard.calibration.release_times, dtype=np.float64)
+            concentrations = np.array(standard.calibration.concentrations, dtype=np.float64)
+
+            corrected_signal = benchmark.measure('sdfind.msbackadj', msbackadj, np.arange(len(raw_signal)), raw_signal, 140, 40, 0.1)
+            if corrected_signal is not None:
+                denoised_signal = benchmark.measure('sdfind.wden', wden, corrected_signal, 'sqtwolog', 's', 'sln', 1, 'sym2')
+                if denoised_signal is not None:
+                    benchmark.measure('find_matching_peaks', find_matching_peaks, denoised_signal, sizes, release_times)
+
+            sd = benchmark.measure('sdfind', sdfind, raw_signal, sizes, release_times, concentrations)
+            if sd is None:
+                continue
+            calibration = Calibration(sd.peaks, sizes, concentrations)
+            for raw_gen_lib, corrected_gen_lib in zip(raw_gen_libs, corrected_gen_libs):
+                if corrected_gen_lib is not None:
+                    # Новый контекст на каждый вызов, чтобы в замер входили сглаживание и производные
+                    benchmark.measure('find_significant_peaks2', _find_significant_peaks2, corrected_gen_lib, calibration.standard_peaks)
+                for version in (1, 2):
+                    benchmark.measure(f'glfind v{version}', glfind, raw_gen_lib, calibration, version)
+
+    return {name: timings.summary() for name, timings in benchmark.stages.items()}
+
+
+def _find_significant_peaks2(corrected_signal: NDArray[np.floating], standard_peaks: NDArray[np.integer]) -> Any:
+    return find_significant_peaks2(SignalContext(corrected_signal), standard_peaks)
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any], tolerance: float) -> list[str]:
+    """
+    Этапы, сумма медиан которых выросла относительно базового замера больше чем на tolerance,
+    а также этапы, у которых изменилось число входов или ошибок - их время с базовым не сравнимо
+    """
+    regressions = []
+    for dataset, stages in current['datasets'].items():
+        base_stages = baseline['datasets'].get(dataset)
+        if base_stages is None:
+            print(f'{dataset}: нет в базовом замере')
+            continue
+        print(f'\n{dataset}: сравнение с базовым замером от {baseline["created"]}')
+        for name, stage in stages.items():
+            base = base_stages.get(name)
+            if base is None or not base['total_ms'] or not stage['inputs']:
+                continue
+            ratio = stage['total_ms'] / base['total_ms']
+            changed = (stage['inputs'], stage['errors']) != (base['inputs'], base['errors'])
+            regressed = ratio > 1 + tolerance or changed
+            mark = '  РЕГРЕССИЯ' if regressed else ''
+            print(f'  {name:<24} {base["total_ms"]:9.1f} мс -> {stage["total_ms"]:9.1f} мс  x{ratio:.2f}{mark}')
+            if changed:
+                print(f'  {"":<24} входов {base["inputs"]} -> {stage["inputs"]}, ошибок {base["errors"]} -> {stage["errors"]}')
+            if regressed:
+                regressions.append(f'{dataset}/{name}')
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Замер времени этапов анализа на корпусе Libraries/')
+    parser.add_argument('--libraries', type=Path, default=Path(__file__).resolve().parents[2] / 'Libraries', help='каталог с библиотеками')
+    parser.add_argument('--scale', type=int, nargs='+', default=[1, 8], help='во сколько раз удлинять сигналы (1 - исходный корпус)')
+    parser.add_argument('--repeat', type=int, default=5, help='число замеров каждого вызова')
+    parser.add_argument('--save', type=Path, help='сохранить результат в JSON')
+    parser.add_argument('--compare', type=Path, help='сравнить с сохраненным результатом')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='допустимый относительный рост времени этапа')
+    args = parser.parse_args()
+
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'machine': {
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'accel': ACCEL_ENABLED,
+        },
+        'repeat': args.repeat,
+        'datasets': {},
+    }
+    for scale in args.scale:
+        dataset = f'x{scale}'
+        stages = run_dataset(args.libraries, scale, args.repeat)
+        report['datasets'][dataset] = stages
+        print(f'\n{dataset}: {"этап":<24} {"входов":>7} {"медиана, мс":>12} {"сумма, мс":>10} {"ошибок":>7}')
+        for name, stage in stages.items():
+            median_ms = f'{stage["median_ms"]:.2f}' if stage['median_ms'] is not None else '-'
+            print(f'{"":<{len(dataset)}}  {name:<24} {stage["inputs"]:>7} {median_ms:>12} {stage["total_ms"]:>10.1f} {stage["errors"]:>7}')
+
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        args.save.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f'\nСохранено в {args.save}')
+
+    if args.compare:
+        regressions = compare(report, json.loads(args.compare.read_text(encoding='utf-8')), args.tolerance)
+        if regressions:
+            print(f'\nРегрессии: {", ".join(regressions)}')
+            raise SystemExit(1)
+        print('\nРегрессий нет')
+
+
+if __name__ == '__main__':
+    main()
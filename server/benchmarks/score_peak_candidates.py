@@ -0,0 +1,414 @@
+"""
+Сравнение score_peak_candidates и find_significant_peaks2 с исходной реализацией (оценка кандидатов циклами
+по каждому пику, выбор реперов через isin/setdiff1d) на геномных библиотеках из Libraries/ и на случайных
+зашумленных сигналах с тысячами кандидатов: проверяет совпадение результатов (или одинаковую ошибку) и печатает время.
+
+Исходная реализация ищет положение максимума окна +-4 отсчета по значению (первое такое значение во всем сигнале),
+новая - по индексу внутри окна. Баллы могут расходиться только у кандидатов, максимум окна которых встречается
+в сигнале раньше самого окна, а результат find_significant_peaks2 - только на сигналах с такими кандидатами:
+эти входы печатаются отдельно и не считаются ошибкой. На сигналах без равных значений сравнение точное.
+
+Запуск из каталога server: python benchmarks/score_peak_candidates.py [--libraries КАТАЛОГ] [--random 50] [--seed 0]
+"""
+import argparse
+import sys
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+from numpy.typing import NDArray
+from scipy.signal import savgol_filter, find_peaks, peak_widths, peak_prominences
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'src'))
+
+from lib.glfind.correct_signals import correct_signals  # noqa: E402
+from lib.glfind.find_significant_peaks2 import find_significant_peaks2  # noqa: E402
+from lib.glfind.score_peak_candidates import score_peak_candidates  # noqa: E402
+from lib.parsing.parsing_any import parse_bytes  # noqa: E402
+from lib.sdfind.sdfind import sdfind  # noqa: E402
+from lib.signal.context import SignalContext  # noqa: E402
+
+Candidates = tuple[NDArray, NDArray, NDArray, NDArray]
+
+
+def peak_candidates_legacy(corrected_signal: NDArray[np.floating]) -> Candidates:
+    """Кандидаты в пики и их параметры, как в исходной find_significant_peaks2"""
+    smoothed = savgol_filter(corrected_signal, 5, 1)
+    first_derivative = np.diff(smoothed)
+    first_derivative_smoothed = savgol_filter(first_derivative, 5, 1)
+    second_derivative = np.diff(first_derivative_smoothed)
+    second_derivative_smoothed = savgol_filter(second_derivative, 5, 1)
+
+    peak_candidate_signal = -second_derivative_smoothed
+    peak_candidate_signal[peak_candidate_signal < 0] = 0
+
+    # Нахождение пиков
+    peak_indices = find_peaks(peak_candidate_signal)[0]
+    peak_heights = peak_candidate_signal[peak_indices]
+    peak_proms = peak_prominences(peak_candidate_signal, peak_indices)[0]
+    peak_width = peak_widths(peak_candidate_signal, peak_indices)[0]
+
+    # Удаляем все крайние пики, найденные на прошлом шаге, из всех массивов
+    valid_mask = (peak_indices > 15) & (peak_indices < (len(corrected_signal) - 10))
+    return peak_indices[valid_mask], peak_heights[valid_mask], peak_width[valid_mask], peak_proms[valid_mask]
+
+
+def score_peak_candidates_legacy(
+    corrected_signal: NDArray[np.floating],
+    peak_indices: NDArray[np.integer],
+    peak_heights: NDArray[np.floating],
+    peak_width: NDArray[np.floating],
+    peak_proms: NDArray[np.floating],
+    standard_peaks: NDArray[np.integer],
+) -> NDArray[np.floating]:
+    """Исходная оценка кандидатов (этапы 1-6 find_significant_peaks2) для сравнения"""
+    Points = np.zeros_like(peak_proms, dtype=float)
+
+    orders = np.floor(np.log10(np.abs(peak_proms))).astype(int)
+    max_order = np.max(orders)
+
+    r_peak_proms = peak_proms.copy()
+
+    for i in range(len(peak_proms)):
+        if peak_proms[i] != 0 and orders[i] < max_order:
+            r_peak_proms[i] = np.round(peak_proms[i], -orders[i])
+
+    orders = np.floor(np.log10(np.abs(r_peak_proms))).astype(int)
+
+    unique_orders = np.unique(orders)
+    unique_orders = unique_orders[unique_orders != max_order]
+
+    lower_orders = unique_orders[unique_orders < max_order]
+
+    if len(lower_orders) > 0:
+        selected_mask = (orders == max_order) | (orders == lower_orders.max())
+    else:
+        selected_mask = (orders == max_order)
+
+    Points[selected_mask] += 1
+
+    idx_widths = np.argsort(-peak_width)
+    sorted_widths = peak_width[idx_widths]
+    n = len(sorted_widths)
+
+    if n > 1:
+        norm_widths = (sorted_widths - sorted_widths.min()) / (sorted_widths.max() - sorted_widths.min())
+    else:
+        norm_widths = np.array([1.0])
+
+    for k in range(n):
+        Points[idx_widths[k]] += norm_widths[k]
+
+    R = peak_heights / peak_width
+    idx_R = np.argsort(-R)
+    sorted_R = R[idx_R]
+    nR = len(sorted_R)
+
+    if nR > 1:
+        norm_R = (sorted_R - sorted_R.min()) / (sorted_R.max() - sorted_R.min())
+    else:
+        norm_R = np.array([1.0])
+
+    Points[idx_R] += norm_R
+
+    selectedPeaks = corrected_signal[peak_indices]
+    threshold = np.mean(selectedPeaks) / 3.0
+
+    for i in range(len(peak_indices)):
+        if corrected_signal[peak_indices[i]] > threshold:
+            Points[i] += 1
+
+    for i in range(len(peak_indices)):
+        left_val, max_val, right_val = dl_peaks_legacy(corrected_signal, peak_indices[i])
+
+        if (left_val < 0.9 * max_val and right_val < 0.9 * max_val) or orders[i] == max_order:
+            Points[i] += 1
+
+    first_reper_idx = np.where(np.abs(peak_indices - standard_peaks[0]) <= 100)[0]
+
+    vals = peak_indices[first_reper_idx]
+    idx_sort = np.argsort(vals)
+    sorted_vals = vals[idx_sort]
+    nVals = len(sorted_vals)
+
+    if nVals > 1:
+        norm_vals = (sorted_vals - sorted_vals.min()) / (sorted_vals.max() - sorted_vals.min())
+        adj_vals = 0.5 - norm_vals
+    else:
+        adj_vals = np.array([0.5])
+
+    for k in range(nVals):
+        orig_idx = first_reper_idx[idx_sort[k]]
+        Points[orig_idx] += adj_vals[k]
+
+    return Points
+
+
+def find_significant_peaks2_legacy(
+    corrected_signal: NDArray[np.floating],
+    standard_peaks: NDArray[np.integer],
+) -> tuple[NDArray[np.integer], NDArray[np.integer], NDArray[np.integer]]:
+    """Исходная find_significant_peaks2 для сравнения"""
+    peak_indices, peak_heights, peak_width, peak_proms = peak_candidates_legacy(corrected_signal)
+    Points = score_peak_candidates_legacy(corrected_signal, peak_indices, peak_heights, peak_width, peak_proms, standard_peaks)
+
+    max_point_val = int(np.floor(Points.max()))
+    peak_for_choose = np.where(np.floor(Points) == max_point_val)[0]
+
+    current_val = max_point_val - 1
+
+    while len(peak_for_choose) < 5 and current_val >= 0:
+        idx_extra = np.where(np.floor(Points) == current_val)[0]
+        peak_for_choose = np.unique(np.concatenate([peak_for_choose, idx_extra]))
+        current_val -= 1
+
+    k = 100
+    first_reper_mask = np.abs(peak_indices - standard_peaks[0]) <= k
+    first_reper_idx = np.where(first_reper_mask)[0]
+
+    pre_first_reper = peak_for_choose[np.isin(peak_for_choose, first_reper_idx)]
+    pre_second_reper = np.setdiff1d(peak_for_choose, pre_first_reper)
+
+    while len(pre_second_reper) == 0 and current_val >= 0:
+        idx_extra = np.where(np.floor(Points) == current_val)[0]
+        peak_for_choose = np.unique(np.concatenate([peak_for_choose, idx_extra]))
+        current_val -= 1
+
+        first_reper_idx = np.where(np.abs(peak_indices - standard_peaks[0]) <= k)[0]
+        pre_first_reper = peak_for_choose[np.isin(peak_for_choose, first_reper_idx)]
+        pre_second_reper = np.setdiff1d(peak_for_choose, pre_first_reper)
+
+        if len(peak_for_choose) > 10:
+            while len(peak_for_choose) > 10 and k > 50:
+                k -= 10
+                first_reper_idx = np.where(np.abs(peak_indices - standard_peaks[0]) <= k)[0]
+                pre_first_reper = peak_for_choose[np.isin(peak_for_choose, first_reper_idx)]
+                pre_second_reper = np.setdiff1d(peak_for_choose, pre_first_reper)
+
+                if len(pre_second_reper) > 0:
+                    break
+
+            min_point_val = int(np.floor(Points[peak_for_choose]).min())
+            idx_remove = np.where(np.floor(Points) == min_point_val)[0]
+
+            peak_for_choose = np.setdiff1d(peak_for_choose, idx_remove)
+
+            first_reper_idx = np.where(np.abs(peak_indices - standard_peaks[0]) <= k)[0]
+            pre_first_reper = peak_for_choose[np.isin(peak_for_choose, first_reper_idx)]
+            pre_second_reper = np.setdiff1d(peak_for_choose, pre_first_reper)
+
+    pre_reper = np.unique(np.concatenate([pre_first_reper, pre_second_reper]))
+    pre_points = Points[pre_reper]
+    max_order = int(np.floor(pre_points.max()))
+
+    sort_idx = np.argsort(-Points[pre_reper])
+    pre_reper = pre_reper[sort_idx]
+
+    max_val = Points[pre_first_reper].max()
+    first_reper_idx = pre_first_reper[Points[pre_first_reper] == max_val]
+
+    if len(pre_first_reper) > 1:
+        pre_first_reper = unrec_clean_legacy(pre_reper, max_order, Points, pre_first_reper)
+        pre_first_reper = np.setdiff1d(pre_first_reper, first_reper_idx)
+    else:
+        pre_first_reper = np.array([], dtype=int)
+
+    first_reper = peak_indices[first_reper_idx][0]
+
+    left_idx = first_reper - 4
+    right_idx = first_reper + 4
+
+    max_value = corrected_signal[left_idx:right_idx].max()
+    first_reper = np.where(corrected_signal == max_value)[0][0]
+    peak_indices[first_reper_idx] = first_reper
+
+    max_val = Points[pre_second_reper].max()
+    second_reper_idx = pre_second_reper[Points[pre_second_reper] == max_val]
+
+    if len(pre_second_reper) > 1:
+        pre_second_reper = unrec_clean_legacy(pre_reper, max_order, Points, pre_second_reper)
+        pre_second_reper = np.setdiff1d(pre_second_reper, second_reper_idx)
+    else:
+        pre_second_reper = np.array([], dtype=int)
+
+    second_reper = peak_indices[second_reper_idx][0]
+
+    left_idx = second_reper - 4
+    right_idx = second_reper + 4
+
+    max_value = corrected_signal[left_idx:right_idx].max()
+    second_reper = np.where(corrected_signal == max_value)[0][0]
+    peak_indices[second_reper_idx] = second_reper
+
+    pre_unrecognized_peaks = np.unique(
+        np.concatenate([peak_indices[pre_first_reper], peak_indices[pre_second_reper]])
+    )
+
+    reference_peaks = np.sort([first_reper, second_reper])
+
+    selectedPeaks = corrected_signal[peak_indices]
+    sd_Peaks = corrected_signal[reference_peaks]
+    threshold = np.mean(sd_Peaks) / 4.0
+
+    selectedPeaks = selectedPeaks[selectedPeaks >= threshold]
+    selected_peaks = np.where(np.isin(corrected_signal, selectedPeaks))[0]
+
+    return selected_peaks, pre_unrecognized_peaks, reference_peaks
+
+
+def unrec_clean_legacy(pre_reper, max_order, Points, pre_find_reper):
+    pre_points = Points[pre_find_reper]
+    keep_mask = np.floor(pre_points) >= (max_order - 1)
+    return pre_find_reper[keep_mask]
+
+
+def dl_peaks_legacy(denoised_data, lonely_pks):
+    left_idx = max(lonely_pks - 4, 0)
+    right_idx = min(lonely_pks + 4, len(denoised_data) - 1)
+
+    window = denoised_data[left_idx:right_idx + 1]
+    max_value = np.max(window)
+
+    peak_idx = np.where(denoised_data == max_value)[0][0]
+
+    left_idx = max(peak_idx - 4, 0)
+    right_idx = min(peak_idx + 4, len(denoised_data) - 1)
+    return denoised_data[left_idx], max_value, denoised_data[right_idx]
+
+
+def found_earlier(corrected_signal: NDArray[np.floating], centers: NDArray[np.integer], stop: int) -> NDArray[np.bool_]:
+    """
+    Для каждого кандидата: встречается ли максимум окна [center - 4, center + stop) в сигнале раньше самого окна -
+    тогда поиск по значению и поиск по индексу дают разные положения максимума
+    (кандидаты лежат дальше 15 отсчетов от начала и 10 от конца сигнала, так что окна не выходят за его края)
+    """
+    result = np.zeros(len(centers), dtype=bool)
+    for i, center in enumerate(centers):
+        window_max = corrected_signal[center - 4:center + stop].max()
+        result[i] = np.any(corrected_signal[:center - 4] == window_max)
+    return result
+
+
+def load_cases(libraries: Path) -> list[tuple[str, NDArray, NDArray]]:
+    """Скорректированные сигналы библиотек с пиками каждого стандарта длин из того же каталога"""
+    cases = []
+    for directory in sorted(path for path in libraries.iterdir() if path.is_dir()):
+        size_standards, gen_libs = [], []
+        for path in sorted(directory.glob('*.frf')):
+            with redirect_stdout(StringIO()):
+                parsed_standards, parsed_libs = parse_bytes(path.read_bytes(), path.name)
+            size_standards += parsed_standards
+            gen_libs += [(path.name, gen_lib) for gen_lib in parsed_libs]
+        standard_peaks = []
+        for standard in size_standards:
+            try:
+                standard_peaks.append(sdfind(
+                    np.array(standard.signal, dtype=np.float64),
+                    np.array(standard.calibration.sizes, dtype=np.float64),
+                    np.array(standard.calibration.release_times, dtype=np.float64),
+                    np.array(standard.calibration.concentrations, dtype=np.float64),
+                ).peaks)
+            except Exception:
+                continue
+        for name, gen_lib in gen_libs:
+            corrected_signal = correct_signals(np.array(gen_lib.signal, dtype=np.float64))
+            for k, peaks in enumerate(standard_peaks):
+                cases.append((f'{directory.name}/{name} @ стандарт {k}', corrected_signal, peaks))
+    return cases
+
+
+def random_cases(count: int, seed: int) -> list[tuple[str, NDArray, NDArray]]:
+    """
+    Случайные сигналы: лесенка гауссовых пиков (реперы по краям) на зашумленной базовой линии, 20-60 тыс. отсчетов.
+    Шум дает тысячи кандидатов; часть сигналов округляется до целых, чтобы в окнах встречались равные значения
+    """
+    rng = np.random.default_rng(seed)
+    cases = []
+    for k in range(count):
+        length = int(rng.integers(20000, 60000))
+        x = np.arange(length)
+        standard_peaks = np.sort(rng.choice(np.arange(500, length - 500), size=int(rng.integers(8, 20)), replace=False))
+        signal = rng.normal(0, rng.uniform(1, 20), length) + np.cumsum(rng.normal(0, 0.05, length))
+        for position in standard_peaks:
+            signal += rng.uniform(200, 2000) * np.exp(-0.5 * ((x - position) / rng.uniform(2, 8)) ** 2)
+        library = rng.uniform(length * 0.3, length * 0.7)
+        signal += rng.uniform(50, 500) * np.exp(-0.5 * ((x - library) / rng.uniform(200, 2000)) ** 2)
+        if k % 3 == 0:
+            signal = np.rint(signal)
+        cases.append((f'случайный {k} ({length} отсчетов)', signal, standard_peaks))
+    return cases
+
+
+def measure(func: Callable[..., Any], *args: Any, repeat: int = 3) -> tuple[Any, float]:
+    """Лучшее время из repeat вызовов; упавший вызов возвращает исключение вместо результата"""
+    best = float('inf')
+    result: Any = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            result = func(*args)
+        except Exception as ex:
+            result = ex
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def same_result(legacy: Any, new: Any) -> bool:
+    if isinstance(legacy, Exception) or isinstance(new, Exception):
+        return type(legacy) is type(new) and str(legacy) == str(new)
+    if isinstance(legacy, tuple):
+        return all(np.array_equal(a, b) for a, b in zip(legacy, new))
+    # Кандидат нулевой ширины дает NaN в баллах обеих реализаций
+    return np.array_equal(legacy, new, equal_nan=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Сравнение оценки кандидатов в пики с исходной реализацией')
+    parser.add_argument('--libraries', type=Path, default=Path(__file__).resolve().parents[2] / 'Libraries', help='каталог с библиотеками')
+    parser.add_argument('--random', type=int, default=50, help='число случайных сигналов')
+    parser.add_argument('--seed', type=int, default=0, help='зерно генератора случайных сигналов')
+    args = parser.parse_args()
+
+    totals = {'score': [0.0, 0.0], 'fsp2': [0.0, 0.0]}
+    candidates = 0
+    explained = []
+    for name, corrected_signal, standard_peaks in load_cases(args.libraries) + random_cases(args.random, args.seed):
+        peak_indices, peak_heights, peak_width, peak_proms = peak_candidates_legacy(corrected_signal)
+        candidates += len(peak_indices)
+        score_args = (corrected_signal, peak_indices, peak_heights, peak_width, peak_proms, standard_peaks)
+        legacy_points, legacy_time = measure(score_peak_candidates_legacy, *score_args)
+        new_points, new_time = measure(score_peak_candidates, *score_args)
+        totals['score'][0] += legacy_time
+        totals['score'][1] += new_time
+        # Окно +-4 у этапа 5 и [-4, +4) у выравнивания реперов
+        ambiguous = found_earlier(corrected_signal, peak_indices, 5) | found_earlier(corrected_signal, peak_indices, 4)
+        if not same_result(legacy_points, new_points):
+            if isinstance(legacy_points, Exception) or isinstance(new_points, Exception):
+                raise AssertionError(f'{name}: баллы кандидатов не совпадают: {legacy_points!r} != {new_points!r}')
+            different = (legacy_points != new_points) & ~(np.isnan(legacy_points) & np.isnan(new_points))
+            if np.any(different & ~ambiguous):
+                raise AssertionError(f'{name}: баллы кандидатов не совпадают: {np.flatnonzero(different & ~ambiguous)}')
+            explained.append(f'{name}: баллы {np.count_nonzero(different)} кандидатов')
+
+        legacy_peaks, legacy_time = measure(find_significant_peaks2_legacy, corrected_signal.copy(), standard_peaks)
+        # Новый контекст на каждый вызов, чтобы в замер входили сглаживание и производные
+        new_peaks, new_time = measure(lambda: find_significant_peaks2(SignalContext(corrected_signal.copy()), standard_peaks))
+        totals['fsp2'][0] += legacy_time
+        totals['fsp2'][1] += new_time
+        if not same_result(legacy_peaks, new_peaks):
+            if not ambiguous.any():
+                raise AssertionError(f'{name}: результаты find_significant_peaks2 не совпадают: {legacy_peaks} != {new_peaks}')
+            explained.append(f'{name}: find_significant_peaks2')
+
+    for line in explained:
+        print(f'{line}: расхождение из-за поиска максимума по индексу, а не по значению')
+    print(f'Кандидатов всего: {candidates}')
+    print(f'score_peak_candidates: {totals["score"][0] * 1e3:.1f} мс -> {totals["score"][1] * 1e3:.1f} мс')
+    print(f'find_significant_peaks2: {totals["fsp2"][0] * 1e3:.1f} мс -> {totals["fsp2"][1] * 1e3:.1f} мс')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+from typing import TypeVar
+
+from pydantic import BaseModel, TypeAdapter
+from sqlmodel import Session, select
+
+from lib.analyzis import ALGORITHM_VERSION
+from models.database import AnalysisResultDB
+from models.ndarray import decode_record, encode_record, is_record
+
+T = TypeVar('T')
+
+
+def pack_analysis_outcome(outcome: BaseModel) -> bytes:
+    """Компактная бинарная запись результата анализа: массивы хранятся как float64/int64, а не текстом JSON"""
+    return encode_record(outcome.model_dump())
+
+
+def unpack_analysis_outcome(payload: bytes, adapter: TypeAdapter[T]) -> T:
+    if is_record(payload):
+        return adapter.validate_python(decode_record(payload))
+    # Записи, сохраненные до перехода на бинарный формат, хранятся в JSON
+    return adapter.validate_json(payload)
+
+
+def load_analysis_results(session: Session, parse_result_id: int | None, size_standard_id: int | None) -> dict[int | None, AnalysisResultDB]:
+    """Сохраненные результаты анализа стандарта длин и библиотек с ним, ключ - идентификатор библиотеки (None - сам стандарт)"""
+    statement = select(AnalysisResultDB).where(
+        AnalysisResultDB.parsed_result_id == parse_result_id,
+        AnalysisResultDB.size_standard_id == size_standard_id,
+    )
+    return {row.gen_lib_id: row for row in session.exec(statement).all()}
+
+
+def stored_analysis_outcome(row: AnalysisResultDB | None, input_key: str, adapter: TypeAdapter[T]) -> T | None:
+    """Результат из базы, если он посчитан той же версией алгоритма по тем же входным данным, иначе None"""
+    if row is None or row.algorithm_version != ALGORITHM_VERSION or row.input_key != input_key:
+        return None
+    return unpack_analysis_outcome(row.payload, adapter)
+
+
+def save_analysis_result(
+    session: Session,
+    parse_result_id: int | None,
+    size_standard_id: int | None,
+    gen_lib_id: int | None,
+    input_key: str,
+    outcome: BaseModel,
+) -> None:
+    """Сохраняет результат анализа, заменяя предыдущий для той же пары стандарт длин - библиотека"""
+    statement = select(AnalysisResultDB).where(
+        AnalysisResultDB.parsed_result_id == parse_result_id,
+        AnalysisResultDB.size_standard_id == size_standard_id,
+        AnalysisResultDB.gen_lib_id == gen_lib_id,
+    )
+    for previous in session.exec(statement).all():
+        session.delete(previous)
+    session.add(AnalysisResultDB(
+        parsed_result_id=parse_result_id,
+        size_standard_id=size_standard_id,
+        gen_lib_id=gen_lib_id,
+        algorithm_version=ALGORITHM_VERSION,
+        input_key=input_key,
+        payload=pack_analysis_outcome(outcome),
+    ))
@@ -1,26 +1,71 @@
-from fastapi import FastAPI, File, HTTPException, UploadFile, Depends
+import asyncio
+import os
+from time import perf_counter
+
+from fastapi import FastAPI, File, Header, HTTPException, Query, Request, Response, UploadFile, Depends
+from fastapi.responses import StreamingResponse
 from sqlmodel import Session, desc, select
 
-from database import get_session
-from lib.analyzis import analyze_size_standard, analyze_gen_lib
-from lib.parsing.parsing_any import parse_file
-from models.models import GenLibAnalyzeError, GenLibAnalyzeResult, GenLibParseResult, GenLibDescription, GenLibsAnalyzeInput, GenLibsAnalyzeOutput, ParseResult, ParseResultDescription, SizeStandardAnalyzeError, SizeStandardAnalyzeInput, SizeStandardAnalyzeOutput, SizeStandardAnalyzeResult, SizeStandardCalibration, SizeStandardParseResult, SizeStandardDescription
+from analysis_results import load_analysis_results, save_analysis_result, stored_analysis_outcome
+from database import engine, get_session
+from jobs import GenLibsJob, GenLibsJobs
+from lib.cache import AnalysisCache
+from lib.analyzis import analyze_size_standards, analyze_size_standards_iter, analyze_gen_libs, analyze_gen_libs_iter, downsample_gen_lib_outcome, gen_lib_zoom, gen_lib_cache_key, gen_lib_outcome_adapter, size_standard_cache_key, size_standard_outcome_adapter
+from lib.parsing.parsing_any import parse_bytes
+from lib.timing import TIMING_ENABLED, call_recorded, current_recorder, recording
+from metrics import MetricsCollector, server_timing_header
+from models.models import AnalysisCacheStats, AnalysisMetrics, GenLibAnalyzeError, GenLibAnalyzeResult, GenLibParseResult, GenLibDescription, GenLibsAnalyzeInput, GenLibsAnalyzeOutput, GenLibsJobOutput, GenLibsJobStatus, GenLibZoomOutput, ParseResult, ParseResultAnalyzeInput, ParseResultAnalyzeOutput, ParseResultDescription, SizeStandardAnalyzeInput, SizeStandardAnalyzeOutput, SizeStandardCalibration, SizeStandardParseResult, SizeStandardDescription
 from models.database import GenLibDB, ParseResultDB, SizeStandardDB
+from responses import RECORD_RESPONSES, STREAM_RESPONSES, accepts_ndjson, analysis_response, ndjson_response
+from workers import WORKER_COUNT, get_executor
 
 
 apiRoute = FastAPI(title='ND Forez API')
 
+# Кэш результатов анализа: LRU в памяти, при ND_FOREZ_CACHE_PERSISTENT=1 - еще и в базе данных
+analysis_cache = AnalysisCache(
+    max_size=int(os.environ.get('ND_FOREZ_CACHE_SIZE', 128)),
+    engine=engine if os.environ.get('ND_FOREZ_CACHE_PERSISTENT') == '1' else None,
+)
+
+# Фоновые задачи анализа библиотек, результаты последних ND_FOREZ_JOBS задач доступны по идентификатору
+jobs = GenLibsJobs(max_jobs=int(os.environ.get('ND_FOREZ_JOBS', 32)), cache=analysis_cache)
+
+# Замеры этапов по всем запросам, при ND_FOREZ_TIMING=1 (см. lib.timing)
+metrics = MetricsCollector()
+
+if TIMING_ENABLED:
+    @apiRoute.middleware('http')
+    async def record_timings(request: Request, call_next):
+        """Замеряет этапы запроса, отдает их в заголовке Server-Timing и добавляет к /api/metrics"""
+        start = perf_counter()
+        with recording() as recorder:
+            response = await call_next(request)
+        response.headers['Server-Timing'] = server_timing_header(recorder, perf_counter() - start)
+        metrics.add(recorder.entries)
+        return response
+
 
 @apiRoute.post("/parse-files")
 async def do_parse(files: list[UploadFile] = File(...), session: Session = Depends(get_session)) -> ParseResult:
     standards: list[SizeStandardParseResult] = []
     genlibs: list[GenLibParseResult] = []
 
+    # Разбор файлов - CPU-нагрузка, поэтому раздаем его пулу процессов и ждем результаты в порядке загрузки
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    parse_tasks = []
     for file in files:
         print(f"Received {file.filename}")
-        s, g = parse_file(file.file, file.filename or 'unknown')
+        content = await file.read()
+        parse_tasks.append(loop.run_in_executor(executor, call_recorded, parse_bytes, content, file.filename or 'unknown'))
+
+    recorder = current_recorder()
+    for (s, g), entries in await asyncio.gather(*parse_tasks):
         standards += s
         genlibs += g
+        if recorder is not None:
+            recorder.entries += entries
 
     if not standards and not genlibs:
         raise HTTPException(status_code=422, detail='В файлах отсутствуют данные')
@@ -51,6 +96,11 @@ async def do_parse(files: list[UploadFile] = File(...), session: Session = Depen
     session.commit()
     session.refresh(parse_result_db)
 
+    for s, s_db in zip(standards, standards_db):
+        s.description.id = s_db.id
+    for g, g_db in zip(genlibs, genlibs_db):
+        g.description.id = g_db.id
+
     return ParseResult(
         id=parse_result_db.id,
         size_standards=standards,
@@ -58,26 +108,69 @@ async def do_parse(files: list[UploadFile] = File(...), session: Session = Depen
     )
 
 
-@apiRoute.post('/analyze-size-standards')
-def do_analyze_size_standard(input: SizeStandardAnalyzeInput) -> SizeStandardAnalyzeOutput:
-    result: list[SizeStandardAnalyzeResult | SizeStandardAnalyzeError] = []
-    for size_standard in input.items:
-        result.append(analyze_size_standard(size_standard.raw_signal, size_standard.calibration))
-    return SizeStandardAnalyzeOutput(
+@apiRoute.post('/analyze-size-standards', response_model=SizeStandardAnalyzeOutput, responses=STREAM_RESPONSES)
+def do_analyze_size_standard(input: SizeStandardAnalyzeInput, request: Request) -> Response:
+    items = [(size_standard.raw_signal, size_standard.calibration) for size_standard in input.items]
+    if accepts_ndjson(request):
+        return ndjson_response(analyze_size_standards_iter(items, get_executor(), analysis_cache, WORKER_COUNT))
+    result = analyze_size_standards(items, get_executor(), analysis_cache)
+    # Результаты уже проверены при создании, повторная проверка не нужна
+    return analysis_response(request, SizeStandardAnalyzeOutput.model_construct(
         data=result,
-    )
+    ))
 
 
-@apiRoute.post('/analyze-gen-libs')
-def do_analyze_gen_lib(input: GenLibsAnalyzeInput) -> GenLibsAnalyzeOutput:
-    result: list[GenLibAnalyzeResult | GenLibAnalyzeError] = []
-    for raw_signal in input.raw_signals:
-        result.append(analyze_gen_lib(raw_signal, input.size_standard_analyze_peaks))
-    return GenLibsAnalyzeOutput(
-        data=result,
+@apiRoute.post('/analyze-gen-libs', response_model=GenLibsAnalyzeOutput, responses=STREAM_RESPONSES)
+def do_analyze_gen_lib(input: GenLibsAnalyzeInput, request: Request) -> Response:
+    if accepts_ndjson(request):
+        results = analyze_gen_libs_iter(input.raw_signals, input.size_standard_analyze_peaks, get_executor(), analysis_cache, WORKER_COUNT)
+        return ndjson_response((i, downsample_gen_lib_outcome(r, input.max_points)) for i, r in results)
+    result = analyze_gen_libs(input.raw_signals, input.size_standard_analyze_peaks, get_executor(), analysis_cache, WORKER_COUNT)
+    return analysis_response(request, GenLibsAnalyzeOutput.model_construct(
+        data=[downsample_gen_lib_outcome(r, input.max_points) for r in result],
+    ))
+
+
+@apiRoute.post('/jobs/gen-libs', status_code=202)
+async def create_gen_libs_job(input: GenLibsAnalyzeInput) -> GenLibsJobStatus:
+    """
+    Анализ библиотек в фоне: сразу возвращает идентификатор задачи, результаты библиотек по мере готовности
+    приходят в /jobs/{job_id}/events, все готовые результаты - в /jobs/{job_id}
+    """
+    job = jobs.create(input.raw_signals, input.size_standard_analyze_peaks, input.max_points, get_executor())
+    return job.status()
+
+
+@apiRoute.get('/jobs/{job_id}', response_model=GenLibsJobOutput, responses=RECORD_RESPONSES)
+def get_gen_libs_job(job_id: str, request: Request) -> Response:
+    return analysis_response(request, get_job(job_id).output())
+
+
+@apiRoute.get('/jobs/{job_id}/events', response_class=StreamingResponse, responses={200: {'content': {'text/event-stream': {}}}})
+async def get_gen_libs_job_events(job_id: str, last_event_id: int | None = Header(None)) -> StreamingResponse:
+    """
+    Поток Server-Sent Events задачи: result ({index, done, total, result}) на каждую библиотеку и done в конце.
+    После переподключения EventSource передает Last-Event-ID, и поток продолжается со следующего события
+    """
+    job = get_job(job_id)
+    return StreamingResponse(
+        job.stream(last_event_id),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
     )
 
 
+@apiRoute.get('/analysis-cache')
+def get_analysis_cache_stats() -> AnalysisCacheStats:
+    return analysis_cache.stats()
+
+
+@apiRoute.get('/metrics')
+def get_metrics() -> AnalysisMetrics:
+    """Накопленное время этапов (разбор, sdfind, glfind, кодирование) с момента запуска, при ND_FOREZ_TIMING=1"""
+    return metrics.stats()
+
+
 @apiRoute.get('/parse-results')
 def get_parse_results(session: Session = Depends(get_session)) -> list[ParseResultDescription]:
     statement = select(ParseResultDB).order_by(desc(ParseResultDB.id)).limit(50)
@@ -88,11 +181,13 @@ def get_parse_results(session: Session = Depends(get_session)) -> list[ParseResu
         genlibs: list[GenLibDescription] = []
         for s in r.standards:
             standards.append(SizeStandardDescription(
+                id=s.id,
                 title=s.title,
                 filename=s.filename,
             ))
         for g in r.genlibs:
             genlibs.append(GenLibDescription(
+                id=g.id,
                 title=g.title,
                 filename=g.filename,
             ))
@@ -113,14 +208,15 @@ def get_parse_result(result_id: int, session: Session = Depends(get_session)) ->
     standards: list[SizeStandardParseResult] = []
     genlibs: list[GenLibParseResult] = []
     for s in r.standards:
-        raw_signal = s.data
+        raw_signal = s.data.tolist()
         calibration = SizeStandardCalibration(
-            sizes=s.sizes,
-            concentrations=s.concentrations,
-            release_times=s.release_times,
+            sizes=s.sizes.tolist(),
+            concentrations=s.concentrations.tolist(),
+            release_times=s.release_times.tolist(),
         )
         standards.append(SizeStandardParseResult(
             description=SizeStandardDescription(
+                id=s.id,
                 title=s.title,
                 filename=s.filename,
             ),
@@ -130,10 +226,11 @@ def get_parse_result(result_id: int, session: Session = Depends(get_session)) ->
     for g in r.genlibs:
         genlibs.append(GenLibParseResult(
             description=GenLibDescription(
+                id=g.id,
                 title=g.title,
                 filename=g.filename,
             ),
-            signal=g.data,
+            signal=g.data.tolist(),
         ))
     if not standards and not genlibs:
         raise HTTPException(status_code=422, detail='В файлах отсутствуют данные')
@@ -142,3 +239,140 @@ def get_parse_result(result_id: int, session: Session = Depends(get_session)) ->
         size_standards=standards,
         gen_libs=genlibs,
     )
+
+
+@apiRoute.post('/parse-results/{result_id}/analyze', response_model=ParseResultAnalyzeOutput, responses=RECORD_RESPONSES)
+def do_analyze_parse_result(result_id: int, input: ParseResultAnalyzeInput, request: Request, session: Session = Depends(get_session)) -> Response:
+    """Анализ сигналов, уже сохраненных в базе данных: клиент передает только идентификаторы"""
+    r = session.get(ParseResultDB, result_id)
+    if r is None:
+        raise HTTPException(404)
+    standard = session.get(SizeStandardDB, input.size_standard_id)
+    if standard is None or standard.parsed_result_id != r.id:
+        raise HTTPException(404, detail='Стандарт длин не найден')
+    genlibs: list[GenLibDB] = []
+    for gen_lib_id in input.gen_lib_ids:
+        g = session.get(GenLibDB, gen_lib_id)
+        if g is None or g.parsed_result_id != r.id:
+            raise HTTPException(404, detail='Геномная библиотека не найдена')
+        genlibs.append(g)
+    return analysis_response(request, downsample_analysis(analyze_stored_signals(session, r, standard, genlibs), input.max_points))
+
+
+@apiRoute.get('/parse-results/{result_id}/analysis', response_model=ParseResultAnalyzeOutput, responses=RECORD_RESPONSES)
+def get_parse_result_analysis(
+    result_id: int,
+    size_standard_id: int,
+    request: Request,
+    gen_lib_ids: list[int] | None = Query(None),
+    max_points: int | None = Query(None, ge=4),
+    session: Session = Depends(get_session),
+) -> Response:
+    """
+    Результаты анализа сохраненного разбора. Без gen_lib_ids возвращаются все библиотеки,
+    которые уже анализировались с этим стандартом длин. Устаревшие результаты пересчитываются.
+    """
+    r = session.get(ParseResultDB, result_id)
+    if r is None:
+        raise HTTPException(404)
+    standard = session.get(SizeStandardDB, size_standard_id)
+    if standard is None or standard.parsed_result_id != r.id:
+        raise HTTPException(404, detail='Стандарт длин не найден')
+    if gen_lib_ids is None:
+        stored = load_analysis_results(session, r.id, standard.id)
+        genlibs = [g for g in r.genlibs if g.id in stored]
+    else:
+        genlibs = []
+        for gen_lib_id in gen_lib_ids:
+            g = session.get(GenLibDB, gen_lib_id)
+            if g is None or g.parsed_result_id != r.id:
+                raise HTTPException(404, detail='Геномная библиотека не найдена')
+            genlibs.append(g)
+    return analysis_response(request, downsample_analysis(analyze_stored_signals(session, r, standard, genlibs), max_points))
+
+
+@apiRoute.get('/parse-results/{result_id}/analysis/zoom')
+def get_parse_result_analysis_zoom(
+    result_id: int,
+    size_standard_id: int,
+    gen_lib_id: int,
+    x_min: float,
+    x_max: float,
+    max_points: int | None = Query(None, ge=4),
+    session: Session = Depends(get_session),
+) -> GenLibZoomOutput:
+    """Фрагмент графика библиотеки в полном разрешении для диапазона длин [x_min, x_max] при увеличении"""
+    r = session.get(ParseResultDB, result_id)
+    if r is None:
+        raise HTTPException(404)
+    standard = session.get(SizeStandardDB, size_standard_id)
+    if standard is None or standard.parsed_result_id != r.id:
+        raise HTTPException(404, detail='Стандарт длин не найден')
+    g = session.get(GenLibDB, gen_lib_id)
+    if g is None or g.parsed_result_id != r.id:
+        raise HTTPException(404, detail='Геномная библиотека не найдена')
+    output = analyze_stored_signals(session, r, standard, [g])
+    if output.size_standard.state != 'success':
+        raise HTTPException(422, detail=output.size_standard.message)
+    [gen_lib_result] = output.gen_libs
+    if gen_lib_result.state != 'success':
+        raise HTTPException(422, detail=gen_lib_result.message)
+    return gen_lib_zoom(gen_lib_result, x_min, x_max, max_points)
+
+
+def get_job(job_id: str) -> GenLibsJob:
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(404, detail='Задача не найдена')
+    return job
+
+
+def downsample_analysis(output: ParseResultAnalyzeOutput, max_points: int | None) -> ParseResultAnalyzeOutput:
+    output.gen_libs = [downsample_gen_lib_outcome(r, max_points) for r in output.gen_libs]
+    return output
+
+
+def analyze_stored_signals(session: Session, r: ParseResultDB, standard: SizeStandardDB, genlibs: list[GenLibDB]) -> ParseResultAnalyzeOutput:
+    """
+    Берет сохраненные результаты анализа, если они посчитаны текущей версией алгоритма по тем же входным данным,
+    остальное анализирует заново и сохраняет
+    """
+    stored = load_analysis_results(session, r.id, standard.id)
+    changed = False
+
+    calibration = SizeStandardCalibration(
+        sizes=standard.sizes.tolist(),
+        concentrations=standard.concentrations.tolist(),
+        release_times=standard.release_times.tolist(),
+    )
+    size_standard_key = size_standard_cache_key(standard.data, calibration)
+    size_standard_result = stored_analysis_outcome(stored.get(None), size_standard_key, size_standard_outcome_adapter)
+    if size_standard_result is None:
+        [size_standard_result] = analyze_size_standards([(standard.data, calibration)], get_executor(), analysis_cache)
+        save_analysis_result(session, r.id, standard.id, None, size_standard_key, size_standard_result)
+        changed = True
+
+    gen_lib_results: list[GenLibAnalyzeResult | GenLibAnalyzeError] = []
+    if size_standard_result.state == 'success' and genlibs:
+        peaks = size_standard_result.peaks
+        keys = [gen_lib_cache_key(g.data, peaks) for g in genlibs]
+        results = [
+            stored_analysis_outcome(stored.get(g.id), key, gen_lib_outcome_adapter)
+            for g, key in zip(genlibs, keys)
+        ]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            computed = analyze_gen_libs([genlibs[i].data for i in missing], peaks, get_executor(), analysis_cache, WORKER_COUNT)
+            for i, gen_lib_result in zip(missing, computed):
+                results[i] = gen_lib_result
+                save_analysis_result(session, r.id, standard.id, genlibs[i].id, keys[i], gen_lib_result)
+            changed = True
+        gen_lib_results = [result for result in results if result is not None]
+
+    if changed:
+        session.commit()
+
+    return ParseResultAnalyzeOutput(
+        size_standard=size_standard_result,
+        gen_libs=gen_lib_results,
+    )
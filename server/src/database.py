@@ -1,5 +1,11 @@
+import json
+
+from sqlalchemy import text
 from sqlmodel import SQLModel, Session, create_engine
 
+from models.database import GenLibDB, SizeStandardDB
+from models.ndarray import NDArrayType
+
 sqlite_file_name = "database.db"
 sqlite_url = f"sqlite:///database/{sqlite_file_name}"
 
@@ -8,6 +14,25 @@ engine = create_engine(sqlite_url, echo=True)
 
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
+    migrate_json_arrays()
+
+
+def migrate_json_arrays():
+    """Одноразовая миграция: массивы, сохраненные старыми версиями как JSON, переводятся в бинарный формат"""
+    with engine.begin() as connection:
+        for model in (SizeStandardDB, GenLibDB):
+            table = model.__table__  # type: ignore
+            for column in table.columns:
+                if not isinstance(column.type, NDArrayType):
+                    continue
+                rows = connection.execute(text(
+                    f'SELECT id, {column.name} FROM {table.name} WHERE typeof({column.name}) = \'text\''
+                )).all()
+                for row_id, value in rows:
+                    connection.execute(
+                        text(f'UPDATE {table.name} SET {column.name} = :value WHERE id = :id'),
+                        {'value': column.type.process_bind_param(json.loads(value), engine.dialect), 'id': row_id},
+                    )
 
 
 def get_session():
@@ -0,0 +1,214 @@
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import Executor
+from contextvars import Context
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator
+from uuid import uuid4
+
+from pydantic_core import to_json
+
+from lib.analyzis import STREAM_BATCH_SIZE, GenLibAnalyzeOutcome, GenLibSignal, analyze_gen_lib_batch, downsample_gen_lib_outcome, gen_lib_cache_key, gen_lib_calibration, gen_lib_outcome_adapter
+from lib.cache import AnalysisCache
+from models.models import GenLibAnalyzeError, GenLibsJobOutput, GenLibsJobStatus, SizeStandardAnalyzePeaks
+
+# Интервал комментариев в потоке событий, когда новых событий нет: прокси не закрывают соединение как простаивающее
+KEEP_ALIVE_SECONDS = 15
+
+
+@dataclass
+class JobEvent:
+    """
+    Событие задачи: результат библиотеки index (done - сколько результатов готово к этому моменту) или завершение.
+    Сам результат хранится только в GenLibsJob.results, текст события SSE собирается при отправке
+    """
+    event: str
+    index: int | None = None
+    done: int = 0
+
+
+class GenLibsJob:
+    """
+    Фоновый анализ набора геномных библиотек. Каждое изменение (результат очередной библиотеки, завершение)
+    записывается событием с последовательным номером: клиент получает события SSE по мере появления,
+    а после переподключения продолжает с номера, следующего за Last-Event-ID
+    """
+
+    def __init__(self, total: int) -> None:
+        self.id = uuid4().hex
+        self.created_at = datetime.now(timezone.utc)
+        self.results: list[GenLibAnalyzeOutcome | None] = [None] * total
+        self.done = 0
+        self.finished = False
+        self.events: list[JobEvent] = []
+        self._changed = asyncio.Event()
+
+    def status(self) -> GenLibsJobStatus:
+        return GenLibsJobStatus(
+            id=self.id,
+            state='done' if self.finished else 'running',
+            total=len(self.results),
+            done=self.done,
+            created_at=self.created_at,
+        )
+
+    def output(self) -> GenLibsJobOutput:
+        # Результаты уже проверены при создании, повторная проверка не нужна
+        return GenLibsJobOutput.model_construct(**dict(self.status()), data=list(self.results))
+
+    def add_result(self, index: int, outcome: GenLibAnalyzeOutcome) -> None:
+        self.results[index] = outcome
+        self.done += 1
+        self._publish(JobEvent('result', index, self.done))
+
+    def finish(self) -> None:
+        self.finished = True
+        self._publish(JobEvent('done'))
+
+    def _publish(self, event: JobEvent) -> None:
+        self.events.append(event)
+        # Будим всех, кто ждет новых событий, следующие ждут уже новое Event
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _encode(self, position: int) -> str:
+        """Событие с номером position в формате SSE"""
+        event = self.events[position]
+        data: Any
+        if event.index is None:
+            data = self.status()  # завершение публикуется последним, состояние задачи после него не меняется
+        else:
+            data = {'index': event.index, 'done': event.done, 'total': len(self.results), 'result': self.results[event.index]}
+        return f'id: {position}\nevent: {event.event}\ndata: {to_json(data).decode()}\n\n'
+
+    async def stream(self, last_event_id: int | None = None) -> AsyncIterator[str]:
+        """События, начиная со следующего за last_event_id (с первого, если None), до завершения задачи"""
+        position = 0 if last_event_id is None else last_event_id + 1
+        while True:
+            while position < len(self.events):
+                # Кодирование результата в полном разрешении занимает заметное время - не в цикле событий
+                yield await asyncio.to_thread(self._encode, position)
+                position += 1
+            if self.finished:
+                return
+            changed = self._changed
+            try:
+                await asyncio.wait_for(changed.wait(), KEEP_ALIVE_SECONDS)
+            except TimeoutError:
+                yield ': keep-alive\n\n'
+
+
+class GenLibsJobs:
+    """
+    Задачи анализа библиотек в памяти процесса сервера. Хранятся последние max_jobs задач,
+    при превышении удаляются самые старые завершенные - выполняющиеся не удаляются никогда
+    """
+
+    def __init__(self, max_jobs: int = 32, cache: AnalysisCache | None = None) -> None:
+        self.max_jobs = max_jobs
+        self.cache = cache
+        self._jobs: OrderedDict[str, GenLibsJob] = OrderedDict()
+        self._tasks: set[asyncio.Task] = set()
+
+    def create(
+        self,
+        raw_signals: list[GenLibSignal],
+        size_standard_analyze_peaks: SizeStandardAnalyzePeaks,
+        max_points: int | None,
+        executor: Executor,
+    ) -> GenLibsJob:
+        """Создает задачу и запускает ее в цикле событий, анализ библиотек идет в пуле процессов"""
+        job = GenLibsJob(len(raw_signals))
+        self._jobs[job.id] = job
+        self._evict()
+        # Свой контекст: задача живет дольше запроса и не должна видеть его переменные контекста (замеры этапов)
+        task = asyncio.create_task(self._run(job, raw_signals, size_standard_analyze_peaks, max_points, executor), context=Context())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def get(self, job_id: str) -> GenLibsJob | None:
+        return self._jobs.get(job_id)
+
+    def _evict(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(len(self._jobs) - self.max_jobs, 0)]:
+            del self._jobs[job_id]
+
+    async def _run(
+        self,
+        job: GenLibsJob,
+        raw_signals: list[GenLibSignal],
+        size_standard_analyze_peaks: SizeStandardAnalyzePeaks,
+        max_points: int | None,
+        executor: Executor,
+    ) -> None:
+        try:
+            try:
+                calibration = gen_lib_calibration(size_standard_analyze_peaks)
+            except Exception as ex:
+                # С такой калибровкой не проанализировать ни одну библиотеку
+                for i in range(len(raw_signals)):
+                    job.add_result(i, GenLibAnalyzeError(state='error', message=str(ex)))
+                return
+
+            loop = asyncio.get_running_loop()
+            cache = self.cache
+            # Хэширование сигналов, чтение кэша и прореживание - в потоках, чтобы большой планшет не останавливал
+            # цикл событий (и вместе с ним остальные запросы и потоки событий)
+            keys = await asyncio.to_thread(
+                lambda: [gen_lib_cache_key(raw_signal, size_standard_analyze_peaks) for raw_signal in raw_signals],
+            ) if cache is not None else None
+
+            def cached(i: int) -> GenLibAnalyzeOutcome | None:
+                outcome = cache.get(keys[i], gen_lib_outcome_adapter) if cache is not None and keys is not None else None
+                return downsample_gen_lib_outcome(outcome, max_points) if outcome is not None else None
+
+            missing: dict[int, list[int]] = {}
+            for i, raw_signal in enumerate(raw_signals):
+                outcome = await asyncio.to_thread(cached, i) if cache is not None else None
+                if outcome is None:
+                    missing.setdefault(len(raw_signal), []).append(i)
+                else:
+                    job.add_result(i, outcome)
+
+            async def analyze(batch: list[int]) -> None:
+                try:
+                    outcomes = await loop.run_in_executor(executor, analyze_gen_lib_batch, [raw_signals[i] for i in batch], calibration)
+                except Exception as ex:
+                    # Сбой пула (например, процесс завершился) - не результат анализа, в кэш не попадает
+                    for i in batch:
+                        job.add_result(i, GenLibAnalyzeError(state='error', message=str(ex)))
+                    return
+                downsampled = await asyncio.to_thread(lambda: [downsample_gen_lib_outcome(outcome, max_points) for outcome in outcomes])
+                for i, outcome in zip(batch, downsampled):
+                    job.add_result(i, outcome)
+                if cache is not None and keys is not None:
+                    for i, outcome in zip(batch, outcomes):
+                        try:
+                            await asyncio.to_thread(cache.put, keys[i], outcome, gen_lib_outcome_adapter)
+                        except Exception:
+                            # Результат уже отправлен, сбой кэша не должен прерывать остальные пакеты
+                            pass
+
+            # Небольшие пакеты библиотек одной длины: первый результат приходит через время анализа одного пакета,
+            # а не всего планшета, и при этом пакет анализируется вместе (glfind_batch)
+            batch_errors = await asyncio.gather(*(
+                analyze(indices[start:start + STREAM_BATCH_SIZE])
+                for indices in missing.values()
+                for start in range(0, len(indices), STREAM_BATCH_SIZE)
+            ), return_exceptions=True)
+            # Ошибку пакета поднимаем только после завершения остальных, чтобы их результаты не потерялись
+            for error in batch_errors:
+                if isinstance(error, Exception):
+                    raise error
+        except Exception as ex:
+            # Сбой вне анализа (ключи, чтение кэша, прореживание) - библиотеки без результата получают ошибку,
+            # иначе задача завершилась бы как выполненная с пустыми результатами
+            for i, outcome in enumerate(job.results):
+                if outcome is None:
+                    job.add_result(i, GenLibAnalyzeError(state='error', message=str(ex)))
+        finally:
+            job.finish()
+            self._evict()
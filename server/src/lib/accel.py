@@ -0,0 +1,28 @@
+import os
+from typing import Any, Callable, TypeVar
+
+F = TypeVar('F', bound=Callable[..., Any])
+
+# Необязательное ускорение горячих циклов компиляцией numba (pip install server[accel]).
+# Включается переменной окружения ND_FOREZ_ACCEL=1; без нее или без numba используются обычные реализации на NumPy
+ACCEL_REQUESTED = os.environ.get('ND_FOREZ_ACCEL', '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+_njit: Callable[..., Any] | None = None
+if ACCEL_REQUESTED:
+    try:
+        from numba import njit as _njit
+    except ImportError:
+        pass
+
+ACCEL_ENABLED = _njit is not None
+
+
+def kernel(function: F) -> F | None:
+    """
+    Компилирует ядро (функцию на циклах и массивах NumPy), если ускорение включено, иначе возвращает None.
+    Вызывающий код проверяет результат на None и в этом случае использует свою обычную реализацию.
+    Ядро компилируется при первом вызове, скомпилированный код кэшируется на диске.
+    """
+    if _njit is None:
+        return None
+    return _njit(cache=True, nogil=True)(function)
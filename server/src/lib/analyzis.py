@@ -1,12 +1,64 @@
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, wait
+from functools import lru_cache, partial
+from itertools import islice, repeat
+from typing import Any, Callable, Iterable, Iterator, TypeVar
+
 import numpy as np
+from numpy.typing import NDArray
+from pydantic import TypeAdapter
 
+from lib.cache import AnalysisCache, hash_arrays
+from lib.downsample import minmax_indices
 from lib.sdfind.sdfind import sdfind
-from lib.glfind.glfind import glfind
+from lib.glfind.calibration import Calibration
+from lib.glfind.glfind import GLFindResult, glfind, glfind_batch
+from lib.timing import call_recorded, current_recorder
+
+from models.models import GenLibAnalyzeError, GenLibZoomOutput, SizeStandardAnalyzePeaks, SizeStandardAnalyzeError, SizeStandardCalibration, SizeStandardRawSignal, GenLibRawSignal, SizeStandardAnalyzeResult, GenLibAnalyzeResult
+
+# Версия алгоритмов анализа - увеличивается при любом изменении, влияющем на результат, и делает старые записи кэша недействительными
+ALGORITHM_VERSION = 3
+
+# Наибольшее число библиотек в одном пакете при выдаче результатов по мере готовности (потоковый ответ, фоновые задачи):
+# первый результат приходит через время анализа одного небольшого пакета, а не всего планшета
+STREAM_BATCH_SIZE = 4
+
+# Сигнал может прийти как список из запроса или как массив, загруженный из базы данных
+SizeStandardSignal = SizeStandardRawSignal | NDArray[np.integer]
+GenLibSignal = GenLibRawSignal | NDArray[np.integer]
+
+SizeStandardAnalyzeOutcome = SizeStandardAnalyzeResult | SizeStandardAnalyzeError
+GenLibAnalyzeOutcome = GenLibAnalyzeResult | GenLibAnalyzeError
+
+size_standard_outcome_adapter: TypeAdapter[SizeStandardAnalyzeOutcome] = TypeAdapter(SizeStandardAnalyzeOutcome)
+gen_lib_outcome_adapter: TypeAdapter[GenLibAnalyzeOutcome] = TypeAdapter(GenLibAnalyzeOutcome)
+
+T = TypeVar('T')
+
+
+def size_standard_cache_key(raw_signal: SizeStandardSignal, calibration: SizeStandardCalibration) -> str:
+    return hash_arrays(
+        'size_standard',
+        str(ALGORITHM_VERSION),
+        (raw_signal, np.float64),
+        (calibration.sizes, np.float64),
+        (calibration.release_times, np.float64),
+        (calibration.concentrations, np.float64),
+    )
+
 
-from models.models import GenLibAnalyzeError, SizeStandardAnalyzePeaks, SizeStandardAnalyzeError, SizeStandardCalibration, SizeStandardRawSignal, GenLibRawSignal, SizeStandardAnalyzeResult, GenLibAnalyzeResult
+def gen_lib_cache_key(raw_signal: GenLibSignal, size_standard_analyze_peaks: SizeStandardAnalyzePeaks) -> str:
+    return hash_arrays(
+        'gen_lib',
+        str(ALGORITHM_VERSION),
+        (raw_signal, np.float64),
+        (size_standard_analyze_peaks.data, np.int64),
+        (size_standard_analyze_peaks.sizes, np.float64),
+        (size_standard_analyze_peaks.concentrations, np.float64),
+    )
 
 
-def analyze_size_standard(raw_signal: SizeStandardRawSignal, calibration: SizeStandardCalibration) -> SizeStandardAnalyzeResult | SizeStandardAnalyzeError:
+def analyze_size_standard(raw_signal: SizeStandardSignal, calibration: SizeStandardCalibration) -> SizeStandardAnalyzeOutcome:
     try:
         result = sdfind(
             np.array(raw_signal, dtype=np.float64),
@@ -36,18 +88,326 @@ def analyze_size_standard(raw_signal: SizeStandardRawSignal, calibration: SizeSt
     )
 
 
-def analyze_gen_lib(raw_signal: GenLibRawSignal, size_standard_analyze_peaks: SizeStandardAnalyzePeaks) -> GenLibAnalyzeResult | GenLibAnalyzeError:
+def analyze_size_standards(
+    items: list[tuple[SizeStandardSignal, SizeStandardCalibration]],
+    executor: Executor | None = None,
+    cache: AnalysisCache | None = None,
+) -> list[SizeStandardAnalyzeOutcome]:
+    """Анализ набора стандартов длин, при наличии пула - параллельно, результаты в исходном порядке"""
+    return _analyze_cached(
+        lambda missing: _map(analyze_size_standard, missing, executor),
+        items,
+        [size_standard_cache_key(*item) for item in items] if cache is not None else None,
+        size_standard_outcome_adapter,
+        cache,
+    )
+
+
+def analyze_gen_libs(
+    raw_signals: list[GenLibSignal],
+    size_standard_analyze_peaks: SizeStandardAnalyzePeaks,
+    executor: Executor | None = None,
+    cache: AnalysisCache | None = None,
+    parallelism: int = 1,
+) -> list[GenLibAnalyzeOutcome]:
+    """
+    Анализ набора геномных библиотек: библиотеки с сигналами одной длины анализируются пакетами (glfind_batch),
+    пакеты раздаются пулу процессов (не больше parallelism пакетов на группу), результаты собираются в исходном порядке
+    """
+    return _analyze_cached(
+        lambda missing: _map_gen_lib_batches(missing, executor, parallelism),
+        list(zip(raw_signals, repeat(size_standard_analyze_peaks))),
+        [gen_lib_cache_key(raw_signal, size_standard_analyze_peaks) for raw_signal in raw_signals] if cache is not None else None,
+        gen_lib_outcome_adapter,
+        cache,
+    )
+
+
+def analyze_size_standards_iter(
+    items: list[tuple[SizeStandardSignal, SizeStandardCalibration]],
+    executor: Executor | None = None,
+    cache: AnalysisCache | None = None,
+    parallelism: int = 1,
+) -> Iterator[tuple[int, SizeStandardAnalyzeOutcome]]:
+    """
+    То же, что analyze_size_standards, но результаты (номер стандарта, результат) выдаются по мере готовности.
+    В пуле одновременно не больше parallelism стандартов, поэтому в памяти не копятся готовые, но не выданные результаты
+    """
+    return _iter_analyze_cached(
+        lambda missing: _iter_size_standards(missing, executor, parallelism),
+        items,
+        [size_standard_cache_key(*item) for item in items] if cache is not None else None,
+        size_standard_outcome_adapter,
+        cache,
+    )
+
+
+def analyze_gen_libs_iter(
+    raw_signals: list[GenLibSignal],
+    size_standard_analyze_peaks: SizeStandardAnalyzePeaks,
+    executor: Executor | None = None,
+    cache: AnalysisCache | None = None,
+    parallelism: int = 1,
+) -> Iterator[tuple[int, GenLibAnalyzeOutcome]]:
+    """
+    То же, что analyze_gen_libs, но результаты (номер библиотеки, результат) выдаются по мере готовности:
+    сначала найденные в кэше, затем библиотеки каждого пакета (не больше STREAM_BATCH_SIZE), как только пакет посчитан.
+    В пуле одновременно не больше parallelism пакетов
+    """
+    return _iter_analyze_cached(
+        lambda missing: _iter_gen_lib_batches(missing, executor, parallelism),
+        list(zip(raw_signals, repeat(size_standard_analyze_peaks))),
+        [gen_lib_cache_key(raw_signal, size_standard_analyze_peaks) for raw_signal in raw_signals] if cache is not None else None,
+        gen_lib_outcome_adapter,
+        cache,
+    )
+
+
+def _analyze_cached(
+    compute: Callable[[list[tuple[Any, ...]]], Iterable[T]],
+    items: list[tuple[Any, ...]],
+    keys: list[str] | None,
+    adapter: TypeAdapter[T],
+    cache: AnalysisCache | None,
+) -> list[T]:
+    """Берет готовые результаты из кэша, остальные считает (при наличии пула - параллельно) и сохраняет в кэш"""
+    results: list[T | None] = [None] * len(items)
+    computed = _iter_analyze_cached(
+        lambda missing: ((j, result, True) for j, result in enumerate(compute(missing))),
+        items,
+        keys,
+        adapter,
+        cache,
+    )
+    for i, result in computed:
+        results[i] = result
+    return results  # type: ignore
+
+
+def _iter_analyze_cached(
+    compute: Callable[[list[tuple[Any, ...]]], Iterable[tuple[int, T, bool]]],
+    items: list[tuple[Any, ...]],
+    keys: list[str] | None,
+    adapter: TypeAdapter[T],
+    cache: AnalysisCache | None,
+) -> Iterator[tuple[int, T]]:
+    """
+    Выдает готовые результаты из кэша, затем остальные по мере вычисления и сохраняет их в кэш.
+    compute получает недостающие элементы и выдает тройки (номер среди недостающих, результат, сохранять ли в кэш)
+    в любом порядке: ошибки пула процессов - не результат анализа и в кэш не попадают
+    """
+    missing = []
+    for i in range(len(items)):
+        result = cache.get(keys[i], adapter) if cache is not None and keys is not None else None
+        if result is None:
+            missing.append(i)
+        else:
+            yield i, result
+
+    for j, result, cacheable in compute([items[i] for i in missing]):
+        i = missing[j]
+        if cacheable and cache is not None and keys is not None:
+            cache.put(keys[i], result, adapter)
+        yield i, result
+
+
+def _map(analyze: Callable[..., T], items: list[tuple[Any, ...]], executor: Executor | None) -> Iterable[T]:
+    recorder = current_recorder()
+    if recorder is not None:
+        # Замеры этапов из процессов пула возвращаются вместе с результатами и добавляются к замерам запроса
+        recorded = _map_plain(partial(call_recorded, analyze), items, executor)
+        results = []
+        for result, entries in recorded:
+            recorder.entries += entries
+            results.append(result)
+        return results
+    return _map_plain(analyze, items, executor)
+
+
+def _map_plain(analyze: Callable[..., T], items: list[tuple[Any, ...]], executor: Executor | None) -> Iterable[T]:
+    if executor is None or len(items) < 2:
+        return [analyze(*item) for item in items]
+    return executor.map(analyze, *zip(*items))
+
+
+def _iter_map(
+    analyze: Callable[..., T],
+    items: list[tuple[Any, ...]],
+    executor: Executor | None,
+    max_pending: int,
+) -> Iterator[tuple[int, T | Exception]]:
+    """
+    Как _map, но выдает пары (номер элемента, результат) по мере готовности. В пул отправляется не больше max_pending
+    элементов сразу, следующий - как только готов очередной. Сбой пула (например, процесс завершился) выдается
+    вместо результата элемента как исключение
+    """
+    if executor is None or len(items) < 2:
+        for i, item in enumerate(items):
+            yield i, analyze(*item)
+        return
+
+    def submit(item: tuple[Any, ...]) -> Future[T]:
+        try:
+            return executor.submit(analyze, *item)
+        except Exception as ex:
+            # Сломанный пул не принимает задачи - ошибка достается элементу так же, как при сбое во время анализа
+            future: Future[T] = Future()
+            future.set_exception(ex)
+            return future
+
+    queue = enumerate(items)
+    pending = {submit(item): i for i, item in islice(queue, max(max_pending, 1))}
     try:
-        res = glfind(
-            np.array(raw_signal, dtype=np.float64),
-            np.array(size_standard_analyze_peaks.data, dtype=np.int64),
-            np.array(size_standard_analyze_peaks.sizes, dtype=np.float64),
-            np.array(size_standard_analyze_peaks.concentrations, dtype=np.float64),
-        )
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = pending.pop(future)
+                # Следующий элемент отправляем до выдачи результата, чтобы пул не простаивал, пока получатель его обрабатывает
+                for next_i, item in islice(queue, 1):
+                    pending[submit(item)] = next_i
+                exception = future.exception()
+                yield i, exception if exception is not None else future.result()
+    finally:
+        # Получатель прекратил чтение (например, клиент отключился) - еще не начатые задачи не нужны
+        for future in pending:
+            future.cancel()
+
+
+def _iter_size_standards(
+    items: list[tuple[SizeStandardSignal, SizeStandardCalibration]],
+    executor: Executor | None,
+    parallelism: int,
+) -> Iterator[tuple[int, SizeStandardAnalyzeOutcome, bool]]:
+    for i, outcome in _iter_map(analyze_size_standard, items, executor, parallelism):
+        if isinstance(outcome, Exception):
+            yield i, SizeStandardAnalyzeError(state='error', message=str(outcome)), False
+        else:
+            yield i, outcome, True
+
+
+def _gen_lib_groups(items: list[tuple[GenLibSignal, SizeStandardAnalyzePeaks]]) -> list[list[int]]:
+    """Номера библиотек, сгруппированные по длине сигнала"""
+    groups: dict[int, list[int]] = {}
+    for i, (raw_signal, _) in enumerate(items):
+        groups.setdefault(len(raw_signal), []).append(i)
+    return list(groups.values())
+
+
+def _gen_lib_batches(items: list[tuple[GenLibSignal, SizeStandardAnalyzePeaks]], parallelism: int) -> list[list[int]]:
+    """Группирует библиотеки по длине сигнала и делит каждую группу на пакеты, не больше parallelism пакетов на группу"""
+    return [
+        batch.tolist()
+        for indices in _gen_lib_groups(items)
+        for batch in np.array_split(indices, min(max(parallelism, 1), len(indices)))
+    ]
+
+
+def _iter_gen_lib_batches(
+    items: list[tuple[GenLibSignal, SizeStandardAnalyzePeaks]],
+    executor: Executor | None,
+    parallelism: int,
+) -> Iterator[tuple[int, GenLibAnalyzeOutcome, bool]]:
+    """
+    Как _map_gen_lib_batches, но делит группы на пакеты не больше STREAM_BATCH_SIZE библиотек и выдает тройки
+    (номер библиотеки, результат, сохранять ли в кэш), как только посчитан пакет библиотеки
+    """
+    if not items:
+        return
+    try:
+        calibration = gen_lib_calibration(items[0][1])
+    except Exception as ex:
+        for i in range(len(items)):
+            yield i, GenLibAnalyzeError(state='error', message=str(ex)), True
+        return
+    batches = [
+        indices[start:start + STREAM_BATCH_SIZE]
+        for indices in _gen_lib_groups(items)
+        for start in range(0, len(indices), STREAM_BATCH_SIZE)
+    ]
+    outcomes = _iter_map(
+        analyze_gen_lib_batch,
+        [([items[i][0] for i in batch], calibration) for batch in batches],
+        executor,
+        parallelism,
+    )
+    for b, batch_outcomes in outcomes:
+        if isinstance(batch_outcomes, Exception):
+            # Сбой пула - ошибка достается каждой библиотеке пакета, но в кэш не попадает
+            for i in batches[b]:
+                yield i, GenLibAnalyzeError(state='error', message=str(batch_outcomes)), False
+        else:
+            for i, outcome in zip(batches[b], batch_outcomes):
+                yield i, outcome, True
+
+
+def _map_gen_lib_batches(
+    items: list[tuple[GenLibSignal, SizeStandardAnalyzePeaks]],
+    executor: Executor | None,
+    parallelism: int,
+) -> list[GenLibAnalyzeOutcome]:
+    """Группирует библиотеки по длине сигнала, делит каждую группу на пакеты и анализирует пакеты (при наличии пула - параллельно)"""
+    if not items:
+        return []
+    try:
+        calibration = gen_lib_calibration(items[0][1])
+    except Exception as ex:
+        # С такой калибровкой не проанализировать ни одну библиотеку
+        return [GenLibAnalyzeError(state='error', message=str(ex)) for _ in items]
+    batches = _gen_lib_batches(items, parallelism)
+    outcomes = _map(
+        analyze_gen_lib_batch,
+        [([items[i][0] for i in batch], calibration) for batch in batches],
+        executor,
+    )
+
+    results: list[GenLibAnalyzeOutcome | None] = [None] * len(items)
+    for batch, batch_outcomes in zip(batches, outcomes):
+        for i, outcome in zip(batch, batch_outcomes):
+            results[i] = outcome
+    return results  # type: ignore
+
+
+def gen_lib_calibration(size_standard_analyze_peaks: SizeStandardAnalyzePeaks) -> Calibration:
+    """Калибровка по найденным пикам стандарта длин, одна на все библиотеки с этим стандартом"""
+    return _cached_calibration(
+        tuple(size_standard_analyze_peaks.data),
+        tuple(size_standard_analyze_peaks.sizes),
+        tuple(size_standard_analyze_peaks.concentrations),
+    )
+
+
+@lru_cache(maxsize=32)
+def _cached_calibration(peaks: tuple[int, ...], sizes: tuple[float, ...], concentrations: tuple[float, ...]) -> Calibration:
+    return Calibration(
+        np.array(peaks, dtype=np.int64),
+        np.array(sizes, dtype=np.float64),
+        np.array(concentrations, dtype=np.float64),
+    )
+
+
+def analyze_gen_lib(raw_signal: GenLibSignal, calibration: Calibration) -> GenLibAnalyzeOutcome:
+    try:
+        res = glfind(np.array(raw_signal, dtype=np.float64), calibration)
     except Exception as ex:
+        res = ex
+    return _gen_lib_outcome(res)
+
+
+def analyze_gen_lib_batch(raw_signals: list[GenLibSignal], calibration: Calibration) -> list[GenLibAnalyzeOutcome]:
+    """Анализ нескольких библиотек с сигналами одной длины одним пакетом glfind_batch"""
+    try:
+        results = glfind_batch(np.array(raw_signals, dtype=np.float64), calibration)
+    except Exception:
+        # Пакет не удалось подготовить целиком - анализируем по одной, чтобы ошибка досталась только своей библиотеке
+        return [analyze_gen_lib(raw_signal, calibration) for raw_signal in raw_signals]
+    return [_gen_lib_outcome(res) for res in results]
+
+
+def _gen_lib_outcome(res: GLFindResult | Exception) -> GenLibAnalyzeOutcome:
+    if isinstance(res, Exception):
         return GenLibAnalyzeError(
             state='error',
-            message=str(ex),
+            message=str(res),
         )
     return GenLibAnalyzeResult(
         state='success',
@@ -83,3 +443,49 @@ def analyze_gen_lib(raw_signal: GenLibRawSignal, size_standard_analyze_peaks: Si
         x_Lib_fill=res.x_lib_fill.tolist(),
         y_Lib_fill=res.y_lib_fill.tolist(),
     )
+
+
+# Поля GenLibAnalyzeResult с индексами точек сигнала: при прореживании эти точки сохраняются, а индексы пересчитываются
+GEN_LIB_INDEX_FIELDS = ('st_length', 'unrecognized_peaks', 'LibPeakLocations', 'final_filtered_below_threshold_locations')
+
+
+def downsample_gen_lib_outcome(outcome: GenLibAnalyzeOutcome, max_points: int | None) -> GenLibAnalyzeOutcome:
+    """
+    Прореживает t_main, denoised_data и mainCorr до max_points точек (минимум и максимум на интервал) для графика.
+    Точки, на которые ссылаются индексные поля, сохраняются, сами индексы переводятся в номера точек прореженного сигнала.
+    """
+    if max_points is None or outcome.state != 'success':
+        return outcome
+    indexes = {name: np.asarray(getattr(outcome, name), dtype=np.intp) for name in GEN_LIB_INDEX_FIELDS}
+    denoised_data = np.asarray(outcome.denoised_data)
+    kept = minmax_indices(denoised_data, max_points, np.concatenate(list(indexes.values())))
+    if len(kept) == len(denoised_data):
+        return outcome
+
+    update: dict[str, Any] = {
+        't_main': np.asarray(outcome.t_main)[kept].tolist(),
+        'denoised_data': denoised_data[kept].tolist(),
+        'mainCorr': np.asarray(outcome.mainCorr)[kept].tolist(),
+    }
+    for name, index in indexes.items():
+        remapped = np.searchsorted(kept, index)
+        update[name] = remapped.tolist() if name == 'st_length' else remapped.astype(np.float64).tolist()
+    return outcome.model_copy(update=update)
+
+
+def gen_lib_zoom(result: GenLibAnalyzeResult, x_min: float, x_max: float, max_points: int | None = None) -> GenLibZoomOutput:
+    """Фрагмент t_main/denoised_data/mainCorr в полном разрешении (или прореженный до max_points) для x_min <= t_main <= x_max"""
+    t_main = np.asarray(result.t_main)
+    [inside] = np.nonzero((t_main >= x_min) & (t_main <= x_max))
+    if len(inside) == 0:
+        return GenLibZoomOutput(start=0, t_main=[], denoised_data=[], mainCorr=[])
+    start, stop = int(inside[0]), int(inside[-1]) + 1
+
+    denoised_data = np.asarray(result.denoised_data[start:stop])
+    kept = minmax_indices(denoised_data, max_points) if max_points is not None else np.arange(stop - start)
+    return GenLibZoomOutput(
+        start=start,
+        t_main=t_main[start:stop][kept].tolist(),
+        denoised_data=denoised_data[kept].tolist(),
+        mainCorr=np.asarray(result.mainCorr[start:stop])[kept].tolist(),
+    )
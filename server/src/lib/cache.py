@@ -0,0 +1,103 @@
+import hashlib
+import zlib
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, TypeVar
+
+import numpy as np
+from numpy.typing import DTypeLike
+from pydantic import TypeAdapter
+from sqlalchemy import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+
+from models.database import AnalysisCacheDB
+from models.models import AnalysisCacheStats
+
+T = TypeVar('T')
+
+
+def hash_arrays(*parts: tuple[Any, DTypeLike] | str) -> str:
+    """Хэш содержимого: строки (вид анализа, версия) и массивы с явно заданным типом, чтобы список и массив давали один ключ"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            data = part.encode()
+        else:
+            value, dtype = part
+            data = np.ascontiguousarray(value, dtype=np.dtype(dtype).newbyteorder('<')).tobytes()
+        # Длина перед данными исключает совпадения на стыке частей
+        digest.update(len(data).to_bytes(8, 'little'))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """
+    Кэш результатов анализа по хэшу входных данных.
+    Первый уровень - LRU в памяти процесса, второй (необязательный) - таблица в SQLite.
+    """
+
+    def __init__(self, max_size: int = 128, engine: Engine | None = None) -> None:
+        self.max_size = max_size
+        self.engine = engine
+        self._items: OrderedDict[str, Any] = OrderedDict()
+        self._lock = Lock()
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    def get(self, key: str, adapter: TypeAdapter[T]) -> T | None:
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+                self.memory_hits += 1
+                return value
+
+        if self.engine is not None:
+            with Session(self.engine) as session:
+                row = session.get(AnalysisCacheDB, key)
+            if row is not None:
+                value = adapter.validate_json(zlib.decompress(row.payload))
+                self._remember(key, value)
+                with self._lock:
+                    self.persistent_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: T, adapter: TypeAdapter[T]) -> None:
+        self._remember(key, value)
+        if self.engine is not None:
+            with Session(self.engine) as session:
+                session.merge(AnalysisCacheDB(key=key, payload=zlib.compress(adapter.dump_json(value), 1)))
+                try:
+                    session.commit()
+                except IntegrityError:
+                    # Тот же ключ параллельно записал другой запрос - содержимое совпадает
+                    session.rollback()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> AnalysisCacheStats:
+        with self._lock:
+            return AnalysisCacheStats(
+                size=len(self._items),
+                max_size=self.max_size,
+                persistent=self.engine is not None,
+                memory_hits=self.memory_hits,
+                persistent_hits=self.persistent_hits,
+                misses=self.misses,
+            )
+
+    def _remember(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
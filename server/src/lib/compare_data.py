@@ -1,3 +1,6 @@
+from dataclasses import dataclass
+from typing import Literal
+
 import numpy as np
 from numpy.typing import NDArray
 
@@ -27,3 +30,75 @@ def compare_data(data1: NDArray, data2: NDArray) -> None:
 
 def compare_with_file(data: NDArray, filename: str) -> None:
     return compare_data(data, load_matlab_data(filename))
+
+
+@dataclass
+class FieldDifference:
+    """Расхождение одного поля результата с эталоном"""
+    record: str
+    field: str
+    kind: Literal['missing', 'unexpected', 'shape', 'dtype', 'values']
+    detail: str
+    mismatched: int = 0  # количество элементов вне допуска
+    max_abs: float = 0.0  # наибольшее абсолютное отклонение
+    max_rel: float = 0.0  # наибольшее относительное отклонение
+
+
+def compare_fields(
+    record: str,
+    actual: dict[str, NDArray],
+    expected: dict[str, NDArray],
+    rtol: float = 1e-7,
+    atol: float = 1e-9,
+) -> list[FieldDifference]:
+    """
+    Сравнение полей результата с эталоном: набор полей, форма, вид чисел (целые/дробные/строки) и значения.
+    Целые числа и строки должны совпадать точно, дробные - в пределах |actual - expected| <= atol + rtol * |expected|,
+    NaN совпадает с NaN
+    """
+    differences = []
+    for name in expected.keys() - actual.keys():
+        differences.append(FieldDifference(record, name, 'missing', 'поле отсутствует в результате'))
+    for name in actual.keys() - expected.keys():
+        differences.append(FieldDifference(record, name, 'unexpected', 'поля нет в эталоне'))
+
+    for name in sorted(expected.keys() & actual.keys()):
+        a = np.asarray(actual[name])
+        e = np.asarray(expected[name])
+        if a.shape != e.shape:
+            differences.append(FieldDifference(record, name, 'shape', f'форма {a.shape}, в эталоне {e.shape}'))
+            continue
+        if _kind(a) != _kind(e):
+            differences.append(FieldDifference(record, name, 'dtype', f'тип {a.dtype}, в эталоне {e.dtype}'))
+            continue
+        if _kind(a) != 'f':
+            mismatched = int(np.count_nonzero(a != e))
+            if mismatched:
+                differences.append(FieldDifference(record, name, 'values', f'{mismatched} из {e.size} значений не совпадают', mismatched))
+            continue
+
+        close = np.isclose(a, e, rtol=rtol, atol=atol, equal_nan=True)
+        if close.all():
+            continue
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta = np.abs(a - e)[~close]
+            relative = delta / np.abs(e[~close])
+        differences.append(FieldDifference(
+            record,
+            name,
+            'values',
+            f'{delta.size} из {e.size} значений вне допуска',
+            delta.size,
+            float(np.max(delta)),  # NaN, если NaN есть только с одной стороны
+            float(np.max(relative)),
+        ))
+    return differences
+
+
+def _kind(array: NDArray) -> str:
+    """Вид чисел для сравнения: целые (включая bool), дробные или строки"""
+    if array.dtype.kind in 'biu':
+        return 'i'
+    if array.dtype.kind in 'fc':
+        return 'f'
+    return array.dtype.kind
@@ -0,0 +1,29 @@
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+
+def minmax_indices(values: ArrayLike, max_points: int, keep: ArrayLike = ()) -> NDArray[np.intp]:
+    """
+    Индексы точек для прореживания сигнала с сохранением пиков: сигнал делится на (max_points - 2) // 2 интервалов,
+    в каждом остаются минимум и максимум, плюс первая и последняя точки и обязательные индексы keep.
+    Если точек не больше max_points, возвращаются все индексы.
+    """
+    y = np.asarray(values)
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+
+    buckets = max((max_points - 2) // 2, 1)
+    size = -(-n // buckets)
+    # Хвост дополняем последним значением, чтобы интервалы сложились в матрицу
+    padded = np.pad(y, (0, size * buckets - n), mode='edge').reshape(buckets, size)
+    starts = np.arange(buckets) * size
+    minimums = np.minimum(starts + np.argmin(padded, axis=1), n - 1)
+    maximums = np.minimum(starts + np.argmax(padded, axis=1), n - 1)
+
+    return np.unique(np.concatenate((
+        [0, n - 1],
+        minimums,
+        maximums,
+        np.asarray(keep, dtype=np.intp),
+    )).astype(np.intp))
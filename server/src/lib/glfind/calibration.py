@@ -0,0 +1,48 @@
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+from lib.matlab.round import matlab_round
+
+
+class Calibration:
+    """
+    Калибровка по стандарту длин, общая для всех геномных библиотек, анализируемых с этим стандартом:
+    полиномы время выхода -> длина (sdc) и обратно (sdc2), реперные пики стандарта и входные данные
+    для регрессии площадей по реперам. Считается один раз на стандарт, а не для каждой библиотеки.
+    """
+
+    def __init__(
+        self,
+        standard_peaks: NDArray[np.integer],
+        standard_sizes: NDArray[np.floating],
+        standard_conc: NDArray[np.floating],
+    ) -> None:
+        self.standard_peaks = np.asarray(standard_peaks, dtype=np.int64)
+        self.standard_sizes = np.asarray(standard_sizes, dtype=np.float64)
+        self.standard_conc = np.asarray(standard_conc, dtype=np.float64)
+
+        self.sdc = np.polyfit(self.standard_peaks, self.standard_sizes, 5)  # калибровка по стандарту
+        self.sdc2 = np.polyfit(self.standard_sizes, self.standard_peaks, 5)  # калибровка в обратную сторону для проверки соотвествия границ
+
+        # Реперы - первый и последний пики стандарта: время выхода, длина в пн, концентрация и молярность
+        self.st_peaks = np.array([self.standard_peaks[0], self.standard_peaks[-1]], dtype=np.int64)
+        self.st_peaks_corr = np.polyval(self.sdc, self.st_peaks)
+        self.conc = np.array([self.standard_conc[0], self.standard_conc[-1]], dtype=np.float64)
+        self.st_molarity = ((self.conc * 1e-3) / (649 * self.st_peaks_corr)) * 1e9
+        self.stp = matlab_round([self.standard_sizes[0], self.standard_sizes[-1]])
+
+        # Таблица polyval(sdc, i) для целых индексов отсчетов, растет по мере надобности
+        self._size_table = np.empty(0, dtype=np.float64)
+
+    def size_at_index(self, indices: ArrayLike) -> NDArray[np.floating]:
+        """Длина в пн для целых индексов отсчетов - то же, что np.polyval(sdc, indices), но из таблицы"""
+        indices = np.asarray(indices, dtype=np.intp)
+        if np.any(indices < 0):
+            return np.polyval(self.sdc, indices)
+        needed = int(np.max(indices, initial=-1)) + 1
+        table = self._size_table
+        if needed > len(table):
+            # Значения считаются поэлементно, поэтому расширенная таблица совпадает с прежней в ее пределах
+            table = np.polyval(self.sdc, np.arange(max(needed, 2 * len(table), 1024), dtype=np.int64))
+            self._size_table = table
+        return table[indices]
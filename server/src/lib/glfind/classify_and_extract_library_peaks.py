@@ -4,17 +4,20 @@ from lib.glfind.compute_hidden_library_area import compute_hidden_library_area
 import numpy as np
 from numpy.typing import NDArray
 
+from lib.glfind.calibration import Calibration
 from lib.glfind.select_isolated_peaks import select_isolated_peaks
+from lib.signal.area import CumulativeArea
+from lib.signal.extrema import window_argmax
 
 
 def classify_and_extract_library_peaks(
     corrected_signal: NDArray[np.floating],
+    signal_area: CumulativeArea,
     selected_peak_locations: NDArray[np.integer],
     reference_peaks: NDArray[np.integer],
     complete_peaks_locations: NDArray[np.integer],
     pre_unrecognized_peaks: NDArray[np.integer],
-    sdc: NDArray[np.floating],
-    sdc2: NDArray[np.floating],
+    calibration: Calibration,
 ) -> tuple[
     NDArray[np.integer],
     NDArray[np.integer],
@@ -42,47 +45,46 @@ def classify_and_extract_library_peaks(
     st_areas: list[float] = []
 
     max_lib_value = np.int64(-1)
+    x_vals = np.arange(len(corrected_signal))
+
+    # Количество пиков в каждом промежутке между соседними минимумами (границы включительно) - сразу для всех промежутков.
+    # Пик на общей границе попадает в оба соседних промежутка, поэтому считаем через searchsorted по обеим границам
+    sorted_peak_locations = np.sort(selected_peak_locations)
+    first_in_interval = np.searchsorted(sorted_peak_locations, complete_peaks_locations[:-1], side='left')
+    after_interval = np.searchsorted(sorted_peak_locations, complete_peaks_locations[1:], side='right')
+    points_between_peaks = after_interval - first_in_interval
 
     for i in range(len(complete_peaks_locations) - 1):
         # Как обычно проверяем наличие локальных максимумов между текущей парой локальных минимумов
-        indices_between_peaks = (selected_peak_locations >= complete_peaks_locations[i]) & (selected_peak_locations <= complete_peaks_locations[i + 1])
-        # Считаем количество точек, попавших в пару локальных минимумов
-        num_points_between_peaks = np.sum(indices_between_peaks)
+        num_points_between_peaks = points_between_peaks[i]
         if 0 < num_points_between_peaks < 4:
-            # Отмечаем пространство между текущими точками
-            x_points = complete_peaks_locations[i:i + 2]
-            # Для подсчёта площадей
-            for j in range(len(x_points) - 1):
-                # Выделяем текущую область
-                x_range = np.arange(x_points[j], x_points[j + 1] + 1)
-                # y_range = denoised_data[x_range]
-                # Проверка наличия значений из unrecognized_peaks в x_range
-                if np.any(np.isin(x_range, unrecognized_peaks)):  # неопознанный пик
-                    unrecognized_peaks = np.append(unrecognized_peaks, pre_unrecognized_peaks[j])
-                    # Определяем x-координаты области
-                    x_fill_1 = np.linspace(x_range[0], x_range[-1], 100)  # Разбиваем на 100 точек для плавности
-                    x_vals = np.arange(len(corrected_signal))
-                    # Получаем соответствующие y-координаты, используя интерполяцию
-                    y_fill = np.interp(x_fill_1, x_vals, corrected_signal)
-                elif np.any(np.isin(x_range, reference_peaks)):
-                    start_idx = x_range[0]
-                    end_idx = x_range[-1]
-                    area = float(np.trapezoid(corrected_signal[start_idx:end_idx + 1]))
-                    st_areas.append(area)
+            # Выделяем текущую область между текущими точками
+            x_start = complete_peaks_locations[i]
+            x_end = complete_peaks_locations[i + 1]
+            # Проверка наличия значений из unrecognized_peaks в области
+            if np.any((unrecognized_peaks >= x_start) & (unrecognized_peaks <= x_end)):  # неопознанный пик
+                unrecognized_peaks = np.append(unrecognized_peaks, pre_unrecognized_peaks[0])
+                # Определяем x-координаты области
+                x_fill_1 = np.linspace(x_start, x_end, 100)  # Разбиваем на 100 точек для плавности
+                # Получаем соответствующие y-координаты, используя интерполяцию
+                y_fill = np.interp(x_fill_1, x_vals, corrected_signal)
+            elif np.any((reference_peaks >= x_start) & (reference_peaks <= x_end)):
+                st_areas.append(signal_area.area(x_start, x_end))
         elif num_points_between_peaks >= 4:
             # Найдем максимальное значение denoised_data между текущими точками
             # Получаем индексы для complete_Peaks_Locations
             start_index = complete_peaks_locations[i]
             end_index = complete_peaks_locations[i + 1]
             f = complete_peaks_locations[i + 1]
+            indices_between_peaks = (selected_peak_locations >= start_index) & (selected_peak_locations <= end_index)
 
             # Находим максимальное значение между этими индексами
             max_lib_value = start_index + np.argmax(corrected_signal[start_index:end_index + 1])
             max_value_lib = corrected_signal[max_lib_value]
-            max_lib_value_corr = np.polyval(sdc, max_lib_value)
+            max_lib_value_corr = calibration.size_at_index(max_lib_value)
 
-            lower_bound = np.polyval(sdc2, max_lib_value_corr - 200)
-            upper_bound = np.polyval(sdc2, max_lib_value_corr + 200)
+            lower_bound = np.polyval(calibration.sdc2, max_lib_value_corr - 200)
+            upper_bound = np.polyval(calibration.sdc2, max_lib_value_corr + 200)
 
             # Проверяем, лежит ли диапазон внутри [start_index, end_index]
             if lower_bound > start_index or upper_bound < end_index:
@@ -90,28 +92,21 @@ def classify_and_extract_library_peaks(
                 x_lib_fill_1 = np.linspace(start_index, end_index, 100)  # Разбиваем на 100 точек для плавности
 
                 # Интерполируем значения y для x_fill_1
-                x_vals = np.arange(len(corrected_signal))
                 y_lib_fill = np.interp(x_lib_fill_1, x_vals, corrected_signal)
 
             # %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
             final_lib_local_minimums = np.concatenate((final_lib_local_minimums, selected_peak_locations[indices_between_peaks], [f]))  # берём текущую пару точек вместо локальных минимумов (теперь это просто один большой пик ГБ)
 
-            # Ищем локальные максимумы между найденными локальными минимумами final_Lib_local_minimums
-            for j in range(len(final_lib_local_minimums) - 1):
-                # Ищем индексы массива denoised_data, которые находятся между final_Lib_local_minimums(i) и final_Lib_local_minimums(i+1)
-                x_start = final_lib_local_minimums[j]
-                x_end = final_lib_local_minimums[j + 1]
-                # Находим соответствующие индексы в массиве denoised_data
-                indices = np.where((np.arange(len(corrected_signal)) >= x_start) & (np.arange(len(corrected_signal)) <= x_end))[0]
-
-                if len(indices) > 0:
-                    # Находим максимальное значение в массиве denoised_data между этими индексами
-                    max_value = np.max(corrected_signal[indices])
-                    indices_max_value = np.where(corrected_signal == max_value)[0]
-                    # Добавляем это максимальное значение в LibPeakLocations
-                    lib_peak_locations = np.append(lib_peak_locations, indices_max_value)
-
-            lib_peak_locations = np.unique(lib_peak_locations)
+            # Ищем локальные максимумы между найденными локальными минимумами final_Lib_local_minimums:
+            # индекс максимума denoised_data в каждом промежутке [final_Lib_local_minimums(j), final_Lib_local_minimums(j+1)]
+            x_starts = np.maximum(final_lib_local_minimums[:-1], 0).astype(np.intp)
+            x_ends = np.minimum(final_lib_local_minimums[1:], len(corrected_signal) - 1).astype(np.intp)
+            non_empty = x_starts <= x_ends
+            # Добавляем найденные максимумы в LibPeakLocations
+            lib_peak_locations = np.unique(np.concatenate((
+                lib_peak_locations,
+                window_argmax(corrected_signal, x_starts[non_empty], x_ends[non_empty]),
+            )))
 
             # На случай, если алгоритм посчитал тонкие ГБ (типа фаикс) в качестве большой библиотеки
             diff_values = np.abs(corrected_signal[lib_peak_locations.astype(int)] - max_value_lib)  # вычитаем из найденных пиков ГБ максимальный пик
@@ -134,7 +129,7 @@ def classify_and_extract_library_peaks(
                 lib_peak_locations = np.empty(0, dtype=np.int64)
             else:
                 hidden_lib_peak_locations, new_hidden_lib_areas, _ = compute_hidden_library_area(
-                    corrected_signal, start_index, end_index, max_lib_value
+                    signal_area, start_index, end_index, max_lib_value
                 )
                 hidden_lib_areas = np.append(hidden_lib_areas, new_hidden_lib_areas)
             # %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
@@ -2,10 +2,11 @@ import numpy as np
 from numpy.typing import NDArray
 
 from lib.matlab.round import matlab_round
+from lib.signal.area import CumulativeArea
 
 
 def compute_hidden_library_area(
-    corrected_signal: NDArray[np.floating],
+    signal_area: CumulativeArea,
     start_index: np.integer,
     end_index: np.integer,
     max_peak_idx: np.integer,
@@ -28,13 +29,8 @@ def compute_hidden_library_area(
     # TODO: Почему добавляем индекс начала?
     hidden_final_lib_local_minimums = np.concatenate(([start_index], library_peak_range))  # все площади
 
-    hidden_lib_areas: list[float] = []
-    # ДЛЯ ЗАКРАСКИ И ОБЩЕЙ ПЛОЩАДИ
-    for i in range(len(hidden_final_lib_local_minimums) - 1):
-        start_idx = hidden_final_lib_local_minimums[i]
-        end_idx = hidden_final_lib_local_minimums[i + 1]
-        # TODO: Поиск площади методом Симпсона
-        area = float(np.trapezoid(corrected_signal[start_idx:end_idx + 1]))
-        hidden_lib_areas.append(area)
+    # ДЛЯ ЗАКРАСКИ И ОБЩЕЙ ПЛОЩАДИ - площади между всеми соседними точками
+    # TODO: Поиск площади методом Симпсона
+    hidden_lib_areas = signal_area.areas(hidden_final_lib_local_minimums[:-1], hidden_final_lib_local_minimums[1:])
 
-    return library_peak_range, np.array(hidden_lib_areas, dtype=np.float64), hidden_final_lib_local_minimums
+    return library_peak_range, hidden_lib_areas, hidden_final_lib_local_minimums
@@ -0,0 +1,18 @@
+import numpy as np
+from numpy.typing import NDArray
+
+from lib.matlab.msbackadj import msbackadj
+
+
+def correct_signals(
+    raw_signals: NDArray[np.floating],
+) -> NDArray[np.floating]:
+    """
+    Вычитание шума и коррекция бейзлайна. Отсчеты сигнала идут по последней оси,
+    так что двумерный массив сигналов одной длины обрабатывается целиком
+    """
+    # Первые 50 значений считаем шумом и вычитаем его среднее
+    noise = raw_signals[..., :50]
+    denoised_signals = raw_signals - np.mean(noise, axis=-1, keepdims=True)
+    x = np.arange(raw_signals.shape[-1])
+    return msbackadj(x, denoised_signals, window_size=140, step_size=300, quantile_value=0.05)  # коррекция бейзлайна
@@ -1,13 +1,20 @@
 import numpy as np
 from numpy.typing import NDArray
 
+from lib.accel import kernel
+from lib.signal.area import CumulativeArea
+
 
 def filter_isolated_peaks(
     isolated_peaks: NDArray[np.integer],
     all_peaks: NDArray[np.integer],
-    corrected_signal: NDArray[np.floating],
+    signal_area: CumulativeArea,
 ) -> NDArray[np.integer]:
     """Удаление одного из двух подряд идущих одиночных пиков, если между ними нет других пиков"""
+    if _filter_isolated_kernel is not None:
+        return _filter_isolated_kernel(
+            np.ascontiguousarray(isolated_peaks), np.ascontiguousarray(all_peaks), signal_area.cumulative, signal_area.size,
+        )
 
     filtered_isolated = np.copy(isolated_peaks)
     copied_all = np.copy(all_peaks)
@@ -20,15 +27,10 @@ def filter_isolated_peaks(
         # Проверка: есть ли другие пики между current и next
         in_between = (copied_all > current_peak) & (copied_all < next_peak)
         if not np.any(in_between):  # если НЕ найдены локальные пики ГБ, значит текующие пики лежат слева или справа от ГБ
-            # Границы для текущего и следующего пика
-            left1 = max(current_peak - 4, 0)
-            right1 = min(current_peak + 4, len(corrected_signal) - 1)
-            left2 = max(next_peak - 4, 0)
-            right2 = min(next_peak + 4, len(corrected_signal) - 1)
+            # Площади +-4 отсчета вокруг текущего и следующего пика (границы обрезаются по сигналу)
+            area1, area2 = signal_area.areas([current_peak - 4, next_peak - 4], [current_peak + 4, next_peak + 4])
 
             # Определяем меньшую из площадей и удаляем соответствующий пик
-            area1 = np.trapezoid(corrected_signal[left1:right1 + 1])
-            area2 = np.trapezoid(corrected_signal[left2:right2 + 1])
             if area1 > area2:
                 copied_all = copied_all[copied_all != next_peak]
                 filtered_isolated = np.delete(filtered_isolated, i + 1)
@@ -41,3 +43,57 @@ def filter_isolated_peaks(
             i += 1
 
     return filtered_isolated
+
+
+def _filter_isolated_loop(
+    isolated_peaks: NDArray[np.integer],
+    all_peaks: NDArray[np.integer],
+    cumulative: NDArray[np.floating],
+    size: int,
+) -> NDArray[np.integer]:
+    """
+    То же на циклах для компиляции numba: удаленные пики помечаются в маске, а не копированием массивов.
+    Площади - как в CumulativeArea.areas: границы обрезаются по сигналу, пустой отрезок дает 0
+    """
+    filtered_isolated = isolated_peaks.copy()
+    count = len(filtered_isolated)
+    alive = np.ones(len(all_peaks), dtype=np.bool_)
+    last = max(size - 1, 0)
+    areas = np.zeros(2)
+
+    i = 0
+    while i < count - 1:
+        current_peak = filtered_isolated[i]
+        next_peak = filtered_isolated[i + 1]
+
+        in_between = False
+        for k in range(len(all_peaks)):
+            if alive[k] and current_peak < all_peaks[k] < next_peak:
+                in_between = True
+                break
+
+        if not in_between:
+            for w in range(2):
+                peak = current_peak if w == 0 else next_peak
+                start = min(max(peak - 4, 0), last)
+                end = min(max(peak + 4, 0), last)
+                areas[w] = cumulative[end] - cumulative[start] if end > start else 0.0
+
+            if areas[0] > areas[1]:
+                removed_peak, removed_index = next_peak, i + 1
+            else:
+                removed_peak, removed_index = current_peak, i
+            for k in range(len(all_peaks)):
+                if all_peaks[k] == removed_peak:
+                    alive[k] = False
+            for k in range(removed_index, count - 1):
+                filtered_isolated[k] = filtered_isolated[k + 1]
+            count -= 1
+            i = 0
+        else:
+            i += 1
+
+    return filtered_isolated[:count].copy()
+
+
+_filter_isolated_kernel = kernel(_filter_isolated_loop)
@@ -1,18 +1,17 @@
 import numpy as np
 from numpy.typing import NDArray
-from scipy.signal import find_peaks, savgol_filter
+from scipy.signal import find_peaks
+
+from lib.signal.context import SignalContext
 
 
 def find_significant_peaks(
-    corrected_signal: NDArray[np.floating],
+    context: SignalContext,
 ) -> NDArray[np.integer]:
     """Обнаружение значимых пиков"""
 
-    smoothed = savgol_filter(corrected_signal, 5, 1)
-    first_derivative = np.diff(smoothed)
-    first_derivative_smoothed = savgol_filter(first_derivative, 5, 1)
-    second_derivative = np.diff(first_derivative_smoothed)
-    second_derivative_smoothed = savgol_filter(second_derivative, 5, 1)
+    corrected_signal = context.signal
+    _, second_derivative_smoothed = context.derivatives(5, 1)  # сглаживание и производные считаются один раз на сигнал
 
     peak_candidate_signal = -second_derivative_smoothed
     peak_candidate_signal[peak_candidate_signal < 0] = 0
@@ -1,10 +1,12 @@
 from dataclasses import dataclass
-from typing import Literal
+from typing import Callable, Literal
 import numpy as np
 from numpy.typing import NDArray
+from lib.glfind.calibration import Calibration
 from lib.glfind.classify_and_extract_library_peaks import classify_and_extract_library_peaks
 from lib.glfind.compute_fragmented_library_concentrations import compute_fragmented_library_concentrations
 from lib.glfind.compute_smooth_library_concentrations import compute_smooth_library_concentrations
+from lib.glfind.correct_signals import correct_signals
 from lib.glfind.filter_isolated_peaks import filter_isolated_peaks
 from lib.glfind.select_reference_peaks import select_reference_peaks
 from lib.glfind.find_significant_peaks import find_significant_peaks
@@ -14,8 +16,9 @@ from lib.glfind.handle_smooth_library_case import handle_smooth_library_case
 from lib.glfind.refine_library_peaks import refine_library_peaks
 from lib.glfind.refine_minima_near_reference_peaks import refine_minima_near_reference_peaks
 from lib.glfind.select_isolated_peaks import select_isolated_peaks
-from lib.matlab.msbackadj import msbackadj
 from lib.matlab.round import matlab_round
+from lib.signal.context import SignalContext
+from lib.timing import stage
 
 
 @dataclass
@@ -48,24 +51,90 @@ class GLFindResult:
     y_fill: NDArray[np.floating]
     x_lib_fill: NDArray[np.floating]
     y_lib_fill: NDArray[np.floating]
+    timings: dict[str, float]
 
 
 def glfind(
     raw_signal: NDArray[np.floating],
-    standard_peaks: NDArray[np.integer],
-    standard_sizes: NDArray[np.floating],
-    standard_conc: NDArray[np.floating],
+    calibration: Calibration,
     find_peak_version: Literal[1, 2] = 2,
 ) -> GLFindResult:
-    # 1. Выбор первых 50 значений как шума
-    noise = raw_signal[:50]
-    # Вычитание шума из данных
-    denoised_signal = raw_signal - np.mean(noise)
-    x = np.arange(len(raw_signal))
-    corrected_signal = msbackadj(x, denoised_signal, window_size=140, step_size=300, quantile_value=0.05)  # коррекция бейзлайна
+    with stage('glfind.correct_signals', raw_signal.size):
+        corrected_signal = correct_signals(raw_signal)  # вычитание шума и коррекция бейзлайна
+    context = SignalContext(corrected_signal)  # сглаживание, производные, минимумы и площади - один раз на сигнал
+
+    px, finish = _analyze_signal(context, calibration, find_peak_version)
+    t_main = np.polyval(px, np.arange(len(corrected_signal)))
+    main_corr = np.polyval(calibration.sdc, t_main)
+    return finish(t_main, main_corr)
+
+
+def glfind_batch(
+    raw_signals: NDArray[np.floating],
+    calibration: Calibration,
+    find_peak_version: Literal[1, 2] = 2,
+) -> list[GLFindResult | Exception]:
+    """
+    glfind для двумерного массива (количество библиотек, количество отсчетов) сигналов одной длины.
+    Подготовка сигналов (шум, бейзлайн, сглаживание, производные, пересечения нуля) и пересчет шкал
+    выполняются сразу для всех строк, классификация пиков - для каждой строки отдельно.
+    Ошибка анализа одной библиотеки возвращается на ее месте в списке и не прерывает остальные.
+    """
+    with stage('glfind.correct_signals', raw_signals.size):
+        corrected_signals = correct_signals(raw_signals)
+    with stage('glfind.signal_context', raw_signals.size):
+        contexts = SignalContext.stack(corrected_signals)
+
+    analyzed: list[tuple[NDArray[np.floating], Callable[[NDArray[np.floating], NDArray[np.floating]], GLFindResult]] | Exception] = []
+    for context in contexts:
+        try:
+            analyzed.append(_analyze_signal(context, calibration, find_peak_version))
+        except Exception as ex:
+            analyzed.append(ex)
+
+    found = [item for item in analyzed if not isinstance(item, Exception)]
+    if not found:
+        return [item for item in analyzed if isinstance(item, Exception)]
+
+    # Шкалы всех библиотек разом: схема Горнера, как в np.polyval, но со своими коэффициентами px в каждой строке
+    px_rows = np.array([px for px, _ in found])
+    t = np.arange(corrected_signals.shape[-1])
+    t_main = np.zeros((len(found), len(t)))
+    for coefficients in px_rows.T:
+        t_main = t_main * t + coefficients[:, np.newaxis]
+    main_corr = np.polyval(calibration.sdc, t_main)
+
+    results: list[GLFindResult | Exception] = []
+    row = 0
+    for item in analyzed:
+        if isinstance(item, Exception):
+            results.append(item)
+        else:
+            _, finish = item
+            results.append(finish(t_main[row], main_corr[row]))
+            row += 1
+    return results
+
+
+def _analyze_signal(
+    context: SignalContext,
+    calibration: Calibration,
+    find_peak_version: Literal[1, 2],
+) -> tuple[NDArray[np.floating], Callable[[NDArray[np.floating], NDArray[np.floating]], GLFindResult]]:
+    """
+    Поиск и классификация пиков одной библиотеки. Возвращает коэффициенты выравнивания по ширине (px)
+    и функцию, собирающую результат по шкалам t_main = polyval(px, t) и main_corr = polyval(calibration.sdc, t_main),
+    чтобы шкалы можно было посчитать сразу для нескольких библиотек
+    """
+    corrected_signal = context.signal
+    size = len(corrected_signal)
+    standard_peaks = calibration.standard_peaks
+    sdc = calibration.sdc
+    signal_area = context.area  # площади любых отрезков сигнала
 
     if find_peak_version == 2:
-        significant_peaks, pre_unrecognized_peaks, reference_peaks = find_significant_peaks2(corrected_signal, standard_peaks)
+        with stage('glfind.find_significant_peaks2', size):
+            significant_peaks, pre_unrecognized_peaks, reference_peaks = find_significant_peaks2(context, standard_peaks)
         if len(significant_peaks) == 0:
             raise ValueError('Пики геномной библиотеки не были найдены')
         if len(reference_peaks) != 2:
@@ -73,18 +142,20 @@ def glfind(
             # Мы обрабатывает несколько генных библиотек в одном анализе и для каждой может потребоваться свой выбор
             raise ValueError('Реперные пики не найдены.')
     else:
-        significant_peak_candidates = find_significant_peaks(corrected_signal)
+        with stage('glfind.find_significant_peaks', size):
+            significant_peak_candidates = find_significant_peaks(context)
 
         if len(significant_peak_candidates) == 0:
             raise ValueError('Пики геномной библиотеки не были найдены')
 
         isolated_peaks_candidates, significant_peaks = select_isolated_peaks(significant_peak_candidates, corrected_signal)
 
-        isolated_peaks = filter_isolated_peaks(isolated_peaks_candidates, significant_peaks, corrected_signal)
+        with stage('glfind.filter_isolated_peaks', size):
+            isolated_peaks = filter_isolated_peaks(isolated_peaks_candidates, significant_peaks, signal_area)
 
         # Вычисление pace
         pace: np.int64 = standard_peaks[-1] - standard_peaks[0]
-        reference_peaks, pre_unrecognized_peaks = select_reference_peaks(isolated_peaks, pace, corrected_signal)
+        reference_peaks, pre_unrecognized_peaks = select_reference_peaks(isolated_peaks, pace, signal_area)
 
         if len(reference_peaks) != 2:
             # TODO Добавить выбор реперных пиков
@@ -94,56 +165,55 @@ def glfind(
         # Удаляем пики, которые лежат за пределами реперов
         significant_peaks = significant_peaks[(significant_peaks >= reference_peaks[0]) & (significant_peaks <= reference_peaks[-1])]
 
-    minima_candidates, all_local_minimums = find_signal_minima(corrected_signal)
+    with stage('glfind.find_signal_minima', size):
+        minima_candidates, all_local_minimums = find_signal_minima(context)
     complete_peaks_locations = refine_minima_near_reference_peaks(minima_candidates, reference_peaks, pre_unrecognized_peaks, corrected_signal)
 
-    # 4. Калибровка данных
-    sdc = np.polyfit(standard_peaks, standard_sizes, 5)  # калибровка по стандарту
-    sdc2 = np.polyfit(standard_sizes, standard_peaks, 5)  # калибровка в обратную сторону для проверки соотвествия границ
-
     # 5. Обработка данных с учётом калибровки
     # В этом блоке теперь находим и разбиваем все локальные пики по классам: реперные пики, пики геномной библиотеки и неопознанные пики
-    (
-        library_peak_candidates,
-        hidden_lib_peak_locations,
-        hidden_lib_areas,
-        lib_local_minima_candidates,
-        unrecognized_peaks,
-        max_lib_value,
-
-        st_areas,
-        x_fill_1,
-        x_lib_fill_1,
-        y_fill,
-        y_lib_fill,
-    ) = classify_and_extract_library_peaks(
-        corrected_signal,
-        significant_peaks,
-        reference_peaks,
-        complete_peaks_locations,
-        pre_unrecognized_peaks,
-        sdc,
-        sdc2,
-    )
-
-    is_smooth = len(hidden_lib_peak_locations) == 0
-
-    # Если ГБ гладкая/фаикс/слишком низкая
-    if is_smooth:
+    with stage('glfind.classify_and_extract_library_peaks', size):
         (
-            library_peaks,
+            library_peak_candidates,
             hidden_lib_peak_locations,
-            new_hidden_lib_areas,
-            final_lib_local_minimums,
+            hidden_lib_areas,
+            lib_local_minima_candidates,
             unrecognized_peaks,
             max_lib_value,
-        ) = handle_smooth_library_case(
+
+            st_areas,
+            x_fill_1,
+            x_lib_fill_1,
+            y_fill,
+            y_lib_fill,
+        ) = classify_and_extract_library_peaks(
             corrected_signal,
+            signal_area,
             significant_peaks,
             reference_peaks,
             complete_peaks_locations,
-            all_local_minimums,
+            pre_unrecognized_peaks,
+            calibration,
         )
+
+    is_smooth = len(hidden_lib_peak_locations) == 0
+
+    # Если ГБ гладкая/фаикс/слишком низкая
+    if is_smooth:
+        with stage('glfind.handle_smooth_library_case', size):
+            (
+                library_peaks,
+                hidden_lib_peak_locations,
+                new_hidden_lib_areas,
+                final_lib_local_minimums,
+                unrecognized_peaks,
+                max_lib_value,
+            ) = handle_smooth_library_case(
+                signal_area,
+                significant_peaks,
+                reference_peaks,
+                complete_peaks_locations,
+                all_local_minimums,
+            )
         hidden_lib_areas = np.append(hidden_lib_areas, new_hidden_lib_areas)
     else:
         library_peaks, final_lib_local_minimums = refine_library_peaks(
@@ -154,22 +224,17 @@ def glfind(
 
     # Этот блок приводит электрофореграмму геномной библиотеки и стандарта
     # длин в одну шкалу (выравнивает по ширине и высоте)
-    st_peaks = np.array([standard_peaks[0], standard_peaks[-1]], dtype=np.int64)
+    st_peaks = calibration.st_peaks
     px = np.polyfit(reference_peaks, st_peaks, 1)  # выравнивание по ширине
-    t = np.arange(len(corrected_signal))
-    t_main = np.polyval(px, t)
 
-    # Подсчёт концентраций и молярности по реперам (ГБ будет дальше)
-    main_corr = np.polyval(sdc, t_main)
-    st_peaks_corr = np.polyval(sdc, st_peaks)
+    # Подсчёт концентраций и молярности по реперам (ГБ будет дальше), длины и молярность реперов - из калибровки
+    st_peaks_corr = calibration.st_peaks_corr
+    st_molarity = calibration.st_molarity
 
     st_areas = np.array([st_areas[0], st_areas[-1]], dtype=np.float64)
-    conc = np.array([standard_conc[0], standard_conc[-1]], dtype=np.float64)
 
     led_one_area = st_areas / (st_peaks_corr / 100)  # считает корректно, проверено (в Matlab)
-    a = np.polyfit(led_one_area, conc, 1)
-
-    st_molarity = ((conc * 1e-3) / (649 * st_peaks_corr)) * 1e9
+    a = np.polyfit(led_one_area, calibration.conc, 1)
 
     hid_lib_length = np.polyval(px, hidden_lib_peak_locations)  # пересчёт по времени
     hid_lib_peaks_corr = np.polyval(sdc, hid_lib_length)
@@ -212,7 +277,7 @@ def glfind(
     lib_peaks_corr = np.polyval(sdc, lib_length)
 
     # one_area = np.concatenate(([led_one_area[0]], lib_one_area, [led_one_area[-1]]))  # площадь на один фрагмент, не нужен в коде, но может понадобиться для проверки!!!
-    all_areas_conc = np.concatenate(([standard_conc[0]], lib_one_area_conc, [standard_conc[-1]]))  # концентрация
+    all_areas_conc = np.concatenate(([calibration.conc[0]], lib_one_area_conc, [calibration.conc[-1]]))  # концентрация
     all_areas = np.concatenate(([st_areas[0]], lib_areas, [st_areas[-1]]))  # общая площадь фрагмента
     molarity = np.concatenate(([st_molarity[0]], lib_molarity, [st_molarity[-1]]))  # молярность
 
@@ -222,66 +287,69 @@ def glfind(
     t_final_locations = np.polyval(px, final_lib_local_minimums)
     t_unrecognized_peaks = np.polyval(px, unrecognized_peaks)  # пересчёт по времени неизвестных пиков
     unrecognized_peaks_corr = np.polyval(sdc, t_unrecognized_peaks)  # только неопознанные пики
-    max_lib_peak = main_corr[max_lib_value]  # максимальный пик библиотеки
 
     total_lib_area = np.sum(lib_areas)
     total_lib_conc = np.sum(lib_one_area_conc)
     total_lib_molarity = np.sum(lib_molarity)
 
-    # Закрашиваем красным ложные пики и широкую библиотеку
-    if len(x_fill_1):
-        x_fill_1 = np.array([x_fill_1[0], x_fill_1[-1]])
-        x_fill_1 = t_main[x_fill_1.astype(int)]
-        x_fill = np.linspace(x_fill_1[0], x_fill_1[-1], 100)
-    else:
-        x_fill = np.empty(0, dtype=np.float64)
+    def finish(t_main: NDArray[np.floating], main_corr: NDArray[np.floating]) -> GLFindResult:
+        max_lib_peak = main_corr[max_lib_value]  # максимальный пик библиотеки
 
-    if len(x_lib_fill_1):
-        x_lib_fill_1 = np.array([x_lib_fill_1[0], x_lib_fill_1[-1]])
-        x_lib_fill_1 = t_main[x_lib_fill_1.astype(int)]
-        x_lib_fill = np.linspace(x_lib_fill_1[0], x_lib_fill_1[-1], 100)
-    else:
-        x_lib_fill = np.empty(0, dtype=np.float64)
-
-    hpx = matlab_round(lib_peaks_corr)
-    unr = matlab_round(unrecognized_peaks_corr)
-    stp = matlab_round([standard_sizes[0], standard_sizes[-1]])
-
-    return GLFindResult(
-        t_main=t_main,
-        corrected_data=corrected_signal,
-
-        st_peaks=st_peaks,
-        st_length=reference_peaks,
-        stp=stp,
-
-        t_unrecognized_peaks=t_unrecognized_peaks,
-        unrecognized_peaks=unrecognized_peaks,
-        unr=unr,
-
-        lib_length=lib_length,
-        lib_peak_locations=library_peaks,
-        hpx=hpx,
-
-        t_final_locations=t_final_locations,
-        final_lib_local_minimums=final_lib_local_minimums,
-        main_corr=main_corr,
-
-        all_areas=all_areas,
-        all_peaks_corr=all_peaks_corr,
-        all_peaks=all_peaks,
-        all_areas_conc=all_areas_conc,
-        molarity=molarity,
-
-        max_lib_peak=max_lib_peak,
-        max_lib_value=max_lib_value,
-        total_lib_area=total_lib_area,
-        total_lib_conc=total_lib_conc,
-        total_lib_molarity=total_lib_molarity,
-
-        x_fill=x_fill,
-        y_fill=y_fill,
-
-        x_lib_fill=x_lib_fill,
-        y_lib_fill=y_lib_fill,
-    )
+        # Закрашиваем красным ложные пики и широкую библиотеку
+        if len(x_fill_1):
+            x_fill_ends = t_main[np.array([x_fill_1[0], x_fill_1[-1]]).astype(int)]
+            x_fill = np.linspace(x_fill_ends[0], x_fill_ends[-1], 100)
+        else:
+            x_fill = np.empty(0, dtype=np.float64)
+
+        if len(x_lib_fill_1):
+            x_lib_fill_ends = t_main[np.array([x_lib_fill_1[0], x_lib_fill_1[-1]]).astype(int)]
+            x_lib_fill = np.linspace(x_lib_fill_ends[0], x_lib_fill_ends[-1], 100)
+        else:
+            x_lib_fill = np.empty(0, dtype=np.float64)
+
+        hpx = matlab_round(lib_peaks_corr)
+        unr = matlab_round(unrecognized_peaks_corr)
+
+        return GLFindResult(
+            t_main=t_main,
+            corrected_data=corrected_signal,
+
+            st_peaks=st_peaks,
+            st_length=reference_peaks,
+            stp=calibration.stp,
+
+            t_unrecognized_peaks=t_unrecognized_peaks,
+            unrecognized_peaks=unrecognized_peaks,
+            unr=unr,
+
+            lib_length=lib_length,
+            lib_peak_locations=library_peaks,
+            hpx=hpx,
+
+            t_final_locations=t_final_locations,
+            final_lib_local_minimums=final_lib_local_minimums,
+            main_corr=main_corr,
+
+            all_areas=all_areas,
+            all_peaks_corr=all_peaks_corr,
+            all_peaks=all_peaks,
+            all_areas_conc=all_areas_conc,
+            molarity=molarity,
+
+            max_lib_peak=max_lib_peak,
+            max_lib_value=max_lib_value,
+            total_lib_area=total_lib_area,
+            total_lib_conc=total_lib_conc,
+            total_lib_molarity=total_lib_molarity,
+
+            x_fill=x_fill,
+            y_fill=y_fill,
+
+            x_lib_fill=x_lib_fill,
+            y_lib_fill=y_lib_fill,
+
+            timings=context.timings,
+        )
+
+    return px, finish
@@ -1,11 +1,13 @@
 import numpy as np
 from numpy.typing import NDArray
 
+from lib.accel import kernel
 from lib.glfind.compute_hidden_library_area import compute_hidden_library_area
+from lib.signal.area import CumulativeArea
 
 
 def handle_smooth_library_case(
-    corrected_signal: NDArray[np.floating],
+    signal_area: CumulativeArea,
     selected_peak_locations: NDArray[np.integer],
     reference_peaks: NDArray[np.integer],
     complete_peaks_locations: NDArray[np.integer],
@@ -27,27 +29,30 @@ def handle_smooth_library_case(
     # Инициализация массива для хранения площадей
     rest_peaks_locations = np.union1d(complete_peaks_locations, all_local_minimums)
 
-    # Проходим по парам пиков
-    i = 0
-    while i < len(rest_peaks_locations) - 1:
-        # Индексы точек между текущей парой пиков
-        indices_between_peaks = (rest_peaks >= rest_peaks_locations[i]) & (rest_peaks <= rest_peaks_locations[i + 1])
-        # Точки между пиками
-        peaks_between = rest_peaks[indices_between_peaks]
-
-        if len(peaks_between) > 1:
-            new_peak = np.int64(np.mean(peaks_between[:2]))  # Среднее значение rest_peaks между двумя соседствующими пиками (минимум между двумя текущими значениями)
-            rest_peaks_locations = np.union1d(rest_peaks_locations, new_peak)  # Добавляем новый минимум: если между текущими минимумами нашли несколько максимумов, добавляем новые минимумы, чтобы разделить эти максимумы
-            i -= 1
-        elif len(peaks_between) == 1:
-            # Определяем границы текущей области
-            start_idx = rest_peaks_locations[i]
-            end_idx = rest_peaks_locations[i + 1]
-
-            area = float(np.trapezoid(corrected_signal[start_idx:end_idx + 1]))
-            rest_peaks_areas.append(area)
-
-        i += 1
+    if _split_locations_kernel is not None:
+        rest_peaks_locations, split_areas = _split_locations_kernel(rest_peaks, rest_peaks_locations, signal_area.cumulative, signal_area.size)
+        rest_peaks_areas = split_areas.tolist()
+    else:
+        # Проходим по парам пиков
+        i = 0
+        while i < len(rest_peaks_locations) - 1:
+            # Индексы точек между текущей парой пиков
+            indices_between_peaks = (rest_peaks >= rest_peaks_locations[i]) & (rest_peaks <= rest_peaks_locations[i + 1])
+            # Точки между пиками
+            peaks_between = rest_peaks[indices_between_peaks]
+
+            if len(peaks_between) > 1:
+                new_peak = np.int64(np.mean(peaks_between[:2]))  # Среднее значение rest_peaks между двумя соседствующими пиками (минимум между двумя текущими значениями)
+                rest_peaks_locations = np.union1d(rest_peaks_locations, new_peak)  # Добавляем новый минимум: если между текущими минимумами нашли несколько максимумов, добавляем новые минимумы, чтобы разделить эти максимумы
+                i -= 1
+            elif len(peaks_between) == 1:
+                # Определяем границы текущей области
+                start_idx = rest_peaks_locations[i]
+                end_idx = rest_peaks_locations[i + 1]
+
+                rest_peaks_areas.append(signal_area.area(start_idx, end_idx))
+
+            i += 1
 
     # Находим индекс наибольшей площади
     max_index = np.argmax(rest_peaks_areas)
@@ -61,7 +66,7 @@ def handle_smooth_library_case(
     end_index = min(rest_peaks_locations[rest_peaks_locations > lib_peak_locations])
 
     hidden_lib_peak_locations, new_hidden_lib_areas, hidden_final_lib_local_minimums = compute_hidden_library_area(
-        corrected_signal, start_index, end_index, max_lib_value)
+        signal_area, start_index, end_index, max_lib_value)
 
     # Определяем "неопознанные" пики и их площади
     unrecognized_peaks = np.copy(rest_peaks)
@@ -79,3 +84,60 @@ def handle_smooth_library_case(
         unrecognized_peaks,
         max_lib_value,
     )
+
+
+def _split_locations_loop(
+    rest_peaks: NDArray[np.integer],
+    locations: NDArray[np.integer],
+    cumulative: NDArray[np.floating],
+    size: int,
+) -> tuple[NDArray[np.integer], NDArray[np.floating]]:
+    """
+    Проход по парам минимумов на циклах для компиляции numba: новый минимум вставляется в отсортированный
+    список бисекцией вместо np.union1d. Площади - как в CumulativeArea.area
+    """
+    split_locations = [np.int64(location) for location in locations]
+    areas = [0.0 for _ in range(0)]  # пустой список float: из литерала [] numba не выведет тип элементов
+    last = max(size - 1, 0)
+
+    i = 0
+    while i < len(split_locations) - 1:
+        low = split_locations[i]
+        high = split_locations[i + 1]
+
+        # Первые два пика между текущей парой минимумов (в порядке rest_peaks) и их количество
+        peaks_between = 0
+        first_peak = np.int64(0)
+        second_peak = np.int64(0)
+        for peak in rest_peaks:
+            if low <= peak <= high:
+                if peaks_between == 0:
+                    first_peak = peak
+                elif peaks_between == 1:
+                    second_peak = peak
+                peaks_between += 1
+
+        if peaks_between > 1:
+            # np.mean двух целых: сумма в float64, деление, отбрасывание дробной части
+            new_peak = np.int64((np.float64(first_peak) + np.float64(second_peak)) / 2.0)
+            position, high_position = 0, len(split_locations)
+            while position < high_position:
+                middle = (position + high_position) // 2
+                if split_locations[middle] < new_peak:
+                    position = middle + 1
+                else:
+                    high_position = middle
+            if position == len(split_locations) or split_locations[position] != new_peak:
+                split_locations.insert(position, new_peak)
+            i -= 1
+        elif peaks_between == 1:
+            start = min(max(low, 0), last)
+            end = min(max(high, 0), last)
+            areas.append(cumulative[end] - cumulative[start] if end > start else 0.0)
+
+        i += 1
+
+    return np.array(split_locations), np.array(areas)
+
+
+_split_locations_kernel = kernel(_split_locations_loop)
@@ -0,0 +1,119 @@
+import numpy as np
+from numpy.typing import NDArray
+
+from lib.signal.extrema import local_argmax
+
+
+def score_peak_candidates(
+    corrected_signal: NDArray[np.floating],
+    peak_indices: NDArray[np.integer],
+    peak_heights: NDArray[np.floating],
+    peak_width: NDArray[np.floating],
+    peak_proms: NDArray[np.floating],
+    standard_peaks: NDArray[np.integer],
+) -> NDArray[np.floating]:
+    """
+    Баллы (Points) кандидатов в пики для find_significant_peaks2: шесть этапов оценки,
+    каждый считается операциями над массивами сразу для всех кандидатов
+    """
+    Points = np.zeros_like(peak_proms, dtype=float)
+
+    # === ЭТАП 1. Работа с разрядами (пики с наибольшим разрядом (единицей) получают +1) ===
+    orders = np.floor(np.log10(np.abs(peak_proms))).astype(int)
+    max_order = np.max(orders)
+
+    # Округляем те значения, у которых порядок меньше максимального
+    r_peak_proms = peak_proms.copy()
+    round_mask = (peak_proms != 0) & (orders < max_order)
+    r_peak_proms[round_mask] = _round_to_decimals(peak_proms[round_mask], -orders[round_mask])
+
+    orders = np.floor(np.log10(np.abs(r_peak_proms))).astype(int)
+
+    lower_orders = orders[orders < max_order]
+    if len(lower_orders) > 0:
+        selected_mask = (orders == max_order) | (orders == lower_orders.max())
+    else:
+        selected_mask = (orders == max_order)
+
+    #  Добавляем +1 балл в Points для выбранных по маске пиков
+    Points[selected_mask] += 1
+
+    # === ЭТАП 2. Оценка ширины пиков (peak_widths) от 0 до 1, где 1 - самый широкий, 0 - самый узкий ===
+    idx_widths = np.argsort(-peak_width)        # sort desc
+    sorted_widths = peak_width[idx_widths]
+
+    if len(sorted_widths) > 1:
+        norm_widths = (sorted_widths - sorted_widths.min()) / (sorted_widths.max() - sorted_widths.min())
+    else:
+        norm_widths = np.array([1.0])
+
+    # idx_widths - перестановка, индексы не повторяются
+    Points[idx_widths] += norm_widths
+
+    # === ЭТАП 3. Соотношение peaks/peak_widths: 1 - наибольшее, 0 - наименьшее ===
+    R = peak_heights / peak_width
+    idx_R = np.argsort(-R)
+    sorted_R = R[idx_R]
+
+    if len(sorted_R) > 1:
+        norm_R = (sorted_R - sorted_R.min()) / (sorted_R.max() - sorted_R.min())
+    else:
+        norm_R = np.array([1.0])
+
+    Points[idx_R] += norm_R
+
+    # === ЭТАП 4. Пороговая фильтрация - если пик выше порога, то +1 ===
+    selectedPeaks = corrected_signal[peak_indices]
+    threshold = np.mean(selectedPeaks) / 3.0
+
+    Points[selectedPeaks > threshold] += 1
+
+    # === ЭТАП 5. Оценка "одиноких" пиков, если проходят под условия +-4 от максимума, значит это не локальные пики библиотеки, +1 ===
+    left_val, max_val, right_val = _lonely_peak_values(corrected_signal, peak_indices)
+
+    lonely_mask = ((left_val < 0.9 * max_val) & (right_val < 0.9 * max_val)) | (orders == max_order)
+    Points[lonely_mask] += 1
+
+    # === ЭТАП 6: Сортировка first_reper_idx ===
+    first_reper_idx = np.where(np.abs(peak_indices - standard_peaks[0]) <= 100)[0]
+
+    vals = peak_indices[first_reper_idx]  # время выхода выбранных пиков
+    idx_sort = np.argsort(vals)
+    sorted_vals = vals[idx_sort]
+
+    if len(sorted_vals) > 1:
+        # нормализация от 0 до 1
+        norm_vals = (sorted_vals - sorted_vals.min()) / (sorted_vals.max() - sorted_vals.min())
+        # инвертируем: min -> 1, max -> 0
+        adj_vals = 0.5 - norm_vals
+    else:
+        adj_vals = np.array([0.5])  # если один пик
+
+    Points[first_reper_idx[idx_sort]] += adj_vals
+
+    return Points
+
+
+def _round_to_decimals(values: NDArray[np.floating], decimals: NDArray[np.integer]) -> NDArray[np.floating]:
+    """
+    np.round(value, decimals) для своего decimals у каждого элемента: те же операции, что и в NumPy
+    (умножение или деление на 10 ** |decimals|, rint и обратная операция), поэтому результат совпадает побитово
+    """
+    scales = np.array([float(10 ** abs(int(d))) for d in decimals], dtype=np.float64)
+    positive = decimals >= 0
+    rounded = np.empty_like(values)
+    rounded[positive] = np.rint(values[positive] * scales[positive]) / scales[positive]
+    rounded[~positive] = np.rint(values[~positive] / scales[~positive]) * scales[~positive]
+    return rounded
+
+
+def _lonely_peak_values(
+    denoised_data: NDArray[np.floating],
+    peak_indices: NDArray[np.integer],
+) -> tuple[NDArray[np.floating], NDArray[np.floating], NDArray[np.floating]]:
+    """Для каждого пика: максимум в окне +-4 отсчета и значения сигнала в +-4 отсчетах от положения этого максимума"""
+    max_position = local_argmax(denoised_data, peak_indices, 4)
+
+    left_value = denoised_data[np.maximum(max_position - 4, 0)]
+    right_value = denoised_data[np.minimum(max_position + 4, len(denoised_data) - 1)]
+    return left_value, denoised_data[max_position], right_value
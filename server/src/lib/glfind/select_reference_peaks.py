@@ -1,11 +1,13 @@
 import numpy as np
 from numpy.typing import NDArray
 
+from lib.signal.area import CumulativeArea
+
 
 def select_reference_peaks(
     peaks: NDArray[np.integer],
     expected_spacing: np.integer,
-    corrected_signal: NDArray[np.floating],
+    signal_area: CumulativeArea,
 ) -> tuple[NDArray[np.integer], NDArray[np.integer]]:
     """Нахождение двух реперных пиков на основе ожидаемого расстояния между ними"""
 
@@ -31,18 +33,9 @@ def select_reference_peaks(
     elif len(recognized_peaks) == 1:
         end_peak = recognized_peaks[0]
     else:
-        # Создаем массив для хранения площадей
-        areas = []
-
-        # Перебираем все значения, начиная со второго
-        for peak_idx in recognized_peaks:
-            # Определяем границы (±7)
-            left_idx = peak_idx - 7
-            right_idx = peak_idx + 7
-
-            # Интегрируем площадь между границами
-            area = np.trapezoid(corrected_signal[left_idx:right_idx + 1])
-            areas.append(area)
+        # Интегрируем площадь в границах ±7 от каждого распознанного пика
+        recognized = np.array(recognized_peaks, dtype=np.int64)
+        areas = signal_area.areas(recognized - 7, recognized + 7)
 
         # Находим индекс наибольшей площади
         max_area_idx = np.argmax(areas)
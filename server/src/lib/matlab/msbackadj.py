@@ -1,4 +1,5 @@
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from numpy.typing import NDArray
 from scipy.interpolate import PchipInterpolator
 
@@ -16,20 +17,82 @@ def msbackadj(
 
     Parameters:
     - x: 1D array of x-values (must be monotonic)
-    - y: 1D array of signal values (same length as x)
+    - y: array of signal values along the last axis (same length as x); a 2D array
+      (n_signals, len(x)) corrects a stack of signals sharing x at once
     - window_size: number of points in each sliding window (e.g. 140)
     - step_size: step size between consecutive windows (e.g. 40)
     - quantile_value: quantile to use for estimating the baseline in each window (e.g. 0.1 for 10%)
 
     Returns:
-    - adjusted_signal: signal with estimated baseline subtracted
+    - adjusted_signal: signal with estimated baseline subtracted, same shape as y
     """
     x = np.asarray(x)
     y = np.asarray(y)
     N = len(x)
     if N == 0:
-        return np.empty(0)  # Return empty array for empty input
+        return np.empty(y.shape)  # Return empty array for empty input
 
+    if N > 1 and step_size > 0 and np.all(x[1:] >= x[:-1]):
+        # Fast path for ascending x (e.g. np.arange(N)): windows are contiguous index ranges
+        baseline_x, baseline_y = _window_quantiles(x, y, window_size, step_size, quantile_value)
+    else:
+        baseline_x, baseline_y = _window_quantiles_loop(x, y, window_size, step_size, quantile_value)
+
+    # Interpolate baseline using PCHIP (Piecewise Cubic Hermite Interpolating Polynomial)
+    f_interp = PchipInterpolator(baseline_x, baseline_y, axis=-1, extrapolate=True)
+    baseline_curve = f_interp(x)
+
+    # Subtract interpolated baseline from original signal
+    adjusted_signal = y - baseline_curve
+    return adjusted_signal
+
+
+def _window_quantiles(
+    x: NDArray,
+    y: NDArray,
+    window_size: float,
+    step_size: float,
+    quantile_value: float,
+) -> tuple[NDArray, NDArray]:
+    """
+    Baseline anchor points for ascending x, bit-identical to `_window_quantiles_loop`.
+
+    Window bounds are found with `searchsorted` instead of a full-signal mask per window,
+    and quantiles are computed in one batched call per distinct window length (for every
+    signal of a stack at once).
+    """
+    # Window starts accumulate exactly like `x_start += step_size` in the loop (cumsum is sequential)
+    count = int((x[-1] - x[0]) // step_size) + 2
+    increments = np.full(count, step_size, dtype=np.float64)
+    increments[0] = x[0]
+    x_starts = np.cumsum(increments)
+    x_starts = x_starts[x_starts <= x[-1]]
+
+    # Index range [lo, hi) of each window: x_start <= x <= x_start + window_size
+    lo = np.searchsorted(x, x_starts, side='left')
+    hi = np.searchsorted(x, x_starts + window_size, side='right')
+    lengths = hi - lo
+
+    non_empty = lengths > 0
+    x_starts, lo, lengths = x_starts[non_empty], lo[non_empty], lengths[non_empty]
+
+    baseline_y = np.empty(y.shape[:-1] + (len(x_starts),), dtype=np.float64)
+    for length in np.unique(lengths):
+        rows = np.flatnonzero(lengths == length)
+        windows = sliding_window_view(y, int(length), axis=-1)[..., lo[rows], :]
+        baseline_y[..., rows] = np.quantile(windows, quantile_value, axis=-1, method='hazen')
+
+    return x_starts + window_size / 2, baseline_y
+
+
+def _window_quantiles_loop(
+    x: NDArray,
+    y: NDArray,
+    window_size: float,
+    step_size: float,
+    quantile_value: float,
+) -> tuple[list, NDArray]:
+    """Baseline anchor points for arbitrary monotonic x: one mask and one quantile per window"""
     baseline_x = []  # x-positions of baseline anchor points
     baseline_y = []  # corresponding y-values (quantiles)
 
@@ -44,19 +107,14 @@ def msbackadj(
 
         # Mask for points within the current window
         mask = (x >= x_win_lo) & (x <= x_win_hi)
-        y_window = y[mask]
+        y_window = y[..., mask]
 
-        if y_window.size > 0:
+        if y_window.shape[-1] > 0:
             # Use center of window and quantile of y as baseline point
             baseline_x.append(x_start + window_size / 2)
-            baseline_y.append(np.quantile(y_window, quantile_value, method='hazen'))
+            baseline_y.append(np.quantile(y_window, quantile_value, axis=-1, method='hazen'))
 
         x_start += step_size
 
-    # Interpolate baseline using PCHIP (Piecewise Cubic Hermite Interpolating Polynomial)
-    f_interp = PchipInterpolator(baseline_x, baseline_y, extrapolate=True)
-    baseline_curve = f_interp(x)
-
-    # Subtract interpolated baseline from original signal
-    adjusted_signal = y - baseline_curve
-    return adjusted_signal
+    # Anchor points go along the last axis, like the signal itself
+    return baseline_x, np.moveaxis(np.array(baseline_y), 0, -1)
@@ -1,7 +1,9 @@
+from io import BytesIO
 from typing import IO
 from os import path
 
 
+from lib.timing import stage
 from models.models import GenLibParseResult, SizeStandardParseResult
 
 
@@ -17,3 +19,9 @@ def parse_file(file: IO[bytes], filename: str) -> tuple[list[SizeStandardParseRe
     #     return parse_file(file, filename)
 
     raise ValueError(f"Неподдерживаемый формат файла: {ext}")
+
+
+def parse_bytes(content: bytes, filename: str) -> tuple[list[SizeStandardParseResult], list[GenLibParseResult]]:
+    """Разбор содержимого файла, уже прочитанного в память - удобно для передачи в пул процессов"""
+    with stage('parse', len(content)):
+        return parse_file(BytesIO(content), filename)
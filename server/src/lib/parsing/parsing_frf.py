@@ -1,7 +1,10 @@
-from xml.etree import ElementTree
-from xml.etree.ElementTree import Element
+from dataclasses import dataclass, field
+from xml.etree.ElementTree import Element, iterparse
 from typing import IO
 
+import numpy as np
+from numpy.typing import NDArray
+
 from models.models import GenLibDescription, GenLibParseResult, SizeStandardCalibration, SizeStandardDescription, SizeStandardParseResult
 
 
@@ -9,25 +12,20 @@ def parse_file(file: IO[bytes], filename: str) -> tuple[list[SizeStandardParseRe
     size_standards: list[SizeStandardParseResult] = []
     gen_libs: list[GenLibParseResult] = []
     try:
-        root = ElementTree.parse(file)
-        raw_title: str = root.findtext('Title') or 'Unknown'
-        type_value = root.findtext('Type')
-        if type_value == 'AllelicLadder':
-            size_standard_node = root.find('./SizeStandard/Sizes')
-            if size_standard_node is not None:
+        document = read_frf(file)
+        raw_title: str = document.title or 'Unknown'
+        if document.type == 'AllelicLadder':
+            if document.sizes is not None:
                 sizes: list[float] = []
                 concentrations: list[float] = []
                 release_times: list[int] = []
 
-                size_elements = size_standard_node.findall('double')
-                for size_elem in size_elements:
-                    sizes.append(float(size_elem.text))  # type: ignore
-                    concentrations.append(float(size_elem.get('Concentration')))  # type: ignore
-                    release_time_str: str = size_elem.get('ReleaseTime')  # type: ignore
-                    time_parts = release_time_str.split(':')
+                for size_text, concentration_text, release_time_str in document.sizes:
+                    sizes.append(float(size_text))  # type: ignore
+                    concentrations.append(float(concentration_text))  # type: ignore
+                    time_parts = release_time_str.split(':')  # type: ignore
                     release_times.append(int(time_parts[0]) * 3600 + int(time_parts[1]) * 60 + int(time_parts[2]))
 
-                raw_signal = extract_filtered_int_values(root.findall('./Data/Point'))
                 calibration = SizeStandardCalibration(
                     sizes=sizes,
                     concentrations=concentrations,
@@ -38,31 +36,91 @@ def parse_file(file: IO[bytes], filename: str) -> tuple[list[SizeStandardParseRe
                         title=raw_title,
                         filename=filename,
                     ),
-                    signal=raw_signal,
+                    signal=document.signal.tolist(),
                     calibration=calibration,
                 ))
-        elif type_value == 'Sample':
-            raw_signal = extract_filtered_int_values(root.findall('./Data/Point'))
+        elif document.type == 'Sample':
             gen_libs.append(GenLibParseResult(
                 description=GenLibDescription(
                     title='GenLib_' + raw_title,
                     filename=filename,
                 ),
-                signal=raw_signal,
+                signal=document.signal.tolist(),
             ))
     except Exception as ex:
         print(ex)
     return size_standards, gen_libs
 
 
-def extract_filtered_int_values(point_nodes: list[Element]) -> list[int]:
-    values: list[int] = []
-    for point in point_nodes:
-        data_node = point.find('Data')
-        if data_node is not None:
-            int_nodes = data_node.findall('int')
-            for node in int_nodes:
-                val = int(node.text)  # type: ignore
-                if val != 1:
-                    values.append(val)
-    return values
+@dataclass
+class FRFDocument:
+    """Заголовок и сигнал FRF-файла, прочитанные потоково"""
+    title: str | None = None
+    type: str | None = None
+    # Сырые значения (размер, Concentration, ReleaseTime) элементов SizeStandard/Sizes/double,
+    # None - если узла SizeStandard/Sizes в файле нет
+    sizes: list[tuple[str | None, str | None, str | None]] | None = None
+    signal: NDArray[np.int32] = field(default_factory=lambda: np.empty(0, dtype=np.int32))
+
+
+class SignalBuffer:
+    """Растущий буфер отсчетов сигнала int32"""
+
+    def __init__(self, capacity: int = 16384) -> None:
+        self._data = np.empty(capacity, dtype=np.int32)
+        self._size = 0
+
+    def append(self, value: int) -> None:
+        if self._size == len(self._data):
+            grown = np.empty(len(self._data) * 2, dtype=np.int32)
+            grown[:self._size] = self._data
+            self._data = grown
+        self._data[self._size] = value
+        self._size += 1
+
+    def to_array(self) -> NDArray[np.int32]:
+        return self._data[:self._size].copy()
+
+
+def read_frf(file: IO[bytes]) -> FRFDocument:
+    """
+    Потоковое чтение FRF-файла через iterparse: дерево целиком не строится,
+    обработанные точки сразу удаляются, а отсчеты пишутся в буфер int32.
+    Повторяет выборку исходного парсера: Title и Type - первые дочерние узлы корня,
+    размеры - первый узел SizeStandard/Sizes, отсчеты - Data/Point/Data/int, кроме значений 1.
+    """
+    document = FRFDocument()
+    buffer = SignalBuffer()
+    stack: list[Element] = []
+
+    for event, elem in iterparse(file, events=('start', 'end')):
+        if event == 'start':
+            stack.append(elem)
+            continue
+
+        depth = len(stack)
+        if depth == 3:
+            parent = stack[1]
+            if parent.tag == 'Data' and elem.tag == 'Point':
+                data_node = elem.find('Data')
+                if data_node is not None:
+                    for node in data_node.findall('int'):
+                        val = int(node.text)  # type: ignore
+                        if val != 1:
+                            buffer.append(val)
+                # Точка обработана - освобождаем все уже прочитанные точки
+                parent.clear()
+            elif parent.tag == 'SizeStandard' and elem.tag == 'Sizes' and document.sizes is None:
+                document.sizes = [
+                    (size_elem.text, size_elem.get('Concentration'), size_elem.get('ReleaseTime'))
+                    for size_elem in elem.findall('double')
+                ]
+        elif depth == 2:
+            if elem.tag == 'Title' and document.title is None:
+                document.title = elem.text or ''
+            elif elem.tag == 'Type' and document.type is None:
+                document.type = elem.text or ''
+        stack.pop()
+
+    document.signal = buffer.to_array()
+    return document
@@ -1,33 +1,28 @@
 import numpy as np
 from numpy.typing import NDArray
-from scipy.signal import find_peaks, savgol_filter
+
+from lib.signal.context import SignalContext
 
 
 def compute_peak_areas(
-    corrected_signal: NDArray[np.floating],
-    denoised_signal: NDArray[np.floating],
+    corrected: SignalContext,
+    denoised: SignalContext,
     matching_peaks: NDArray[np.integer]
 ) -> NDArray[np.floating]:
     """Вычисляет площади под сигналом между границами пиков."""
 
     #  Нахождение минимумов
-    smoothed = savgol_filter(denoised_signal, 3, 1)
-    zero_crossings = np.where(np.diff(smoothed > 0))[0]
-    local_minima = find_peaks(-smoothed)[0]
+    smoothed = denoised.smoothed_context(3, 1)
+    zero_crossings = smoothed.zero_crossings()
+    local_minima = smoothed.minima()
     split_points = np.union1d(local_minima, zero_crossings)
 
     # *** нарисуем что нашли ***
-    # строим площади под графиком и считаем их
-    peak_areas: list[float] = []
-    for i in range(len(split_points) - 1):
-        # ищем индексы между текущей парой точек
-        peaks_between = (matching_peaks >= split_points[i]) & (matching_peaks <= split_points[i + 1])
-        # считаем количество значений между текущей парой точек
-        if np.sum(peaks_between) == 1:
-            # Выделим текущую область
-            start_idx = split_points[i]
-            end_idx = split_points[i + 1]
-            area = float(np.trapezoid(corrected_signal[start_idx:end_idx + 1]))
-            peak_areas.append(area)
+    # строим площади под графиком и считаем их - только для областей, где ровно один пик
+    starts = split_points[:-1]
+    ends = split_points[1:]
+    # считаем количество пиков между каждой парой точек
+    peaks_between = (matching_peaks[None, :] >= starts[:, None]) & (matching_peaks[None, :] <= ends[:, None])
+    single_peak = np.sum(peaks_between, axis=1) == 1
 
-    return np.array(peak_areas, dtype=np.float64)
+    return corrected.area.areas(starts[single_peak], ends[single_peak])
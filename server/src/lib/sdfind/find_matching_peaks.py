@@ -1,7 +1,11 @@
+from bisect import bisect_left
+
 import numpy as np
 from numpy.typing import NDArray
 from scipy.signal import find_peaks
 
+from lib.accel import kernel
+
 
 def find_matching_peaks(
     denoised_signal: NDArray[np.floating],
@@ -20,6 +24,12 @@ def find_matching_peaks(
     overmuch = len(standard_sizes) * 2.4  # порог количества, значение взято из опыта
     threshold = np.quantile(denoised_flipped, 0.995, method='hazen')  # для начала возьмем порог на уровне 99.5%, будем его снижать, если надо
 
+    # Локальные максимумы ищем один раз, а не на каждом пороге. Набор максимумов выше порога
+    # определяется их количеством, поэтому прореживание по расстоянию делаем один раз для каждого набора
+    local_maxima = find_peaks(denoised_flipped)[0]
+    local_maxima_heights = denoised_flipped[local_maxima]
+    peaks_by_count: dict[int, NDArray[np.integer]] = {}
+
     # *** НАЙДЕМ В СПЕКТРЕ ПИКИ, СООТВЕТВУЮЩИЕ ПИКАМ СТАНДАРТА ***
     for _ in range(30):   # главный цикл (30 попыток)
         # ищем пики, пытаемся среди найденных отобрать подходящие, если не
@@ -30,7 +40,10 @@ def find_matching_peaks(
 
         peaks = np.empty(0, dtype=np.int64)
         for _ in range(20):
-            peaks = find_peaks(denoised_flipped, height=threshold, distance=9)[0]  # Equal MinPeakDistance=8
+            candidates = local_maxima[local_maxima_heights >= threshold]
+            if len(candidates) not in peaks_by_count:
+                peaks_by_count[len(candidates)] = _select_by_peak_distance(candidates, denoised_flipped[candidates], 9)  # Equal MinPeakDistance=8
+            peaks = peaks_by_count[len(candidates)]
             if len(peaks) >= len(standard_sizes):
                 break
             threshold *= 0.9
@@ -39,36 +52,149 @@ def find_matching_peaks(
             break
 
         #  ОТСЕИВАЕМ ЛИШНИЕ
-        for k in range(len(standard_sizes) - 1):
-            for j in range(k + 1, len(peaks)):
-                base_step = (peaks[j] - peaks[k]) / size_deltas[0]  # кандидат на "базовый шаг"
-                step = base_step  # pace - текущий шаг
-                filtered_peaks = [0]  # кандидат
-
-                liz_idx, peak_idx, next_pos = 0, 0, 0
-                # проверим является ли кандидат на "базовый шаг" настоящим
-                while next_pos < peaks[-1] and liz_idx < len(standard_sizes) - 1:
-                    prev_pos = peaks[peak_idx]
-                    delta = step * size_deltas[liz_idx]
-                    next_pos = prev_pos + delta
-                    dists = np.abs(peaks - next_pos)
-                    nearest_idx = np.argmin(dists)   # индекс ближайшего значения
-                    dist = dists[nearest_idx]
-
-                    if dist < delta / 2:  # пик лежит примерно там где и ожидалось
-                        peak_idx = int(nearest_idx)
-                        filtered_peaks.append(peak_idx)
-                        step = (peaks[nearest_idx] - prev_pos) / size_deltas[liz_idx]  # фактический шаг
-                        liz_idx += 1
-                    else:  # пика в ожидаемом месте нет - возможно начальный пик ложный
-                        peak_idx = filtered_peaks[0] + 1  # примем следующий пик за начальный
-                        filtered_peaks = [peak_idx]
-                        step = base_step
-                        liz_idx = 0  # стандарт начнем с начала
-
-                if len(filtered_peaks) == len(standard_sizes):  # нужное количество пиков нашли - выходим из цикла
-                    matching_peaks_flipped = peaks[filtered_peaks]
-                    matching_peaks = np.flip(-matching_peaks_flipped + len(denoised_signal) - 1)
-                    return matching_peaks
+        filtered_peaks = _find_ladder(peaks, size_deltas, len(standard_sizes))
+        if filtered_peaks is not None:
+            matching_peaks_flipped = peaks[filtered_peaks]
+            matching_peaks = np.flip(-matching_peaks_flipped + len(denoised_signal) - 1)
+            return matching_peaks
 
     return np.empty(0, dtype=np.int64)
+
+
+def _find_ladder(peaks: NDArray[np.integer], size_deltas: NDArray[np.floating], count: int) -> list[int] | None:
+    """
+    Перебирает кандидатов на базовый шаг (разности пар пиков) и возвращает индексы первой найденной лесенки из count пиков.
+    Проверка кандидата зависит только от разности пиков, поэтому неудачные разности запоминаем и не проверяем повторно
+    """
+    if _find_ladder_kernel is not None:
+        found = _find_ladder_kernel(np.ascontiguousarray(peaks, dtype=np.int64), np.ascontiguousarray(size_deltas, dtype=np.float64), count)
+        return found.tolist() if len(found) else None
+
+    peak_positions: list[int] = peaks.tolist()
+    deltas: list[float] = size_deltas.tolist()
+    rejected_spans: set[int] = set()
+    for k in range(count - 1):
+        for j in range(k + 1, len(peak_positions)):
+            span = peak_positions[j] - peak_positions[k]
+            if span in rejected_spans:
+                continue
+            filtered_peaks = _match_ladder(peak_positions, span / deltas[0], deltas, count)
+            if filtered_peaks is None:
+                rejected_spans.add(span)
+                continue
+            return filtered_peaks
+    return None
+
+
+def _select_by_peak_distance(peaks: NDArray[np.integer], heights: NDArray[np.floating], distance: int) -> NDArray[np.integer]:
+    """
+    Прореживание пиков, как в find_peaks(distance=...): начиная с самого высокого, удаляются пики ближе distance отсчетов.
+    Порядок обхода задается тем же np.argsort, что и в scipy, поэтому совпадает и при равных высотах.
+    """
+    positions: list[int] = peaks.tolist()
+    keep = [True] * len(positions)
+    for i in np.argsort(heights)[::-1].tolist():
+        if not keep[i]:
+            continue
+        k = i - 1
+        while k >= 0 and positions[i] - positions[k] < distance:
+            keep[k] = False
+            k -= 1
+        k = i + 1
+        while k < len(positions) and positions[k] - positions[i] < distance:
+            keep[k] = False
+            k += 1
+    return peaks[np.array(keep, dtype=bool)]
+
+
+def _match_ladder(peaks: list[int], base_step: float, size_deltas: list[float], count: int) -> list[int] | None:
+    """
+    Проверяет кандидата на "базовый шаг": идет по пикам от начального, ожидая следующий пик на расстоянии шаг * разность размеров.
+    Возвращает индексы count найденных пиков или None. Ближайший пик ищется бисекцией
+    по отсортированным пикам, при равных расстояниях берется левый - как np.argmin.
+    """
+    step = base_step  # pace - текущий шаг
+    filtered_peaks = [0]  # кандидат
+    last_peak = peaks[-1]
+
+    liz_idx, peak_idx, next_pos = 0, 0, 0.0
+    while next_pos < last_peak and liz_idx < count - 1:
+        prev_pos = peaks[peak_idx]
+        delta = step * size_deltas[liz_idx]
+        next_pos = prev_pos + delta
+
+        nearest_idx = bisect_left(peaks, next_pos)
+        if nearest_idx == len(peaks) or (nearest_idx > 0 and next_pos - peaks[nearest_idx - 1] <= peaks[nearest_idx] - next_pos):
+            nearest_idx -= 1
+        dist = abs(peaks[nearest_idx] - next_pos)
+
+        if dist < delta / 2:  # пик лежит примерно там где и ожидалось
+            peak_idx = nearest_idx
+            filtered_peaks.append(peak_idx)
+            step = (peaks[nearest_idx] - prev_pos) / size_deltas[liz_idx]  # фактический шаг
+            liz_idx += 1
+        else:  # пика в ожидаемом месте нет - возможно начальный пик ложный
+            peak_idx = filtered_peaks[0] + 1  # примем следующий пик за начальный
+            filtered_peaks = [peak_idx]
+            step = base_step
+            liz_idx = 0  # стандарт начнем с начала
+
+    if len(filtered_peaks) == count:  # нужное количество пиков нашли
+        return filtered_peaks
+    return None
+
+
+def _find_ladder_loop(peaks: NDArray[np.integer], size_deltas: NDArray[np.floating], count: int) -> NDArray[np.integer]:
+    """
+    _find_ladder и _match_ladder на циклах для компиляции numba. Пики отсортированы, поэтому разности
+    положительны и неудачные отмечаются в булевом массиве. Если лесенка не найдена, возвращает пустой массив
+    """
+    not_found = np.empty(0, dtype=np.int64)
+    if len(peaks) < 2:
+        return not_found
+    rejected_spans = np.zeros(peaks[-1] - peaks[0] + 1, dtype=np.bool_)
+    last_peak = peaks[-1]
+
+    for k in range(count - 1):
+        for j in range(k + 1, len(peaks)):
+            span = peaks[j] - peaks[k]
+            if rejected_spans[span]:
+                continue
+
+            base_step = span / size_deltas[0]
+            step = base_step
+            filtered_peaks = np.empty(count, dtype=np.int64)
+            filtered_peaks[0] = 0
+            found = 1
+
+            liz_idx, peak_idx, next_pos = 0, 0, 0.0
+            while next_pos < last_peak and liz_idx < count - 1:
+                prev_pos = peaks[peak_idx]
+                delta = step * size_deltas[liz_idx]
+                next_pos = prev_pos + delta
+
+                nearest_idx = np.searchsorted(peaks, next_pos)
+                if nearest_idx == len(peaks) or (nearest_idx > 0 and next_pos - peaks[nearest_idx - 1] <= peaks[nearest_idx] - next_pos):
+                    nearest_idx -= 1
+                dist = abs(peaks[nearest_idx] - next_pos)
+
+                if dist < delta / 2:
+                    peak_idx = nearest_idx
+                    filtered_peaks[found] = peak_idx
+                    found += 1
+                    step = (peaks[nearest_idx] - prev_pos) / size_deltas[liz_idx]
+                    liz_idx += 1
+                else:
+                    peak_idx = filtered_peaks[0] + 1
+                    filtered_peaks[0] = peak_idx
+                    found = 1
+                    step = base_step
+                    liz_idx = 0
+
+            if found == count:
+                return filtered_peaks
+            rejected_spans[span] = True
+    return not_found
+
+
+_find_ladder_kernel = kernel(_find_ladder_loop)
@@ -5,6 +5,8 @@ from lib.matlab.wden import wden
 from lib.matlab.msbackadj import msbackadj
 from lib.sdfind.compute_peak_areas import compute_peak_areas
 from lib.sdfind.find_matching_peaks import find_matching_peaks
+from lib.signal.context import SignalContext
+from lib.timing import stage
 
 
 @dataclass
@@ -16,6 +18,7 @@ class SDFindResult:
     molarity: NDArray[np.floating]
     size_fit: NDArray[np.floating]
     peak_fit: NDArray[np.floating]
+    timings: dict[str, float]
 
 
 def sdfind(
@@ -24,16 +27,25 @@ def sdfind(
     release_times: NDArray[np.floating],
     standard_conc: NDArray[np.floating],
 ) -> SDFindResult:
-    x = np.arange(len(raw_signal))
-    corrected_signal = msbackadj(x, raw_signal, window_size=140, step_size=40, quantile_value=0.1)  # коррекция бейзлайна
-    denoised_signal = wden(corrected_signal, 'sqtwolog', 's', 'sln', 1, 'sym2')  # фильтр данных
+    size = len(raw_signal)
+    x = np.arange(size)
+    with stage('sdfind.msbackadj', size):
+        corrected_signal = msbackadj(x, raw_signal, window_size=140, step_size=40, quantile_value=0.1)  # коррекция бейзлайна
+    with stage('sdfind.wden', size):
+        denoised_signal = wden(corrected_signal, 'sqtwolog', 's', 'sln', 1, 'sym2')  # фильтр данных
 
-    matching_peaks = find_matching_peaks(denoised_signal, standard_sizes, release_times)
+    with stage('sdfind.find_matching_peaks', size):
+        matching_peaks = find_matching_peaks(denoised_signal, standard_sizes, release_times)
 
     if len(matching_peaks) != len(standard_sizes):
         raise ValueError('Не удалось найти подходящее количество пиков. Проверьте калибровку стандартов длины.')
 
-    peak_areas = compute_peak_areas(corrected_signal, denoised_signal, matching_peaks)
+    # Производные данные сигналов (сглаживание, минимумы, площади) с учетом времени их вычисления
+    timings: dict[str, float] = {}
+    corrected = SignalContext(corrected_signal, timings, 'corrected.')
+    denoised = SignalContext(denoised_signal, timings, 'denoised.')
+    with stage('sdfind.compute_peak_areas', size):
+        peak_areas = compute_peak_areas(corrected, denoised, matching_peaks)
 
     if len(peak_areas) != len(standard_sizes):
         raise ValueError("Количество рассчитанных площадей не совпадает с количеством калибровочных стандартов.")
@@ -54,4 +66,5 @@ def sdfind(
         molarity=molarity,
         size_fit=size_fit,
         peak_fit=peak_fit,
+        timings=timings,
     )
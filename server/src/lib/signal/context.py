@@ -0,0 +1,104 @@
+from time import perf_counter
+from typing import Any, Callable, TypeVar
+
+import numpy as np
+from numpy.typing import NDArray
+from scipy.signal import find_peaks, savgol_filter
+
+from lib.signal.area import CumulativeArea
+
+T = TypeVar('T')
+
+
+class SignalContext:
+    """
+    Производные данные одного сигнала (сглаживание, производные, минимумы, пересечения нуля, накопленная площадь).
+    Каждый массив вычисляется при первом обращении и запоминается, так что все этапы анализа читают одно и то же.
+    Время вычисления каждого массива (в секундах) сохраняется в timings.
+    Запомненные массивы доступны только для чтения.
+    """
+
+    def __init__(self, signal: NDArray[np.floating], timings: dict[str, float] | None = None, prefix: str = '') -> None:
+        self.signal = np.asarray(signal, dtype=np.float64)
+        self.timings: dict[str, float] = {} if timings is None else timings
+        self._prefix = prefix
+        self._cache: dict[str, Any] = {}
+        self._children: dict[str, SignalContext] = {}
+
+    @classmethod
+    def stack(cls, signals: NDArray[np.floating], window: int = 5, order: int = 1) -> list['SignalContext']:
+        """
+        Контексты для строк двумерного массива сигналов одной длины. Сглаживание, производные и пересечения нуля
+        считаются сразу для всех строк (по последней оси), каждой строке записывается ее доля общего времени
+        """
+        signals = np.asarray(signals, dtype=np.float64)
+        contexts = [cls(signal) for signal in signals]
+        if not contexts:
+            return contexts
+
+        start = perf_counter()
+        smoothed = savgol_filter(signals, window, order, axis=-1)
+        smoothed_end = perf_counter()
+        first_derivatives, second_derivatives = _derivatives(smoothed, window, order)
+        derivatives_end = perf_counter()
+        rows, columns = np.nonzero(np.diff(signals > 0, axis=-1))
+        zero_crossings = np.split(columns, np.searchsorted(rows, np.arange(1, len(signals))))
+        zero_crossings_end = perf_counter()
+
+        count = len(contexts)
+        for i, context in enumerate(contexts):
+            context._store(f'smoothed({window},{order})', smoothed[i], (smoothed_end - start) / count)
+            context._store(f'derivatives({window},{order})', (first_derivatives[i], second_derivatives[i]), (derivatives_end - smoothed_end) / count)
+            context._store('zero_crossings', zero_crossings[i], (zero_crossings_end - derivatives_end) / count)
+        return contexts
+
+    def smoothed(self, window: int, order: int = 1) -> NDArray[np.floating]:
+        """Сглаживание фильтром Савицкого-Голея"""
+        return self._memo(f'smoothed({window},{order})', lambda: savgol_filter(self.signal, window, order))
+
+    def smoothed_context(self, window: int, order: int = 1) -> 'SignalContext':
+        """Контекст сглаженного сигнала, время вычислений пишется в общий timings"""
+        name = f'smoothed({window},{order})'
+        if name not in self._children:
+            self._children[name] = SignalContext(self.smoothed(window, order), self.timings, f'{self._prefix}{name}.')
+        return self._children[name]
+
+    def derivatives(self, window: int = 5, order: int = 1) -> tuple[NDArray[np.floating], NDArray[np.floating]]:
+        """Первая и вторая производные сглаженного сигнала, каждая тоже сглажена тем же фильтром"""
+        smoothed = self.smoothed(window, order)
+        return self._memo(f'derivatives({window},{order})', lambda: _derivatives(smoothed, window, order))
+
+    def minima(self, distance: int | None = None) -> NDArray[np.integer]:
+        """Локальные минимумы - пики инвертированного сигнала, как find_peaks(-signal, distance=distance)"""
+        return self._memo(f'minima({distance})', lambda: find_peaks(-self.signal, distance=distance)[0])
+
+    def zero_crossings(self) -> NDArray[np.integer]:
+        """Индексы, после которых сигнал переходит через ноль"""
+        return self._memo('zero_crossings', lambda: np.where(np.diff(self.signal > 0))[0])
+
+    @property
+    def area(self) -> CumulativeArea:
+        """Накопленная площадь под сигналом"""
+        return self._memo('area', lambda: CumulativeArea(self.signal))
+
+    def _memo(self, name: str, compute: Callable[[], T]) -> T:
+        if name in self._cache:
+            return self._cache[name]
+        start = perf_counter()
+        value = compute()
+        self._store(name, value, perf_counter() - start)
+        return value
+
+    def _store(self, name: str, value: Any, seconds: float) -> None:
+        self.timings[self._prefix + name] = seconds
+        for array in value if isinstance(value, tuple) else (value,):
+            if isinstance(array, np.ndarray):
+                array.flags.writeable = False
+        self._cache[name] = value
+
+
+def _derivatives(smoothed: NDArray[np.floating], window: int, order: int) -> tuple[NDArray[np.floating], NDArray[np.floating]]:
+    """Сглаженные первая и вторая производные по последней оси"""
+    first_derivative_smoothed = savgol_filter(np.diff(smoothed, axis=-1), window, order, axis=-1)
+    second_derivative_smoothed = savgol_filter(np.diff(first_derivative_smoothed, axis=-1), window, order, axis=-1)
+    return first_derivative_smoothed, second_derivative_smoothed
@@ -0,0 +1,44 @@
+from typing import Callable
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from numpy.typing import ArrayLike, NDArray
+
+
+def window_argmax(signal: NDArray[np.floating], starts: ArrayLike, ends: ArrayLike) -> NDArray[np.intp]:
+    """
+    Индексы максимумов сигнала в окнах [starts[i], ends[i]] (границы включительно) - сразу для всех окон.
+    Как и np.argmax, при равных значениях берется первое в окне. Окна должны лежать внутри сигнала и быть непустыми,
+    иначе ValueError (окна у границ сигнала обрезает local_argmax).
+    """
+    return _window_argextremum(signal, starts, ends, np.argmax, -np.inf)
+
+
+def window_argmin(signal: NDArray[np.floating], starts: ArrayLike, ends: ArrayLike) -> NDArray[np.intp]:
+    """Индексы минимумов сигнала в окнах [starts[i], ends[i]], см. window_argmax"""
+    return _window_argextremum(signal, starts, ends, np.argmin, np.inf)
+
+
+def local_argmax(signal: NDArray[np.floating], centers: ArrayLike, radius: int) -> NDArray[np.intp]:
+    """Индексы максимумов в окнах +-radius отсчетов вокруг centers, окна обрезаются границами сигнала"""
+    centers = np.asarray(centers, dtype=np.intp)
+    return window_argmax(signal, np.maximum(centers - radius, 0), np.minimum(centers + radius, len(signal) - 1))
+
+
+def _window_argextremum(signal: NDArray[np.floating], starts: ArrayLike, ends: ArrayLike, arg: Callable[..., NDArray[np.intp]], fill: float) -> NDArray[np.intp]:
+    starts = np.asarray(starts, dtype=np.intp)
+    ends = np.asarray(ends, dtype=np.intp)
+    if len(starts) == 0:
+        return np.empty(0, dtype=np.intp)
+    # Отрицательное начало окна иначе молча взяло бы отсчеты с конца сигнала
+    if starts.min() < 0 or ends.max() >= len(signal) or np.any(ends < starts):
+        raise ValueError('Окна поиска экстремума должны быть непустыми и лежать внутри сигнала')
+
+    # Окна разной длины выравниваем до самого длинного: хвост за концом окна заполняется значением,
+    # которое не может оказаться экстремумом, поэтому каждое окно обходится за O(w), а не за O(N)
+    lengths = ends - starts + 1
+    width = int(lengths.max())
+    padded = np.concatenate((np.asarray(signal, dtype=np.float64), np.full(width, fill)))
+    windows = sliding_window_view(padded, width)[starts]
+    windows = np.where(np.arange(width) < lengths[:, None], windows, fill)
+    return starts + arg(windows, axis=1)
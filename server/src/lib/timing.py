@@ -0,0 +1,81 @@
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Any, Callable, Iterator, TypeVar
+
+T = TypeVar('T')
+
+# Замер времени этапов (разбор, sdfind, glfind, кодирование ответа) для заголовка Server-Timing и /api/metrics.
+# Включается переменной окружения ND_FOREZ_TIMING=1; без нее этапы не замеряются
+TIMING_ENABLED = os.environ.get('ND_FOREZ_TIMING', '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+@dataclass
+class StageTiming:
+    """Замер одного этапа: время в секундах и размер входа (отсчеты сигнала или байты), если он известен"""
+    name: str
+    seconds: float
+    size: int | None = None
+
+
+@dataclass
+class TimingRecorder:
+    """Замеры этапов одного запроса или одной задачи пула процессов"""
+    entries: list[StageTiming] = field(default_factory=list)
+
+    def totals(self) -> dict[str, tuple[int, float, int]]:
+        """Количество вызовов, суммарное время и суммарный размер входа по каждому этапу, в порядке первого вызова"""
+        totals: dict[str, tuple[int, float, int]] = {}
+        for entry in self.entries:
+            count, seconds, size = totals.get(entry.name, (0, 0.0, 0))
+            totals[entry.name] = (count + 1, seconds + entry.seconds, size + (entry.size or 0))
+        return totals
+
+
+_recorder: ContextVar[TimingRecorder | None] = ContextVar('timing_recorder', default=None)
+
+
+def current_recorder() -> TimingRecorder | None:
+    return _recorder.get()
+
+
+@contextmanager
+def recording() -> Iterator[TimingRecorder]:
+    """Записывает этапы, выполненные внутри блока (в том числе в потоках, получивших копию контекста)"""
+    recorder = TimingRecorder()
+    token = _recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorder.reset(token)
+
+
+@contextmanager
+def stage(name: str, size: int | None = None) -> Iterator[StageTiming]:
+    """
+    Замер времени блока как этапа name. Вне recording() ничего не записывается.
+    Размер входа, если он известен только после выполнения, можно задать через полученный замер
+    """
+    entry = StageTiming(name, 0.0, size)
+    recorder = _recorder.get()
+    if recorder is None:
+        yield entry
+        return
+    start = perf_counter()
+    try:
+        yield entry
+    finally:
+        entry.seconds = perf_counter() - start
+        recorder.entries.append(entry)
+
+
+def call_recorded(function: Callable[..., T], *args: Any) -> tuple[T, list[StageTiming]]:
+    """
+    Вызов function(*args) с записью этапов - для задач пула процессов, куда контекст запроса не передается.
+    Замеры возвращаются вместе с результатом и добавляются к замерам запроса
+    """
+    with recording() as recorder:
+        result = function(*args)
+    return result, recorder.entries
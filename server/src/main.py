@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
@@ -5,16 +7,25 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from api import apiRoute
 from database import create_db_and_tables
+from workers import shutdown_executor, warm_up_executor
 
 create_db_and_tables()
 
 
-app = FastAPI(title='ND Forez')
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warm_up_executor()
+    yield
+    shutdown_executor()
+
+
+app = FastAPI(title='ND Forez', lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
 app.mount('/api', apiRoute)
@@ -0,0 +1,44 @@
+from threading import Lock
+from typing import Iterable
+
+from lib.timing import TIMING_ENABLED, StageTiming, TimingRecorder
+from models.models import AnalysisMetrics, StageMetrics
+
+
+class MetricsCollector:
+    """Накопленные замеры этапов по всем запросам с момента запуска сервера"""
+
+    def __init__(self) -> None:
+        self._stages: dict[str, StageMetrics] = {}
+        self._requests = 0
+        self._lock = Lock()
+
+    def add(self, entries: Iterable[StageTiming]) -> None:
+        with self._lock:
+            self._requests += 1
+            for entry in entries:
+                metrics = self._stages.get(entry.name)
+                if metrics is None:
+                    metrics = self._stages[entry.name] = StageMetrics(count=0, total_seconds=0.0, max_seconds=0.0, total_size=0)
+                metrics.count += 1
+                metrics.total_seconds += entry.seconds
+                metrics.max_seconds = max(metrics.max_seconds, entry.seconds)
+                metrics.total_size += entry.size or 0
+
+    def stats(self) -> AnalysisMetrics:
+        with self._lock:
+            return AnalysisMetrics(
+                enabled=TIMING_ENABLED,
+                requests=self._requests,
+                stages={name: metrics.model_copy() for name, metrics in self._stages.items()},
+            )
+
+
+def server_timing_header(recorder: TimingRecorder, total_seconds: float) -> str:
+    """Значение заголовка Server-Timing: время (мс) каждого этапа, число вызовов и размер входа, плюс общее время запроса"""
+    metrics = [
+        f'{name};dur={seconds * 1e3:.2f};desc="count={count} size={size}"'
+        for name, (count, seconds, size) in recorder.totals().items()
+    ]
+    metrics.append(f'total;dur={total_seconds * 1e3:.2f}')
+    return ', '.join(metrics)
@@ -1,25 +1,34 @@
 from datetime import datetime, timezone
 from typing import Optional
-from sqlmodel import JSON, Column, Relationship, SQLModel, Field
+import numpy as np
+from numpy.typing import NDArray
+from pydantic import ConfigDict
+from sqlmodel import Column, Relationship, SQLModel, Field
+
+from models.ndarray import NDArrayType
 
 
 class SizeStandardDB(SQLModel, table=True):
+    model_config = ConfigDict(arbitrary_types_allowed=True)  # type: ignore
+
     id: Optional[int] = Field(default=None, primary_key=True)
     title: str
     filename: str
-    data: list[int] = Field(sa_column=Column(JSON))
-    sizes: list[float] = Field(sa_column=Column(JSON))
-    concentrations: list[float] = Field(sa_column=Column(JSON))
-    release_times: list[int] = Field(sa_column=Column(JSON))
+    data: NDArray[np.int32] = Field(sa_column=Column(NDArrayType(np.int32)))
+    sizes: NDArray[np.float64] = Field(sa_column=Column(NDArrayType(np.float64)))
+    concentrations: NDArray[np.float64] = Field(sa_column=Column(NDArrayType(np.float64)))
+    release_times: NDArray[np.int32] = Field(sa_column=Column(NDArrayType(np.int32)))
     parsed_result_id: Optional[int] = Field(default=None, foreign_key="parseresultdb.id")
     parsed_result: Optional['ParseResultDB'] = Relationship(back_populates="standards")
 
 
 class GenLibDB(SQLModel, table=True):
+    model_config = ConfigDict(arbitrary_types_allowed=True)  # type: ignore
+
     id: Optional[int] = Field(default=None, primary_key=True)
     title: str
     filename: str
-    data: list[int] = Field(sa_column=Column(JSON))
+    data: NDArray[np.int32] = Field(sa_column=Column(NDArrayType(np.int32)))
     parsed_result_id: Optional[int] = Field(default=None, foreign_key="parseresultdb.id")
     parsed_result: Optional['ParseResultDB'] = Relationship(back_populates="genlibs")
 
@@ -28,4 +37,25 @@ class ParseResultDB(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     standards: list[SizeStandardDB] = Relationship(back_populates="parsed_result")
     genlibs: list[GenLibDB] = Relationship(back_populates="parsed_result")
+    analyses: list['AnalysisResultDB'] = Relationship(back_populates="parsed_result")
     created_at: datetime = Field(default=datetime.now(timezone.utc))
+
+
+class AnalysisResultDB(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    size_standard_id: int = Field(foreign_key="sizestandarddb.id")
+    # None - результат анализа самого стандарта длин
+    gen_lib_id: Optional[int] = Field(default=None, foreign_key="genlibdb.id")
+    algorithm_version: int
+    # Ключ входных данных анализа (см. lib.analyzis), по нему видно, что результат устарел
+    input_key: str
+    payload: bytes
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    parsed_result_id: Optional[int] = Field(default=None, foreign_key="parseresultdb.id", index=True)
+    parsed_result: Optional[ParseResultDB] = Relationship(back_populates="analyses")
+
+
+class AnalysisCacheDB(SQLModel, table=True):
+    key: str = Field(primary_key=True)
+    payload: bytes
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
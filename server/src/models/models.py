@@ -1,9 +1,10 @@
 from datetime import datetime
 from typing import Literal
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class SizeStandardDescription(BaseModel):
+    id: int | None = None
     title: str
     filename: str
 
@@ -40,6 +41,7 @@ class SizeStandardAnalyzeError(BaseModel):
 
 
 class GenLibDescription(BaseModel):
+    id: int | None = None
     title: str
     filename: str
 
@@ -124,7 +126,64 @@ class SizeStandardAnalyzeOutput(BaseModel):
 class GenLibsAnalyzeInput(BaseModel):
     raw_signals: list[GenLibRawSignal]
     size_standard_analyze_peaks: SizeStandardAnalyzePeaks
+    # Максимальное число точек t_main/denoised_data/mainCorr в ответе, None - полное разрешение.
+    # Меньше 4 точек (концы и минимум с максимумом одного интервала) прореживание не дает
+    max_points: int | None = Field(None, ge=4)
 
 
 class GenLibsAnalyzeOutput(BaseModel):
     data: list[GenLibAnalyzeResult | GenLibAnalyzeError]
+
+
+class GenLibsJobStatus(BaseModel):
+    id: str
+    state: Literal['running', 'done']
+    total: int
+    done: int
+    created_at: datetime
+
+
+class GenLibsJobOutput(GenLibsJobStatus):
+    # Результаты в порядке входных сигналов, None - библиотека еще анализируется
+    data: list[GenLibAnalyzeResult | GenLibAnalyzeError | None]
+
+
+class ParseResultAnalyzeInput(BaseModel):
+    size_standard_id: int
+    gen_lib_ids: list[int] = []
+    max_points: int | None = Field(None, ge=4)
+
+
+class ParseResultAnalyzeOutput(BaseModel):
+    size_standard: SizeStandardAnalyzeResult | SizeStandardAnalyzeError
+    gen_libs: list[GenLibAnalyzeResult | GenLibAnalyzeError]
+
+
+class GenLibZoomOutput(BaseModel):
+    # Индекс первой точки фрагмента в полном сигнале
+    start: int
+    t_main: list[float]
+    denoised_data: list[float]
+    mainCorr: list[float]
+
+
+class AnalysisCacheStats(BaseModel):
+    size: int
+    max_size: int
+    persistent: bool
+    memory_hits: int
+    persistent_hits: int
+    misses: int
+
+
+class StageMetrics(BaseModel):
+    count: int
+    total_seconds: float
+    max_seconds: float
+    total_size: int
+
+
+class AnalysisMetrics(BaseModel):
+    enabled: bool
+    requests: int
+    stages: dict[str, StageMetrics]
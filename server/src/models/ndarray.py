@@ -0,0 +1,174 @@
+import json
+import struct
+import zlib
+from typing import Any
+
+import numpy as np
+from numpy.typing import DTypeLike, NDArray
+from sqlalchemy import Dialect, LargeBinary, TypeDecorator
+
+
+# Заголовок: сигнатура, версия формата, код типа, код сжатия, количество элементов
+HEADER = struct.Struct('<4sBBBxQ')
+MAGIC = b'NDAR'
+VERSION = 1
+
+# Поддерживаемые типы данных, всегда little-endian
+DTYPE_CODES: dict[int, np.dtype] = {
+    1: np.dtype('<i4'),
+    2: np.dtype('<i8'),
+    3: np.dtype('<f8'),
+}
+CODE_BY_DTYPE: dict[np.dtype, int] = {dtype: code for code, dtype in DTYPE_CODES.items()}
+
+CODEC_RAW = 0
+CODEC_ZLIB = 1
+
+# Не сжимаем маленькие массивы - выигрыш меньше, чем стоимость zlib
+MIN_COMPRESS_SIZE = 1024
+
+
+def encode_ndarray(value: Any, dtype: DTypeLike, compress: bool = True) -> bytes:
+    """Упаковывает одномерный массив в бинарный вид: заголовок + сырые little-endian байты, при необходимости сжатые zlib"""
+    target_dtype = np.dtype(dtype).newbyteorder('<')
+    array = np.ascontiguousarray(value, dtype=target_dtype).ravel()
+    dtype_code = CODE_BY_DTYPE[target_dtype]
+
+    payload = array.tobytes()
+    codec = CODEC_RAW
+    if compress and len(payload) >= MIN_COMPRESS_SIZE:
+        compressed = zlib.compress(payload, 1)
+        if len(compressed) < len(payload):
+            payload = compressed
+            codec = CODEC_ZLIB
+
+    return HEADER.pack(MAGIC, VERSION, dtype_code, codec, len(array)) + payload
+
+
+def decode_ndarray(data: bytes) -> NDArray:
+    """Распаковывает массив, упакованный encode_ndarray, без промежуточных списков Python"""
+    magic, version, dtype_code, codec, length = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('Неизвестный формат бинарного массива')
+    dtype = DTYPE_CODES[dtype_code]
+
+    payload = memoryview(data)[HEADER.size:]
+    if codec == CODEC_ZLIB:
+        payload = memoryview(zlib.decompress(payload))
+    elif codec != CODEC_RAW:
+        raise ValueError(f'Неизвестный код сжатия: {codec}')
+
+    return np.frombuffer(payload, dtype=dtype, count=length)
+
+
+class NDArrayType(TypeDecorator):
+    """Колонка SQLAlchemy для хранения массивов NumPy в формате encode_ndarray"""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def __init__(self, dtype: DTypeLike, compress: bool = True) -> None:
+        super().__init__()
+        self.dtype = np.dtype(dtype)
+        self.compress = compress
+
+    def process_bind_param(self, value: Any, dialect: Dialect) -> bytes | None:
+        if value is None:
+            return None
+        return encode_ndarray(value, self.dtype, self.compress)
+
+    def process_result_value(self, value: Any, dialect: Dialect) -> NDArray | None:
+        if value is None:
+            return None
+        return decode_ndarray(value)
+
+
+# Запись: сигнатура и длина JSON-заголовка, затем заголовок (скаляры и имена массивов) и массивы в формате encode_ndarray
+RECORD_HEADER = struct.Struct('<4sI')
+RECORD_MAGIC = b'NDRC'
+
+
+def encode_record(record: dict[str, Any], compress: bool = True) -> bytes:
+    """
+    Упаковывает словарь (например, model_dump() результата анализа): списки чисел хранятся
+    бинарными массивами, остальные значения - в JSON-заголовке. Вложенные словари и списки словарей разворачиваются.
+    """
+    scalars: dict[str, Any] = {}
+    arrays: list[tuple[str, bytes]] = []
+    for name, value in _flatten(record):
+        array = _numeric_array(value)
+        if array is not None:
+            dtype = np.int64 if array.dtype.kind in 'iu' else np.float64
+            arrays.append((name, encode_ndarray(array, dtype, compress)))
+        else:
+            scalars[name] = value
+
+    header = json.dumps({
+        'scalars': scalars,
+        'arrays': [[name, len(blob)] for name, blob in arrays],
+    }).encode()
+    return b''.join([RECORD_HEADER.pack(RECORD_MAGIC, len(header)), header, *(blob for _, blob in arrays)])
+
+
+def decode_record(data: bytes) -> dict[str, Any]:
+    """Распаковывает запись encode_record обратно в словарь со списками"""
+    magic, header_size = RECORD_HEADER.unpack_from(data)
+    if magic != RECORD_MAGIC:
+        raise ValueError('Неизвестный формат бинарной записи')
+    offset = RECORD_HEADER.size
+    header = json.loads(data[offset:offset + header_size])
+    offset += header_size
+
+    flat: dict[str, Any] = dict(header['scalars'])
+    for name, size in header['arrays']:
+        flat[name] = decode_ndarray(data[offset:offset + size]).tolist()
+        offset += size
+
+    record: dict[str, Any] = {}
+    for name, value in flat.items():
+        *parents, key = name.split('.')
+        target = record
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[key] = value
+    return _restore_lists(record)
+
+
+def is_record(data: bytes) -> bool:
+    return data[:len(RECORD_MAGIC)] == RECORD_MAGIC
+
+
+def _numeric_array(value: Any) -> NDArray | None:
+    """Одномерный числовой массив из списка чисел или None, если значение не такой список"""
+    if not isinstance(value, list):
+        return None
+    try:
+        array = np.asarray(value)
+    except ValueError:
+        return None
+    if array.ndim != 1 or array.dtype.kind not in 'iuf':
+        return None
+    return array
+
+
+def _flatten(record: dict[str, Any], prefix: str = '') -> list[tuple[str, Any]]:
+    items: list[tuple[str, Any]] = []
+    for name, value in record.items():
+        if isinstance(value, dict):
+            items += _flatten(value, f'{prefix}{name}.')
+        elif isinstance(value, list) and value and all(isinstance(v, dict) for v in value):
+            # Элементы списка словарей получают в пути свой номер: data.0.t_main
+            items += _flatten({str(i): v for i, v in enumerate(value)}, f'{prefix}{name}.')
+        else:
+            items.append((f'{prefix}{name}', value))
+    return items
+
+
+def _restore_lists(value: Any) -> Any:
+    """Словари с ключами-номерами, полученные из списков при разворачивании, снова превращаются в списки"""
+    if not isinstance(value, dict):
+        return value
+    restored = {key: _restore_lists(item) for key, item in value.items()}
+    if restored and all(key.isdigit() for key in restored):
+        return [restored[key] for key in sorted(restored, key=int)]
+    return restored
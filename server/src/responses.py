@@ -0,0 +1,50 @@
+from typing import Iterable, Iterator
+
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+from lib.timing import stage
+from models.ndarray import encode_record
+
+# Бинарный формат ответа (см. models.ndarray.encode_record): массивы передаются как float64/int64 вместо текста.
+# Без zlib - сжатие ответа, если нужно, делает HTTP-сервер
+RECORD_MEDIA_TYPE = 'application/x-nd-forez-record'
+
+# Потоковый формат ответа: по строке JSON {"index": ..., "result": ...} на каждый результат, по мере готовности
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+
+# Описание альтернативных форматов для документации OpenAPI
+RECORD_RESPONSES = {200: {'content': {RECORD_MEDIA_TYPE: {}}}}
+STREAM_RESPONSES = {200: {'content': {RECORD_MEDIA_TYPE: {}, NDJSON_MEDIA_TYPE: {}}}}
+
+
+def analysis_response(request: Request, output: BaseModel) -> Response:
+    """
+    Ответ с результатами анализа без повторной проверки модели в FastAPI.
+    По умолчанию - JSON той же схемы, собранный pydantic-core, при Accept: application/x-nd-forez-record - бинарная запись.
+    """
+    with stage('encode') as encoding:
+        if RECORD_MEDIA_TYPE in request.headers.get('accept', ''):
+            content, media_type = encode_record(output.model_dump(), compress=False), RECORD_MEDIA_TYPE
+        else:
+            content, media_type = to_json(output), 'application/json'
+        encoding.size = len(content)
+    return Response(content=content, media_type=media_type)
+
+
+def accepts_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get('accept', '')
+
+
+def ndjson_response(results: Iterable[tuple[int, BaseModel]]) -> StreamingResponse:
+    """
+    Потоковый ответ: каждый результат кодируется и отправляется, как только получен, с номером во входных данных.
+    Порядок строк - порядок готовности, в памяти держится только текущий результат
+    """
+    def lines() -> Iterator[bytes]:
+        for index, result in results:
+            yield to_json({'index': index, 'result': result}) + b'\n'
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
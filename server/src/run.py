@@ -1,3 +1,4 @@
+import multiprocessing
 import os
 import threading
 import webview
@@ -75,4 +76,6 @@ def main() -> None:
 
 
 if __name__ == "__main__":
+    # Нужно для пула процессов в собранном PyInstaller приложении
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,33 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, wait
+
+# Количество процессов пула, по умолчанию - по числу ядер
+WORKER_COUNT = int(os.environ.get('ND_FOREZ_WORKERS', 0)) or os.cpu_count() or 1
+
+# Пул процессов для CPU-нагрузки (разбор файлов, анализ), чтобы не блокировать цикл событий
+_executor: ProcessPoolExecutor | None = None
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=WORKER_COUNT)
+    return _executor
+
+
+def warm_up_executor() -> None:
+    """Запускает все процессы пула заранее и импортирует в них модули анализа, чтобы первый запрос не платил за старт"""
+    executor = get_executor()
+    wait([executor.submit(_warm_up) for _ in range(WORKER_COUNT)])
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
+
+
+def _warm_up() -> None:
+    import lib.analyzis  # noqa: F401
+    import lib.parsing.parsing_frf  # noqa: F401